@@ -0,0 +1,129 @@
+import glob
+import json
+import os
+from collections import Counter
+from multiprocessing import Pool
+
+ZERO_QUERY_LIMIT = 1000
+
+
+def expand_paths(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, 'events.jsonl*'))))
+        else:
+            files.append(path)
+    return files
+
+
+def aggregate_file(path):
+    views = Counter()
+    answers = Counter()
+    correct = Counter()
+    zero_queries = Counter()
+    events = 0
+    searches = 0
+    zero_results = 0
+    bad_lines = 0
+
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                bad_lines += 1
+                continue
+            events += 1
+            kind = event.get('e')
+
+            if kind == 'view':
+                views[(event.get('n'), event.get('c'), event.get('i'))] += 1
+            elif kind == 'search':
+                searches += 1
+                if not event.get('h'):
+                    zero_results += 1
+                    zero_queries[(event.get('q') or '').strip().lower()] += 1
+            elif kind == 'answer':
+                key = (event.get('n'), event.get('c'), event.get('i'))
+                answers[key] += 1
+                if event.get('ok'):
+                    correct[key] += 1
+
+    return {
+        'events': events,
+        'bad_lines': bad_lines,
+        'searches': searches,
+        'zero_results': zero_results,
+        'views': views,
+        'answers': answers,
+        'correct': correct,
+        'zero_queries': Counter(dict(zero_queries.most_common(ZERO_QUERY_LIMIT))),
+    }
+
+
+def merge(partials):
+    total = {
+        'events': 0,
+        'bad_lines': 0,
+        'searches': 0,
+        'zero_results': 0,
+        'views': Counter(),
+        'answers': Counter(),
+        'correct': Counter(),
+        'zero_queries': Counter(),
+    }
+    for partial in partials:
+        for key, value in partial.items():
+            total[key] += value
+    return total
+
+
+def build_report(total, top):
+    by_national = {}
+    for (national, category, name), count in total['views'].most_common():
+        entries = by_national.setdefault(national, [])
+        if len(entries) < top:
+            entries.append({'category': category, 'item': name, 'views': count})
+
+    accuracy = []
+    for (national, category, name), count in total['answers'].most_common():
+        right = total['correct'][(national, category, name)]
+        accuracy.append({
+            'national': national,
+            'category': category,
+            'item': name,
+            'answers': count,
+            'correct': right,
+            'accuracy': round(right / count, 4),
+        })
+
+    searches = total['searches']
+    return {
+        'events': total['events'],
+        'bad_lines': total['bad_lines'],
+        'top_viewed': by_national,
+        'search': {
+            'total': searches,
+            'zero_results': total['zero_results'],
+            'zero_result_rate': round(total['zero_results'] / searches, 4) if searches else None,
+            'top_zero_queries': [
+                {'query': query, 'count': count}
+                for query, count in total['zero_queries'].most_common(top)
+            ],
+        },
+        'quiz_accuracy': accuracy,
+    }
+
+
+def events_report(paths, processes=None, top=10):
+    files = expand_paths(paths)
+    processes = min(processes or os.cpu_count() or 1, len(files))
+
+    if processes <= 1:
+        report = build_report(merge(map(aggregate_file, files)), top)
+    else:
+        with Pool(processes) as pool:
+            report = build_report(merge(pool.imap_unordered(aggregate_file, files)), top)
+    report['files'] = len(files)
+    return report
@@ -0,0 +1,282 @@
+import gzip
+import json
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from catalog import get_catalog
+from config import API_HOST, API_PORT, CATEGORY_NAMES
+from nationals import get_russian_name
+from search_index import MAX_RESULTS, get_search_index
+
+Response = namedtuple('Response', ['status', 'body', 'gzipped', 'etag', 'gzip_etag'])
+
+logger = logging.getLogger(__name__)
+
+GZIP_MIN_BYTES = 512
+SEARCH_LIMIT = 50
+
+
+def item_id(national, category, idx):
+    return f'{national}_{category}_{idx}'
+
+
+def parse_item_id(value):
+    # national keys may contain underscores, categories and indexes never do
+    parts = value.rsplit('_', 2)
+    if len(parts) != 3 or not parts[2].isdigit():
+        return None
+    return parts[0], parts[1], int(parts[2])
+
+
+def item_summary(national, category, idx, item):
+    return {
+        'id': item_id(national, category, idx),
+        'name': item['name'],
+        'image': item['image'] or None,
+        'date': item['date'],
+    }
+
+
+class ApiResponses:
+    def __init__(self, catalog, cache_size=4096):
+        self.catalog = catalog
+        # a strong validator names one representation, so the gzipped body gets its own
+        self.etag = f'"{catalog.version}"'
+        self.gzip_etag = f'"{catalog.version}-gz"'
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+
+        self._static = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        # lists are small and polled the most, so they are serialized once up front
+        self._static['/nationals'] = self.serialize(self.nationals())
+        for national in catalog.nationals:
+            for category in CATEGORY_NAMES.keys():
+                self._static[f'/nationals/{national}/{category}'] = self.serialize(self.category(national, category))
+
+    def serialize(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        gzipped = gzip.compress(body, 6, mtime=0) if len(body) >= GZIP_MIN_BYTES else None
+        if status != 200:
+            return Response(status, body, gzipped, None, None)
+        return Response(status, body, gzipped, self.etag, self.gzip_etag if gzipped is not None else None)
+
+    def nationals(self):
+        result = []
+        for national in self.catalog.nationals:
+            result.append({
+                'key': national,
+                'name': get_russian_name(national),
+                'categories': [
+                    {'key': category, 'name': name, 'items': len(self.catalog.category_items(national, category))}
+                    for category, name in CATEGORY_NAMES.items()
+                ],
+            })
+        return {'version': self.catalog.version, 'nationals': result}
+
+    def category(self, national, category):
+        items = self.catalog.category_items(national, category)
+        return {
+            'national': national,
+            'national_name': get_russian_name(national),
+            'category': category,
+            'category_name': CATEGORY_NAMES[category],
+            'items': [item_summary(national, category, idx, item) for idx, item in enumerate(items)],
+        }
+
+    def item(self, value):
+        key = parse_item_id(value)
+        if key is None:
+            return None
+        national, category, idx = key
+        items = self.catalog.category_items(national, category)
+        if idx >= len(items):
+            return None
+        return {
+            **item_summary(national, category, idx, items[idx]),
+            'national': national,
+            'national_name': get_russian_name(national),
+            'category': category,
+            'category_name': CATEGORY_NAMES.get(category, category),
+            'description': self.catalog.description(national, category, idx),
+        }
+
+    def search(self, query, limit):
+        index = get_search_index()
+        results = []
+        for entry_id in index.search(query)[:limit]:
+            entry = index.entries[entry_id]
+            summary = item_summary(entry['national'], entry['category'], entry['idx'], entry['item'])
+            summary['national'] = entry['national']
+            summary['category'] = entry['category']
+            results.append(summary)
+        return {'query': query, 'items': results}
+
+    def get(self, path, query):
+        response = self._static.get(path)
+        if response is not None:
+            return response
+
+        if path.startswith('/items/'):
+            key = path
+        elif path == '/search':
+            text = query.get('q', [''])[0].strip()
+            limit = query.get('limit', [''])[0]
+            limit = min(int(limit), MAX_RESULTS) if limit.isdigit() else SEARCH_LIMIT
+            key = (text.lower(), limit)
+        else:
+            return None
+
+        with self._lock:
+            response = self._cache.get(key)
+            if response is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return response
+
+        if path == '/search':
+            response = self.serialize(self.search(key[0], key[1]))
+        else:
+            data = self.item(unquote(path[len('/items/'):]))
+            if data is None:
+                return None
+            response = self.serialize(data)
+
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = response
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return response
+
+    def stats(self):
+        return {
+            'version': self.catalog.version,
+            'static': len(self._static),
+            'cached': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+_responses = None
+_responses_lock = threading.Lock()
+
+
+def get_responses():
+    global _responses
+    catalog = get_catalog()
+    responses = _responses
+    if responses is None or responses.catalog is not catalog:
+        with _responses_lock:
+            if _responses is None or _responses.catalog is not catalog:
+                _responses = ApiResponses(catalog)
+            responses = _responses
+    return responses
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in header.split(','))
+
+
+def accepts_gzip(header):
+    # codings carry q-values, and q=0 means the client refuses that coding
+    weights = {}
+    for part in (header or '').split(','):
+        coding, *params = part.split(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in weights:
+            return weights[coding] > 0
+    return False
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = 'Etnosfera'
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out as separate writes; without this keep-alive clients stall on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.respond(head=False)
+
+    def do_HEAD(self):
+        self.respond(head=True)
+
+    def respond(self, head):
+        url = urlsplit(self.path)
+        path = url.path.rstrip('/') or '/'
+        try:
+            # resolved first, so a missing path is a 404 whatever the client cached; lists and
+            # recently viewed items come from memory, so a conditional GET still renders nothing
+            response = get_responses().get(path, parse_qs(url.query))
+        except Exception:
+            logger.exception('API error for %s', self.path)
+            response = Response(500, b'{"error":"internal error"}', None, None, None)
+        if response is None:
+            response = Response(404, b'{"error":"not found"}', None, None, None)
+
+        body = response.body
+        etag = response.etag
+        gzipped = response.gzipped is not None and accepts_gzip(self.headers.get('Accept-Encoding'))
+        if gzipped:
+            body = response.gzipped
+            etag = response.gzip_etag
+
+        if etag and etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
+            self.send_common_headers(etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(response.status)
+        self.send_common_headers(etag)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def send_common_headers(self, etag):
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Access-Control-Allow-Origin', '*')
+
+    def log_message(self, format, *args):
+        # kiosks poll constantly, per-request logging would drown everything else
+        pass
+
+
+def start_api_server(host=API_HOST, port=API_PORT):
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='ApiServer', daemon=True)
+    thread.start()
+    logger.info('API каталога: http://%s:%s', host, server.server_address[1])
+    return server
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import threading
+from collections import namedtuple
+
+from config import DATA_DIR, MAIN_PHOTO, PHOTO_MAX_BYTES
+
+Asset = namedtuple('Asset', ['path', 'fallback', 'size', 'digest'])
+
+_digests = {}
+_digests_lock = threading.Lock()
+_file_ids = {}
+
+
+def national_preview_path(national, data_dir=DATA_DIR):
+    return os.path.join(data_dir, national, 'preview.png')
+
+
+def category_preview_path(national, category, data_dir=DATA_DIR):
+    return os.path.join(data_dir, national, category, 'preview.png')
+
+
+def item_image_path(national, category, image, data_dir=DATA_DIR):
+    return os.path.join(data_dir, national, category, image)
+
+
+def file_digest(path, size, mtime):
+    # images rarely change between catalog reloads, so only rehash when they do
+    key = (path, size, mtime)
+    digest = _digests.get(key)
+    if digest is None:
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(256 * 1024), b''):
+                sha1.update(chunk)
+        digest = sha1.hexdigest()
+        with _digests_lock:
+            _digests[key] = digest
+    return digest
+
+
+def probe(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isfile(path):
+        return None
+    return stat
+
+
+def load_asset(path, max_bytes=PHOTO_MAX_BYTES):
+    stat = probe(path)
+    if stat is None or stat.st_size > max_bytes:
+        return None
+    try:
+        digest = file_digest(path, stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        return None
+    return Asset(path, False, stat.st_size, digest)
+
+
+def fallback_asset():
+    asset = load_asset(MAIN_PHOTO)
+    if asset is None:
+        return Asset(MAIN_PHOTO, True, 0, None)
+    return asset._replace(fallback=True)
+
+
+class AssetManifest:
+    def __init__(self, data_dir, nationals, items, max_bytes=PHOTO_MAX_BYTES):
+        self.data_dir = data_dir
+        self.max_bytes = max_bytes
+        self.fallback = fallback_asset()
+        self.assets = {}
+        # path -> size of a file that exists but cannot be sent, or None when there is no file
+        self.missing = {}
+
+        for national in nationals:
+            self.add(national_preview_path(national, data_dir))
+        for (national, category), category_items in items.items():
+            self.add(category_preview_path(national, category, data_dir))
+            for item in category_items:
+                if item['image']:
+                    self.add(item_image_path(national, category, item['image'], data_dir))
+
+        self.assets[self.fallback.path] = self.fallback
+
+    def add(self, path):
+        asset = self.assets.get(path)
+        if asset is not None:
+            return asset
+        asset = load_asset(path, self.max_bytes)
+        if asset is None:
+            stat = probe(path)
+            asset = self.fallback._replace(fallback=True)
+            self.missing[path] = stat.st_size if stat else None
+        self.assets[path] = asset
+        return asset
+
+    def resolve(self, path):
+        return self.assets.get(path, self.fallback)
+
+    def national(self, national):
+        return self.resolve(national_preview_path(national, self.data_dir))
+
+    def category(self, national, category):
+        return self.resolve(category_preview_path(national, category, self.data_dir))
+
+    def item(self, national, category, image):
+        return self.resolve(item_image_path(national, category, image, self.data_dir))
+
+    def stats(self):
+        return {
+            'assets': len(self.assets),
+            'missing': len(self.missing),
+            'bytes': sum(asset.size for path, asset in self.assets.items() if path == asset.path),
+        }
+
+
+def cached_file_id(asset):
+    if asset.digest is None:
+        return None
+    return _file_ids.get(asset.digest)
+
+
+def remember_file_id(asset, file_id):
+    if asset.digest is not None and file_id:
+        _file_ids[asset.digest] = file_id
+
+
+def forget_file_id(asset):
+    if asset.digest is not None:
+        _file_ids.pop(asset.digest, None)
@@ -0,0 +1,163 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+from telebot import apihelper
+
+from config import BACKLOG_MAX_AGE, OFFSET_SAVE_INTERVAL, STORAGE_DIR, TOKEN
+from workers import route_key
+
+OFFSET_FILE = os.path.join(STORAGE_DIR, 'update_offset.json')
+# after a week without updates Telegram numbers the next one from a random value
+OFFSET_MAX_AGE = 6 * 24 * 3600
+BATCH_SIZE = 100
+
+logger = logging.getLogger(__name__)
+
+
+def bot_id(token):
+    return (token or '').split(':', 1)[0]
+
+
+def load_offset(token=TOKEN, path=OFFSET_FILE):
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get('bot') != bot_id(token) or time.time() - data.get('saved', 0) > OFFSET_MAX_AGE:
+        return None
+    return data.get('offset')
+
+
+def save_offset(offset, token=TOKEN, path=OFFSET_FILE):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'bot': bot_id(token), 'offset': offset, 'saved': int(time.time())}, f)
+    os.replace(tmp_path, path)
+
+
+class OffsetKeeper:
+    # the offset is read from the poller every interval and written only when it moved
+    def __init__(self, token=TOKEN, path=OFFSET_FILE, interval=OFFSET_SAVE_INTERVAL):
+        self.token = token
+        self.path = path
+        self.interval = interval
+        self.saved = None
+        self.current = None
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def flush(self):
+        offset = self.current() if self.current else None
+        with self._lock:
+            if not offset or offset == self.saved:
+                return
+            try:
+                save_offset(offset, self.token, self.path)
+                self.saved = offset
+            except OSError as e:
+                logger.warning('Offset save error: %s', e)
+
+    def watch(self, current):
+        self.current = current
+
+        def run():
+            while not self._stop.wait(self.interval):
+                self.flush()
+
+        threading.Thread(target=run, name='OffsetKeeper', daemon=True).start()
+        atexit.register(self.flush)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+
+def drain(token=TOKEN, processed=None):
+    # everything Telegram holds right now, without waiting for more; pages after the first confirm the
+    # previous ones, which is fine since the caller handles them next
+    updates = []
+    skipped = 0
+    offset = None
+    while True:
+        batch = apihelper.get_updates(token, offset=offset, limit=BATCH_SIZE, timeout=0)
+        if not batch:
+            break
+        offset = batch[-1]['update_id'] + 1
+        for update in batch:
+            if processed and update['update_id'] < processed:
+                # handled before the restart, but the restart came before Telegram was told so
+                skipped += 1
+            else:
+                updates.append(update)
+        if len(batch) < BATCH_SIZE:
+            break
+    return updates, offset, skipped
+
+
+def collapse(updates, max_age=BACKLOG_MAX_AGE, now=None):
+    # messages are kept, since they carry what the user typed; of the presses only the last one per chat is,
+    # and only if it is recent: the screens before it were never seen and an old one is long forgotten.
+    # Telegram does not date presses, and the pressed message's date says when the bot last edited it,
+    # not when the user tapped, so a press is only judged old by a later message
+    now = time.time() if now is None else now
+
+    # update ids follow arrival order, so a press came in no later than the next message after it
+    arrived_by = [None] * len(updates)
+    later = None
+    for idx in range(len(updates) - 1, -1, -1):
+        arrived_by[idx] = later
+        message = updates[idx].get('message')
+        if message:
+            later = message['date']
+
+    last_press = {}
+    for idx, update in enumerate(updates):
+        if 'callback_query' in update:
+            last_press[route_key(update)] = idx
+
+    kept = []
+    superseded = 0
+    stale = 0
+    for idx, update in enumerate(updates):
+        if 'inline_query' in update:
+            # Telegram no longer accepts answers to these after the outage
+            stale += 1
+            continue
+        call = update.get('callback_query')
+        if call is None:
+            kept.append(update)
+            continue
+        if last_press[route_key(update)] != idx:
+            superseded += 1
+            continue
+        pressed = arrived_by[idx]
+        if pressed is not None and now - pressed > max_age:
+            stale += 1
+            continue
+        kept.append(update)
+    return kept, {'fetched': len(updates), 'kept': len(kept), 'superseded': superseded, 'stale': stale}
+
+
+def recover(token=TOKEN, processed=None, max_age=BACKLOG_MAX_AGE):
+    started = time.perf_counter()
+    try:
+        updates, offset, skipped = drain(token, processed)
+    except Exception as e:
+        logger.error('Backlog fetch error: %s', e)
+        return [], processed
+    kept, report = collapse(updates, max_age)
+    report['already_processed'] = skipped
+    report['ms'] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info('Накопившиеся обновления: получено %s, обработаем %s, пропущено нажатий %s',
+                report['fetched'], report['kept'], report['superseded'] + report['stale'], extra={'data': report})
+    return kept, offset or processed
@@ -0,0 +1,103 @@
+import os
+import random
+import struct
+import zlib
+
+from config import CATEGORIES
+from nationals import NATIONALS_RU
+
+WORDS = [
+    'народ', 'традиция', 'праздник', 'блюдо', 'костюм', 'орнамент', 'узор',
+    'обряд', 'песня', 'танец', 'ремесло', 'вышивка', 'семья', 'род', 'село',
+    'зима', 'весна', 'лето', 'осень', 'солнце', 'река', 'тайга', 'степь',
+    'мясо', 'тесто', 'молоко', 'хлеб', 'рыба', 'ягоды', 'мёд', 'суп',
+    'древний', 'старинный', 'праздничный', 'яркий', 'красный', 'белый',
+    'готовится', 'подаётся', 'украшается', 'передаётся', 'отмечается',
+    'символ', 'история', 'культура', 'язык', 'письменность', 'поколение',
+]
+
+DATE_FORMATS = ['{year}g', '{day:02d}.{month:02d}.{year}', '{year}']
+
+
+def tiny_png(seed=0):
+    # 1x1 RGB PNG, distinct per seed so content hashes differ
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body) & 0xffffffff)
+
+    pixel = bytes([0, seed % 256, (seed // 256) % 256, 128])
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 2, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(pixel))
+        + chunk(b'IEND', b'')
+    )
+
+
+def national_keys(count):
+    keys = list(NATIONALS_RU.keys())
+    result = keys[:count]
+    suffix = 2
+    while len(result) < count:
+        for key in keys:
+            if len(result) >= count:
+                break
+            result.append(f'{key}{suffix}')
+        suffix += 1
+    return result
+
+
+def make_description(rng, length):
+    lines = []
+    line = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        line.append(word)
+        size += len(word) + 1
+        if len(line) >= 8:
+            lines.append(' '.join(line).capitalize() + '.')
+            line = []
+    if line:
+        lines.append(' '.join(line).capitalize() + '.')
+    return '\n'.join(lines)
+
+
+def make_date(rng):
+    fmt = rng.choice(DATE_FORMATS)
+    return fmt.format(year=rng.randint(1500, 2024), month=rng.randint(1, 12), day=rng.randint(1, 28))
+
+
+def generate_corpus(root, nationals=5, items_per_category=20, description_length=400,
+                    image_ratio=0.5, seed=0):
+    rng = random.Random(seed)
+    data_dir = os.path.join(root, 'regionals')
+    os.makedirs(os.path.join(root, 'imgs'), exist_ok=True)
+    with open(os.path.join(root, 'imgs', 'example.png'), 'wb') as f:
+        f.write(tiny_png())
+
+    image_seed = 1
+    for national in national_keys(nationals):
+        for category in CATEGORIES:
+            cat_dir = os.path.join(data_dir, national, category)
+            os.makedirs(cat_dir, exist_ok=True)
+
+            blocks = []
+            for idx in range(items_per_category):
+                name = f'{rng.choice(WORDS).capitalize()} {idx + 1}'
+                image = f'item{idx}.png'
+                header = f'{{ {category}: {name} / {image} / {make_date(rng)} }}'
+                blocks.append(
+                    f'=START= {header} ===\n'
+                    f'{make_description(rng, description_length)}\n'
+                    f'=END= {header} ==='
+                )
+                if rng.random() < image_ratio:
+                    with open(os.path.join(cat_dir, image), 'wb') as f:
+                        f.write(tiny_png(image_seed))
+                    image_seed += 1
+
+            with open(os.path.join(cat_dir, 'list.txt'), 'w', encoding='utf-8') as f:
+                f.write('\n\n'.join(blocks) + '\n')
+
+    return root
@@ -0,0 +1,207 @@
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+PATH_RE = re.compile(r'^/bot(?P<token>[^/]+)/(?P<method>\w+)$')
+UPLOAD_METHODS = {'sendPhoto', 'sendDocument', 'editMessageMedia'}
+MESSAGE_METHODS = {
+    'sendMessage', 'sendPhoto', 'sendDocument',
+    'editMessageCaption', 'editMessageText', 'editMessageReplyMarkup', 'editMessageMedia',
+}
+
+
+class FakeTelegramAPI:
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=30, jitter_ms=10,
+                 upload_ms_per_kb=0.5, rate_limit_ratio=0.0, retry_after=1, error_ratio=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.upload_ms_per_kb = upload_ms_per_kb
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.error_ratio = error_ratio
+        self.observers = []
+
+        self.method_counts = Counter()
+        self.rate_limited = Counter()
+        self.server_errors = Counter()
+        self.upload_bytes = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+
+        self._updates = deque()
+        self._update_ids = itertools.count(1)
+        self._updates_ready = threading.Condition()
+
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def api_url(self):
+        return self.url + '/bot{0}/{1}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='FakeTelegramAPI', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        with self._updates_ready:
+            self._updates_ready.notify_all()
+
+    def push_update(self, payload):
+        with self._updates_ready:
+            update_id = next(self._update_ids)
+            self._updates.append({'update_id': update_id, **payload})
+            self._updates_ready.notify_all()
+        return update_id
+
+    def pending_updates(self):
+        with self._updates_ready:
+            return len(self._updates)
+
+    def _get_updates(self, params):
+        offset = int(params.get('offset', 0) or 0)
+        limit = int(params.get('limit', 100) or 100)
+        timeout = float(params.get('timeout', 0) or 0)
+        deadline = time.monotonic() + timeout
+
+        with self._updates_ready:
+            while self._updates and self._updates[0]['update_id'] < offset:
+                self._updates.popleft()
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._updates_ready.wait(remaining)
+            return list(itertools.islice(self._updates, 0, limit))
+
+    def _delay(self, upload_size):
+        delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        delay += upload_size / 1024 * self.upload_ms_per_kb
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _fake_message(self, method, params):
+        chat_id = int(params.get('chat_id', 0) or 0)
+        if method.startswith('edit'):
+            message_id = int(params.get('message_id', 0) or 0)
+        else:
+            message_id = next(self._message_ids)
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+        }
+        if method.startswith('edit'):
+            message['edit_date'] = message['date']
+        if 'caption' in params:
+            message['caption'] = params['caption']
+        if 'text' in params:
+            message['text'] = params['text']
+        if method in UPLOAD_METHODS:
+            file_id = f'photo-{next(self._file_ids)}'
+            message['photo'] = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 1, 'height': 1}]
+        if 'reply_markup' in params:
+            message['reply_markup'] = json.loads(params['reply_markup'])
+        return message
+
+    def handle(self, method, params, upload_size):
+        received_at = time.perf_counter()
+
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': self._get_updates(params)}
+
+        with self._lock:
+            self.method_counts[method] += 1
+            self.upload_bytes += upload_size
+            limited = self.rate_limit_ratio and self._random.random() < self.rate_limit_ratio
+            if limited:
+                self.rate_limited[method] += 1
+            failed = not limited and self.error_ratio and self._random.random() < self.error_ratio
+            if failed:
+                self.server_errors[method] += 1
+
+        self._delay(upload_size)
+
+        if failed:
+            return 502, {'ok': False, 'error_code': 502, 'description': 'Bad Gateway'}
+        if limited:
+            result = None
+            status, body = 429, {
+                'ok': False,
+                'error_code': 429,
+                'description': f'Too Many Requests: retry after {self.retry_after}',
+                'parameters': {'retry_after': self.retry_after},
+            }
+        else:
+            if method == 'getMe':
+                result = {'id': 1, 'is_bot': True, 'first_name': 'Etnosfera', 'username': 'Etnosfera_bot'}
+            elif method in MESSAGE_METHODS:
+                result = self._fake_message(method, params)
+            else:
+                result = True
+            status, body = 200, {'ok': True, 'result': result}
+
+        for observer in self.observers:
+            observer(method, params, result, received_at)
+        return status, body
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _serve(self):
+                parsed = urlparse(self.path)
+                match = PATH_RE.match(parsed.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+
+                if not match:
+                    self._reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+                    return
+
+                params = dict(parse_qsl(parsed.query))
+                content_type = self.headers.get('Content-Type', '')
+                upload_size = 0
+                if content_type.startswith('application/x-www-form-urlencoded'):
+                    params.update(parse_qsl(body.decode('utf-8')))
+                elif content_type.startswith('multipart/form-data'):
+                    upload_size = len(body)
+
+                status, payload = api.handle(match.group('method'), params, upload_size)
+                self._reply(status, payload)
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _serve
+            do_POST = _serve
+
+        return Handler
@@ -0,0 +1,67 @@
+import itertools
+import threading
+import time
+from types import SimpleNamespace
+
+from telebot import types
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+        self._message_ids = itertools.count(1000)
+        self._file_ids = itertools.count(1)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def method(*args, **kwargs):
+            return self._record(name, args, kwargs)
+
+        return method
+
+    def _record(self, name, args, kwargs):
+        with self._lock:
+            self.calls.append((name, args, kwargs))
+            message_id = next(self._message_ids)
+            file_id = f'fake-file-{next(self._file_ids)}'
+
+        chat_id = kwargs.get('chat_id', args[0] if args else None)
+        return SimpleNamespace(
+            message_id=message_id,
+            chat=SimpleNamespace(id=chat_id),
+            photo=[SimpleNamespace(file_id=file_id)] if name in ('send_photo', 'edit_message_media') else None,
+        )
+
+    def reset(self):
+        with self._lock:
+            self.calls = []
+
+    def call_names(self):
+        return [name for name, _, _ in self.calls]
+
+
+def make_callback(chat_id, data, message_id=1, query_id='1'):
+    return types.CallbackQuery.de_json({
+        'id': query_id,
+        'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Bench'},
+        'chat_instance': str(chat_id),
+        'data': data,
+        'message': {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+        },
+    })
+
+
+def make_message(chat_id, text, message_id=1):
+    return types.Message.de_json({
+        'message_id': message_id,
+        'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private'},
+        'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Bench'},
+        'text': text,
+    })
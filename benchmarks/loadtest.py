@@ -0,0 +1,416 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from telebot import ExceptionHandler, apihelper, util
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.fake_api import FakeTelegramAPI
+
+COMPLETION_METHODS = {
+    'sendMessage', 'sendPhoto', 'editMessageCaption', 'editMessageText',
+    'editMessageReplyMarkup', 'editMessageMedia',
+}
+SEARCH_QUERIES = ['народ', 'праздник', 'суп', 'узор', 'блюдо', 'костюм', 'несуществующее']
+
+FLOWS = {
+    'browse': [
+        ('command', '/start'),
+        ('press', 'select_national'),
+        ('press', 'natpage_'),
+        ('press', 'natselect_'),
+        ('press', 'natcontinue'),
+        ('press', 'natcat_'),
+        ('press', 'itempage_'),
+        ('press', 'item_'),
+        ('press', 'natcat_'),
+        ('press', 'item_'),
+        ('press', 'main_menu'),
+    ],
+    'marathon': [
+        ('command', '/start'),
+        ('press', 'games_menu'),
+        ('press', 'game_marathon'),
+    ] + [('press', 'answer_marathon_')] * 10 + [('press', 'main_menu')],
+    'blitz': [
+        ('command', '/start'),
+        ('press', 'games_menu'),
+        ('press', 'game_blitz'),
+    ] + [('press', 'answer_blitz_')] * 5,
+    'national_quiz': [
+        ('command', '/start'),
+        ('press', 'games_menu'),
+        ('press', 'game_national_quiz'),
+        ('press', 'answer_national_'),
+        ('press', 'game_national_quiz'),
+        ('press', 'answer_national_'),
+        ('press', 'main_menu'),
+    ],
+    'image_quiz': [
+        ('command', '/start'),
+        ('press', 'games_menu'),
+        ('press', 'game_image_'),
+    ] + [('press', 'answer_image_'), ('press', 'imgnext_')] * 4 + [('press', 'main_menu')],
+    'match_pairs': [
+        ('command', '/start'),
+        ('press', 'games_menu'),
+        ('press', 'game_match_pairs'),
+    ] + [('press', 'match_select_item_'), ('press', 'match_select_nat_')] * 4,
+    'search': [
+        ('command', '/start'),
+        ('press', 'search_name'),
+        ('press', 'search_type_items'),
+        ('text', None),
+        ('press', 'searchitem_'),
+        ('press', 'search_name'),
+        ('press', 'search_type_national'),
+        ('text', 'рус'),
+        ('press', 'main_menu'),
+    ],
+}
+FLOW_WEIGHTS = {'browse': 4, 'marathon': 2, 'blitz': 2, 'national_quiz': 1, 'image_quiz': 1, 'match_pairs': 1, 'search': 3}
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class SimulatedChat:
+    def __init__(self, chat_id, steps):
+        self.chat_id = chat_id
+        self.steps = steps
+        self.position = 0
+        self.message_id = None
+        self.message = {}
+        self.buttons = []
+        self.pending = None
+
+    def finished(self):
+        return self.position >= len(self.steps)
+
+
+class CountingExceptionHandler(ExceptionHandler):
+    def __init__(self):
+        self.count = 0
+
+    def handle(self, exception):
+        self.count += 1
+        return True
+
+
+class LoadHarness:
+    def __init__(self, api, chats, concurrency, action_timeout, seed, double_tap=0.0):
+        self.api = api
+        self.concurrency = concurrency
+        self.action_timeout = action_timeout
+        self.double_tap = double_tap
+        self.random = random.Random(seed)
+
+        flows = list(FLOW_WEIGHTS)
+        weights = [FLOW_WEIGHTS[name] for name in flows]
+        self.waiting = []
+        self.flow_counts = Counter()
+        for idx in range(chats):
+            flow = self.random.choices(flows, weights)[0]
+            self.flow_counts[flow] += 1
+            self.waiting.append(SimulatedChat(10_000_000 + idx, FLOWS[flow]))
+        self.waiting.reverse()
+
+        self.active = {}
+        self.pending_callbacks = {}
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.query_ids = itertools.count(1)
+        self.user_message_ids = itertools.count(1_000_000_000)
+
+        self.latencies = {'callback': [], 'message': [], 'ack': []}
+        self.chat_calls = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.double_taps = 0
+
+        api.observers.append(self.on_api_call)
+
+    def start(self):
+        with self.lock:
+            for _ in range(self.concurrency):
+                self._activate_next()
+
+    def _activate_next(self):
+        if not self.waiting:
+            if not self.active:
+                self.done.set()
+            return
+        chat = self.waiting.pop()
+        self.active[chat.chat_id] = chat
+        self._send_next(chat)
+
+    def _send_next(self, chat):
+        while not chat.finished():
+            kind, value = chat.steps[chat.position]
+            chat.position += 1
+
+            if kind == 'press':
+                candidates = [data for data in chat.buttons if data.startswith(value)]
+                if not candidates or chat.message_id is None:
+                    self.skipped += 1
+                    continue
+                data = self.random.choice(candidates)
+                query_id = str(next(self.query_ids))
+                payload = {'callback_query': {
+                    'id': query_id,
+                    'from': {'id': chat.chat_id, 'is_bot': False, 'first_name': 'Load'},
+                    'chat_instance': str(chat.chat_id),
+                    'data': data,
+                    'message': dict(
+                        chat.message,
+                        message_id=chat.message_id,
+                        chat={'id': chat.chat_id, 'type': 'private'},
+                    ),
+                }}
+                chat.pending = ('callback', query_id, time.perf_counter())
+                self.pending_callbacks[query_id] = chat
+            else:
+                text = value if value is not None else self.random.choice(SEARCH_QUERIES)
+                message = {
+                    'message_id': next(self.user_message_ids),
+                    'date': int(time.time()),
+                    'chat': {'id': chat.chat_id, 'type': 'private'},
+                    'from': {'id': chat.chat_id, 'is_bot': False, 'first_name': 'Load'},
+                    'text': text,
+                }
+                if kind == 'command':
+                    message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+                payload = {'message': message}
+                chat.pending = ('message', None, time.perf_counter())
+
+            self.api.push_update(payload)
+            if kind == 'press' and self.random.random() < self.double_tap:
+                # an impatient second tap on the same button; nobody waits for its answer
+                self.double_taps += 1
+                repeat = dict(payload['callback_query'], id=str(next(self.query_ids)))
+                self.api.push_update({'callback_query': repeat})
+            return
+
+        del self.active[chat.chat_id]
+        self._activate_next()
+
+    def _complete(self, chat, finished_at):
+        kind, query_id, started_at = chat.pending
+        chat.pending = None
+        if query_id is not None:
+            self.pending_callbacks.pop(query_id, None)
+        if finished_at is None:
+            self.timeouts += 1
+        else:
+            self.latencies[kind].append((finished_at - started_at) * 1000)
+            self.completed += 1
+        self._send_next(chat)
+
+    def on_api_call(self, method, params, result, received_at):
+        with self.lock:
+            chat = None
+            if method == 'answerCallbackQuery':
+                chat = self.pending_callbacks.get(params.get('callback_query_id'))
+            elif params.get('chat_id'):
+                chat = self.active.get(int(params['chat_id']))
+            if chat is None:
+                return
+
+            self.chat_calls += 1
+            if isinstance(result, dict):
+                chat.message_id = result['message_id']
+                # a press carries the message as the user sees it, like Telegram sends it
+                chat.message = {
+                    key: result[key] for key in ('date', 'edit_date', 'caption', 'text', 'reply_markup') if key in result
+                }
+                markup = result.get('reply_markup')
+                if markup:
+                    chat.buttons = [
+                        button['callback_data']
+                        for row in markup.get('inline_keyboard', [])
+                        for button in row
+                        if 'callback_data' in button
+                    ]
+
+            if not chat.pending:
+                return
+            kind = chat.pending[0]
+            if kind == 'callback' and method == 'answerCallbackQuery':
+                # the spinner stops here; the press is done once its screen is rendered or a toast shown
+                self.latencies['ack'].append((received_at - chat.pending[2]) * 1000)
+                if params.get('text'):
+                    self._complete(chat, received_at)
+            elif method in COMPLETION_METHODS:
+                self._complete(chat, received_at)
+
+    def reap(self):
+        now = time.perf_counter()
+        with self.lock:
+            for chat in list(self.active.values()):
+                if chat.pending and now - chat.pending[2] > self.action_timeout:
+                    self._complete(chat, None)
+
+
+def run(args):
+    api = FakeTelegramAPI(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        upload_ms_per_kb=args.upload_ms_per_kb,
+        rate_limit_ratio=args.rate_limit,
+        retry_after=args.retry_after,
+        error_ratio=args.error_rate,
+        seed=args.seed,
+    ).start()
+    apihelper.API_URL = api.api_url
+
+    import bot as bot_module
+    from transport import transport
+    telegram = bot_module.bot
+    telegram.token = '123456:loadtest'
+    telegram.worker_pool = util.ThreadPool(telegram, num_threads=args.workers)
+    errors = CountingExceptionHandler()
+    telegram.exception_handler = errors
+
+    harness = LoadHarness(api, args.chats, args.concurrency, args.action_timeout, args.seed, args.double_tap)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='etnosfera-load-') as root:
+        if args.data_root:
+            os.chdir(args.data_root)
+        else:
+            generate_corpus(root, nationals=args.nationals, items_per_category=args.items, seed=args.seed)
+            os.chdir(root)
+
+        if args.processes > 1:
+            from workers import Router
+            router = Router(args.processes, args.session_store, token=telegram.token, poll_timeout=1).start()
+            poller = threading.Thread(target=router.poll, name='LoadRouter', daemon=True)
+        else:
+            router = None
+            poller = threading.Thread(
+                target=telegram.polling,
+                kwargs={'non_stop': True, 'interval': 0, 'timeout': 5, 'long_polling_timeout': 1},
+                name='LoadPolling',
+                daemon=True,
+            )
+        poller.start()
+
+        started = time.perf_counter()
+        harness.start()
+        deadline = started + args.max_duration
+        while not harness.done.wait(0.2):
+            harness.reap()
+            if time.perf_counter() > deadline:
+                break
+        duration = time.perf_counter() - started
+
+        if router:
+            router.stop()
+        else:
+            telegram.stop_polling()
+        poller.join(timeout=5)
+        os.chdir(cwd)
+    api.stop()
+
+    all_latencies = harness.latencies['callback'] + harness.latencies['message']
+    actions = harness.completed + harness.timeouts
+
+    def latency_summary(values):
+        return {
+            'count': len(values),
+            'p50_ms': round(percentile(values, 0.5), 2) if values else None,
+            'p90_ms': round(percentile(values, 0.9), 2) if values else None,
+            'p99_ms': round(percentile(values, 0.99), 2) if values else None,
+            'max_ms': round(max(values), 2) if values else None,
+        }
+
+    return {
+        'meta': {
+            'timestamp': int(time.time()),
+            'chats': args.chats,
+            'concurrency': args.concurrency,
+            'workers': args.workers,
+            'processes': args.processes,
+            'latency_ms': args.latency_ms,
+            'jitter_ms': args.jitter_ms,
+            'rate_limit': args.rate_limit,
+            'error_rate': args.error_rate,
+            'double_tap': args.double_tap,
+            'flows': dict(harness.flow_counts),
+        },
+        'results': {
+            'duration_s': round(duration, 3),
+            'actions': actions,
+            'completed': harness.completed,
+            'timeouts': harness.timeouts,
+            'skipped_steps': harness.skipped,
+            'double_taps': harness.double_taps,
+            'handler_errors': errors.count,
+            'throughput_actions_per_s': round(harness.completed / duration, 2) if duration else None,
+            'latency': latency_summary(all_latencies),
+            'latency_callback': latency_summary(harness.latencies['callback']),
+            'latency_message': latency_summary(harness.latencies['message']),
+            'latency_ack': latency_summary(harness.latencies['ack']),
+            'api_calls': harness.chat_calls,
+            'api_calls_per_action': round(harness.chat_calls / actions, 2) if actions else None,
+            'api_methods': dict(api.method_counts),
+            'rate_limited': dict(api.rate_limited),
+            'server_errors': dict(api.server_errors),
+            'transport': transport.stats(),
+            'renders': bot_module.renders.stats(),
+            'debounce': bot_module.debouncer.stats(),
+            'image_quiz': bot_module.get_image_quiz().stats(),
+            'upload_bytes': api.upload_bytes,
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Etnosfera end-to-end load test against a fake Bot API')
+    parser.add_argument('--chats', type=int, default=1000, help='number of simulated chats')
+    parser.add_argument('--concurrency', type=int, default=100, help='chats active at the same time')
+    parser.add_argument('--workers', type=int, default=2, help='bot handler threads')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='run the sharded multi-process mode with this many worker processes')
+    parser.add_argument('--session-store', default='memory://', help='session store for --processes')
+    parser.add_argument('--latency-ms', type=float, default=30)
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--upload-ms-per-kb', type=float, default=0.5)
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='fraction of API calls answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of API calls answered with 502')
+    parser.add_argument('--double-tap', type=float, default=0.0,
+                        help='fraction of button presses sent twice in a row')
+    parser.add_argument('--action-timeout', type=float, default=10.0)
+    parser.add_argument('--max-duration', type=float, default=600.0)
+    parser.add_argument('--nationals', type=int, default=10)
+    parser.add_argument('--items', type=int, default=20)
+    parser.add_argument('--data-root', help='run against an existing tree with regionals/ instead of a synthetic one')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON report to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
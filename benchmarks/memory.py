@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import generate_corpus
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ['eager', 'lazy', 'compressed']
+
+MEMORY_SCRIPT = '''
+import gc, json, random, sys, time, tracemalloc
+import catalog
+tracemalloc.start()
+started = time.perf_counter()
+built = catalog.Catalog(catalog.DATA_DIR)
+build_ms = (time.perf_counter() - started) * 1000
+gc.collect()
+resident = tracemalloc.get_traced_memory()[0]
+tracemalloc.stop()
+
+rng = random.Random(0)
+keys = [(national, category, idx)
+        for (national, category), items in built.items.items() for idx in range(len(items))]
+sample = [rng.choice(keys) for _ in range(int(sys.argv[1]))]
+
+def timed(func, keys):
+    timings = []
+    for key in keys:
+        started = time.perf_counter()
+        func(*key)
+        timings.append((time.perf_counter() - started) * 1e6)
+    return timings
+
+cold = timed(built.description, sample)
+# revisit recently opened cards, which is what the hot cache is for
+hot = timed(built.description, sample[-100:] * 10)
+excerpt = timed(built.excerpt, sample)
+print(json.dumps({
+    'items': len(keys),
+    'build_ms': build_ms,
+    'resident_bytes': resident,
+    'cold_us': cold,
+    'hot_us': hot,
+    'excerpt_us': excerpt,
+    'descriptions': built.description_stats(),
+}))
+'''
+
+
+def percentiles(values):
+    ordered = sorted(values)
+    return {
+        'p50_us': round(ordered[len(ordered) // 2], 2),
+        'p99_us': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 2),
+        'mean_us': round(statistics.fmean(ordered), 2),
+    }
+
+
+def profile(root, mode, samples, codec, budget):
+    env = dict(
+        os.environ,
+        PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''),
+        CATALOG_MODE=mode,
+        DESCRIPTION_CODEC=codec,
+        DESCRIPTION_BUDGET=str(budget),
+    )
+    proc = subprocess.run(
+        [sys.executable, '-c', MEMORY_SCRIPT, str(samples)],
+        cwd=root, env=env, capture_output=True, text=True, check=True,
+    )
+    sample = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        'build_ms': round(sample['build_ms'], 1),
+        'resident_bytes': sample['resident_bytes'],
+        'bytes_per_item': round(sample['resident_bytes'] / max(sample['items'], 1)),
+        'decode_cold': percentiles(sample['cold_us']),
+        'decode_hot': percentiles(sample['hot_us']),
+        'excerpt': percentiles(sample['excerpt_us']),
+        'descriptions': sample['descriptions'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Etnosfera catalog memory profile')
+    parser.add_argument('--nationals', type=int, default=80)
+    parser.add_argument('--items', type=int, default=30, help='items per category')
+    parser.add_argument('--description-length', type=int, default=1500)
+    parser.add_argument('--modes', nargs='*', choices=MODES, default=MODES)
+    parser.add_argument('--codec', choices=['zlib', 'zstd'], default='zlib')
+    parser.add_argument('--budget', type=int, default=4 * 1024 * 1024, help='lazy mode description budget, bytes')
+    parser.add_argument('--samples', type=int, default=2000, help='random descriptions to decode per mode')
+    parser.add_argument('--output', help='write JSON report to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='etnosfera-memory-') as root:
+        generate_corpus(
+            root,
+            nationals=args.nationals,
+            items_per_category=args.items,
+            description_length=args.description_length,
+        )
+        for mode in args.modes:
+            results[mode] = profile(root, mode, args.samples, args.codec, args.budget)
+
+    report = {
+        'meta': {
+            'timestamp': int(time.time()),
+            'nationals': args.nationals,
+            'items_per_category': args.items,
+            'description_length': args.description_length,
+            'codec': args.codec,
+            'budget': args.budget,
+            'samples': args.samples,
+        },
+        'results': results,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
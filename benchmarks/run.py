@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.fakebot import FakeBot, make_callback, make_message
+
+CHAT_ID = 100500
+SEARCH_QUERIES = ['народ', 'праздн', 'суп 3', 'узор', 'несуществующее']
+
+
+def load_bot(fake):
+    import bot as bot_module
+    from dispatch import ChatExecutor
+    bot_module.bot = fake
+    # render inline so each scenario is timed with its full render
+    bot_module.renders = ChatExecutor(0)
+    return bot_module
+
+
+def measure(func, repeat, setup=None, fake=None):
+    timings = []
+    calls = []
+    for run in range(repeat + 1):
+        if setup:
+            setup()
+        if fake:
+            fake.reset()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if run == 0:
+            continue
+        timings.append(elapsed * 1000)
+        if fake:
+            calls.append(len(fake.calls))
+    return timings, calls
+
+
+def summarize(timings, calls):
+    ordered = sorted(timings)
+    result = {
+        'runs': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered), 4),
+        'p50_ms': round(ordered[len(ordered) // 2], 4),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        'min_ms': round(ordered[0], 4),
+        'max_ms': round(ordered[-1], 4),
+    }
+    if calls:
+        result['api_calls'] = round(statistics.fmean(calls), 2)
+    return result
+
+
+def callback(bot_module, data):
+    return lambda: bot_module.callback_handler(make_callback(CHAT_ID, data))
+
+
+def text(bot_module, value):
+    return lambda: bot_module.text_handler(make_message(CHAT_ID, value))
+
+
+def set_state(bot_module, **state):
+    def setup():
+        bot_module.user_states[CHAT_ID] = {'last_photo': bot_module.MAIN_PHOTO, **state}
+    return setup
+
+
+def build_scenarios(bot_module):
+    import catalog
+    catalog.reset_catalog()
+
+    nationals = bot_module.get_all_nationals()
+    national = nationals[0]
+    items = bot_module.get_all_items_from_all_nationals()
+    names = [item['name'] for item in items]
+    list_path = os.path.join(bot_module.DATA_DIR, national, 'info', 'list.txt')
+
+    def fuzzy():
+        for query in SEARCH_QUERIES:
+            bot_module.fuzzy_search(query, names)
+
+    def marathon_answer_setup():
+        set_state(bot_module)()
+        bot_module.callback_handler(make_callback(CHAT_ID, 'game_marathon'))
+
+    def match_game_setup():
+        set_state(bot_module)()
+        bot_module.callback_handler(make_callback(CHAT_ID, 'game_match_pairs'))
+
+    def image_quiz_setup():
+        set_state(bot_module)()
+        bot_module.callback_handler(make_callback(CHAT_ID, 'game_image_bludo'))
+
+    match_game = bot_module.generate_match_pairs()
+    image_quiz = bot_module.get_image_quiz()
+
+    return [
+        ('parse_item_file', lambda: bot_module.parse_item_file(list_path), None),
+        ('catalog_build', lambda: catalog.Catalog(bot_module.DATA_DIR), None),
+        ('get_all_items_from_all_nationals', bot_module.get_all_items_from_all_nationals, None),
+        ('fuzzy_search', fuzzy, None),
+
+        ('generate_national_quiz', bot_module.generate_national_quiz, None),
+        ('generate_image_quiz', lambda: image_quiz.generate('bludo'), None),
+        ('generate_marathon_question', bot_module.generate_marathon_question, None),
+        ('generate_match_pairs', bot_module.generate_match_pairs, None),
+
+        ('create_main_menu', bot_module.create_main_menu, None),
+        ('create_games_menu', bot_module.create_games_menu, None),
+        ('create_search_type_menu', bot_module.create_search_type_menu, None),
+        ('create_nationals_menu', lambda: bot_module.create_nationals_menu(0, [national]), None),
+        ('create_categories_menu', lambda: bot_module.create_categories_menu(national), None),
+        ('create_items_menu', lambda: bot_module.create_items_menu(national, 'bludo', 1), None),
+        ('create_quiz_answer_buttons', lambda: bot_module.create_quiz_answer_buttons(nationals[:4], 'national'), None),
+        ('create_match_pairs_menu', lambda: match_game and bot_module.create_match_pairs_menu(match_game), None),
+
+        ('callback:main_menu', callback(bot_module, 'main_menu'), set_state(bot_module)),
+        ('callback:games_menu', callback(bot_module, 'games_menu'), set_state(bot_module)),
+        ('callback:select_national', callback(bot_module, 'select_national'), set_state(bot_module)),
+        ('callback:natpage', callback(bot_module, 'natpage_1'), set_state(bot_module)),
+        ('callback:natselect', callback(bot_module, f'natselect_{national}'), set_state(bot_module)),
+        ('callback:natcontinue', callback(bot_module, 'natcontinue'),
+         set_state(bot_module, selected_nationals=nationals[:3])),
+        ('callback:multicat', callback(bot_module, 'multicat_bludo'),
+         set_state(bot_module, selected_nationals=nationals[:3])),
+        ('callback:nat', callback(bot_module, f'nat_{national}'), set_state(bot_module)),
+        ('callback:natcat', callback(bot_module, f'natcat_{national}_bludo'), set_state(bot_module)),
+        ('callback:itempage', callback(bot_module, f'itempage_{national}_bludo_1'), set_state(bot_module)),
+        ('callback:item', callback(bot_module, f'item_{national}_info_0'), set_state(bot_module)),
+        ('callback:searchitem', callback(bot_module, f'searchitem_{national}_events_0'), set_state(bot_module)),
+        ('callback:game_national_quiz', callback(bot_module, 'game_national_quiz'), set_state(bot_module)),
+        ('callback:game_image_quiz', callback(bot_module, 'game_image_bludo'), set_state(bot_module)),
+        ('callback:answer_image', callback(bot_module, 'answer_image_0'), image_quiz_setup),
+        ('callback:game_marathon', callback(bot_module, 'game_marathon'), set_state(bot_module)),
+        ('callback:answer_marathon', callback(bot_module, 'answer_marathon_0'), marathon_answer_setup),
+        ('callback:game_blitz', callback(bot_module, 'game_blitz'), set_state(bot_module)),
+        ('callback:game_match_pairs', callback(bot_module, 'game_match_pairs'), set_state(bot_module)),
+        ('callback:match_select_item', callback(bot_module, 'match_select_item_0'), match_game_setup),
+
+        ('text:search_national', text(bot_module, 'рус'), set_state(bot_module, search_mode='national')),
+        ('text:search_items', text(bot_module, 'праздник'), set_state(bot_module, search_mode='all_items')),
+        ('text:search_category', text(bot_module, 'суп'),
+         set_state(bot_module, search_type=f'items_{national}_bludo')),
+    ]
+
+
+def run(args):
+    random.seed(args.seed)
+    fake = FakeBot()
+    bot_module = load_bot(fake)
+
+    import catalog
+    catalog.CATALOG_MODE = args.catalog_mode
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='etnosfera-bench-') as root:
+        generate_corpus(
+            root,
+            nationals=args.nationals,
+            items_per_category=args.items,
+            description_length=args.description_length,
+            seed=args.seed,
+        )
+        cwd = os.getcwd()
+        os.chdir(root)
+        try:
+            for name, func, setup in build_scenarios(bot_module):
+                if args.only and not any(part in name for part in args.only):
+                    continue
+                counted = fake if name.startswith(('callback:', 'text:')) else None
+                timings, calls = measure(func, args.repeat, setup, counted)
+                results[name] = summarize(timings, calls)
+            descriptions = catalog.get_catalog().description_stats()
+        finally:
+            os.chdir(cwd)
+
+    return {
+        'meta': {
+            'timestamp': int(time.time()),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'nationals': args.nationals,
+            'items_per_category': args.items,
+            'description_length': args.description_length,
+            'catalog_mode': args.catalog_mode,
+            'descriptions': descriptions,
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold):
+    regressions = []
+    for name, current in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or not previous['mean_ms']:
+            continue
+        change = (current['mean_ms'] - previous['mean_ms']) / previous['mean_ms']
+        if change > threshold:
+            regressions.append((name, previous['mean_ms'], current['mean_ms'], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Etnosfera benchmark suite')
+    parser.add_argument('--nationals', type=int, default=10)
+    parser.add_argument('--items', type=int, default=20, help='items per category')
+    parser.add_argument('--description-length', type=int, default=400)
+    parser.add_argument('--catalog-mode', choices=['eager', 'lazy', 'compressed'], default='eager')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='*', help='run only scenarios containing these substrings')
+    parser.add_argument('--output', help='write JSON report to this file instead of stdout')
+    parser.add_argument('--compare', help='baseline JSON report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed relative slowdown of mean time before failing')
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for name, before, after, change in regressions:
+            print(f'REGRESSION {name}: {before:.3f}ms -> {after:.3f}ms (+{change:.0%})', file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
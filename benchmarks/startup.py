@@ -0,0 +1,138 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import generate_corpus
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORTTIME_RE = re.compile(r'^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)$')
+
+STARTUP_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+import bot
+from benchmarks.fakebot import FakeBot, make_callback, make_message
+imported = time.perf_counter()
+bot.bot = FakeBot()
+bot.renders = bot.ChatExecutor(0)
+ready = {}
+thread = bot.warmup(lambda catalog: ready.setdefault('at', time.perf_counter()))
+bot.start_handler(make_message(1, '/start'))
+answered = time.perf_counter()
+bot.callback_handler(make_callback(1, 'select_national'))
+menu = time.perf_counter()
+thread.join()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_start_ms': (answered - started) * 1000,
+    'first_menu_ms': (menu - started) * 1000,
+    'catalog_ready_ms': (ready['at'] - started) * 1000,
+    'fuzzywuzzy_loaded': 'fuzzywuzzy' in sys.modules,
+}))
+'''
+
+
+def import_profile(runs):
+    totals = []
+    modules = {}
+    direct_names = set()
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import bot'],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        )
+        # -X importtime prints children before their parent, so the direct
+        # imports of bot are the depth-1 entries since the previous top-level one
+        children = []
+        for line in proc.stderr.splitlines():
+            match = IMPORTTIME_RE.match(line)
+            if not match:
+                continue
+            self_us, cumulative_us, indent, name = match.groups()
+            depth = len(indent) // 2
+            entry = modules.setdefault(name, {'self': [], 'cumulative': []})
+            entry['self'].append(int(self_us))
+            entry['cumulative'].append(int(cumulative_us))
+            if depth == 1:
+                children.append(name)
+            elif depth == 0:
+                if name == 'bot':
+                    totals.append(int(cumulative_us))
+                    direct_names.update(children)
+                children = []
+
+    def ms(values):
+        return round(statistics.median(values) / 1000, 3)
+
+    direct = sorted(
+        ((name, ms(modules[name]['cumulative'])) for name in direct_names),
+        key=lambda pair: pair[1], reverse=True,
+    )
+    heaviest = sorted(
+        ((name, ms(entry['self'])) for name, entry in modules.items()),
+        key=lambda pair: pair[1], reverse=True,
+    )
+    return {
+        'bot_import_ms': ms(totals),
+        'direct_imports_ms': dict(direct),
+        'top_self_ms': dict(heaviest[:15]),
+    }
+
+
+def startup_profile(runs, nationals, items):
+    samples = []
+    with tempfile.TemporaryDirectory(prefix='etnosfera-startup-') as root:
+        generate_corpus(root, nationals=nationals, items_per_category=items)
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+        for _ in range(runs):
+            started = time.perf_counter()
+            proc = subprocess.run(
+                [sys.executable, '-c', STARTUP_SCRIPT],
+                cwd=root, env=env, capture_output=True, text=True, check=True,
+            )
+            sample = json.loads(proc.stdout.strip().splitlines()[-1])
+            sample['process_ms'] = (time.perf_counter() - started) * 1000
+            samples.append(sample)
+
+    result = {}
+    for key in ('import_ms', 'first_start_ms', 'first_menu_ms', 'catalog_ready_ms', 'process_ms'):
+        result[key] = round(statistics.median(sample[key] for sample in samples), 3)
+    result['fuzzywuzzy_loaded'] = any(sample['fuzzywuzzy_loaded'] for sample in samples)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Etnosfera startup profile')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--nationals', type=int, default=80)
+    parser.add_argument('--items', type=int, default=30)
+    parser.add_argument('--output', help='write JSON report to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    report = {
+        'meta': {
+            'timestamp': int(time.time()),
+            'runs': args.runs,
+            'nationals': args.nationals,
+            'items_per_category': args.items,
+        },
+        'importtime': import_profile(args.runs),
+        'startup': startup_profile(args.runs, args.nationals, args.items),
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
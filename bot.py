@@ -1,103 +1,72 @@
 import telebot
 from telebot import types
+import functools
+import html
+import logging
 import os
 import random
-from fuzzywuzzy import fuzz
-from config import TOKEN, ITEMS_PER_PAGE, DATA_DIR, CATEGORY_NAMES
+import signal
+import sys
+import time
+from config import TOKEN, ITEMS_PER_PAGE, DATA_DIR, MAIN_PHOTO, CATEGORY_NAMES, ADMIN_IDS, FEEDBACK_PER_PAGE, LEADERBOARD_SIZE, WORKERS
+from config import INLINE_PAGE_SIZE, INLINE_CACHE_TIME, API_PORT, HTTP_POOL_SIZE, BROADCAST_THREADS, MEDIA_CACHE_CHAT_ID
 from nationals import get_russian_name, get_english_name
+from catalog import get_catalog, peek_catalog, parse_item_file, scan_nationals, warmup, watch_catalog
+from assets import load_asset, fallback_asset, cached_file_id, remember_file_id, forget_file_id
+from feedback import save_feedback, feedback_page
+from events import track
+from leaderboard import leaderboard
+from snapshots import Snapshotter
+from broadcast import broadcasts
+from search_index import get_search_index
+from cards import get_cards
+from transport import CircuitOpenError, install as install_transport, is_unavailable
+from dispatch import ChatExecutor, Debouncer
+from image_quiz import get_image_quiz
+from logs import setup as setup_logging, traced
+from memstats import format_bytes, memory_report, start_monitor, tracer
+from backlog import OffsetKeeper, load_offset, recover
+
+logger = logging.getLogger(__name__)
 
 bot = telebot.TeleBot(TOKEN, parse_mode='HTML')
+renders = ChatExecutor()
+debouncer = Debouncer()
+# handler and render threads, broadcast senders and the poller each hold at most one connection
+install_transport(HTTP_POOL_SIZE or len(bot.worker_pool.workers) + renders.threads + BROADCAST_THREADS + 2)
 
 user_states = {}
-MAIN_PHOTO = 'imgs/example.png'
+snapshots = Snapshotter(user_states)
 
-def get_all_nationals():
-    nationals = []
-    if os.path.exists(DATA_DIR):
-        for item in os.listdir(DATA_DIR):
-            path = os.path.join(DATA_DIR, item)
-            if os.path.isdir(path):
-                nationals.append(item)
-    return sorted(nationals)
+# these answer with a toast that depends on the render, so they are acknowledged by the render itself
+TOAST_ROUTES = ('match_select_', 'natcontinue', 'fbpage_')
+# pure navigation; a queued render is skipped once the same chat has pressed something newer
+NAVIGATION_ROUTES = (
+    'games_menu', 'main_menu', 'search_name', 'select_category', 'contacts', 'nat_', 'natcat_',
+    'itempage_', 'item_', 'searchitem_', 'cardpage_', 'multicat_', 'cat_', 'leaders_',
+)
 
-def parse_item_file(filepath):
-    items = []
-    if not os.path.exists(filepath):
-        return items
-    
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except Exception as e:
-        print(f"Error reading {filepath}: {e}")
-        return items
-    
-    import re
-    
-    pattern = r'=START=\s*{([^}]+)}\s*===([\s\S]*?)=END=\s*{[^}]+}\s*==='
-    matches = re.findall(pattern, content)
-    
-    for match in matches:
-        try:
-            header_content = match[0].strip()
-            description = match[1].strip()
-            
-            parts = header_content.split('/')
-            if len(parts) < 3:
-                continue
-            
-            name_part = parts[0].strip()
-            if ':' in name_part:
-                name = name_part.split(':', 1)[1].strip()
-            else:
-                name = name_part
-            
-            image = parts[1].strip()
-            date_raw = parts[2].strip()
-            
-            if date_raw.endswith('g'):
-                date = date_raw[:-1] + ' год'
-            elif date_raw.endswith('gg'):
-                date = date_raw[:-2] + ' гг'
-            elif '.' in date_raw or len(date_raw) >= 8:
-                date = date_raw
-            else:
-                date = date_raw
-            
-            items.append({
-                'name': name,
-                'image': image,
-                'date': date,
-                'description': description
-            })
-        except Exception as e:
-            print(f"Error parsing block: {e}")
-            continue
-    
-    return items
+IMAGE_QUIZZES = {
+    'bludo': ('🍲', 'Угадай блюдо', 'Как называется это блюдо?'),
+    'kostyum': ('👘', 'Угадай костюм', 'Как называется этот костюм?'),
+    'ornament': ('🌀', 'Угадай орнамент', 'Как называется этот орнамент?'),
+}
+
+def get_all_nationals():
+    catalog = peek_catalog()
+    if catalog is None:
+        return scan_nationals(DATA_DIR)
+    return catalog.nationals
 
 def get_category_items(national, category):
-    filepath = os.path.join(DATA_DIR, national, category, 'list.txt')
-    return parse_item_file(filepath)
+    return get_catalog().category_items(national, category)
 
 def get_all_items_from_all_nationals():
-    all_items = []
-    nationals = get_all_nationals()
-    
-    for national in nationals:
-        for category in CATEGORY_NAMES.keys():
-            items = get_category_items(national, category)
-            for idx, item in enumerate(items):
-                all_items.append({
-                    'name': item['name'],
-                    'national': national,
-                    'category': category,
-                    'item_data': item
-                })
-    
-    return all_items
+    return list(get_catalog().all_items)
 
 def fuzzy_search(query, items, threshold=50):
+    from fuzzywuzzy import fuzz
+    
     results = []
     for item in items:
         ratio = fuzz.partial_ratio(query.lower(), item.lower())
@@ -110,13 +79,76 @@ def delete_message_safe(chat_id, message_id):
     try:
         if message_id:
             bot.delete_message(chat_id, message_id)
+    except CircuitOpenError:
+        pass
+    except Exception as e:
+        logger.warning('Delete message error: %s', e)
+
+def resolve_photo(photo_path):
+    catalog = peek_catalog()
+    if catalog is None:
+        return load_asset(photo_path) or fallback_asset()
+    return catalog.assets.resolve(photo_path)
+
+def send_asset(chat_id, asset, caption, reply_markup):
+    file_id = cached_file_id(asset)
+    if file_id:
+        try:
+            return bot.send_photo(chat_id, file_id, caption=caption, reply_markup=reply_markup)
+        except Exception as e:
+            logger.warning('Cached photo error: %s', e)
+            forget_file_id(asset)
+    
+    with open(asset.path, 'rb') as photo:
+        msg = bot.send_photo(chat_id, photo, caption=caption, reply_markup=reply_markup)
+    if msg.photo:
+        remember_file_id(asset, msg.photo[-1].file_id)
+    return msg
+
+def warm_file_id(asset):
+    # upload once to the media cache chat, so later the photo can be shown by file_id alone
+    if not MEDIA_CACHE_CHAT_ID or asset.fallback or cached_file_id(asset):
+        return
+    with open(asset.path, 'rb') as photo:
+        msg = bot.send_photo(MEDIA_CACHE_CHAT_ID, photo, disable_notification=True)
+    if msg.photo:
+        remember_file_id(asset, msg.photo[-1].file_id)
+    delete_message_safe(MEDIA_CACHE_CHAT_ID, msg.message_id)
+
+def swap_photo(chat_id, asset, caption, reply_markup, message_id=None, previous_photo=None):
+    # replaces the picture in place with one edit instead of delete + send
+    if not message_id or previous_photo == asset.path:
+        send_with_photo(chat_id, asset.path, caption, reply_markup, message_id, previous_photo)
+        return
+    
+    file_id = cached_file_id(asset)
+    try:
+        if file_id:
+            media = types.InputMediaPhoto(file_id, caption=caption, parse_mode='HTML')
+            bot.edit_message_media(media, chat_id=chat_id, message_id=message_id, reply_markup=reply_markup)
+        else:
+            with open(asset.path, 'rb') as photo:
+                media = types.InputMediaPhoto(photo, caption=caption, parse_mode='HTML')
+                msg = bot.edit_message_media(media, chat_id=chat_id, message_id=message_id, reply_markup=reply_markup)
+            if getattr(msg, 'photo', None):
+                remember_file_id(asset, msg.photo[-1].file_id)
     except Exception as e:
-        print(f"Delete message error: {e}")
+        if is_unavailable(e):
+            raise
+        logger.warning('Edit media error: %s', e)
+        if file_id:
+            forget_file_id(asset)
+        send_with_photo(chat_id, asset.path, caption, reply_markup, message_id, previous_photo)
+        return
+    
+    if chat_id in user_states:
+        user_states[chat_id]['last_message_id'] = message_id
+        user_states[chat_id]['last_photo'] = asset.path
 
 def send_with_photo(chat_id, photo_path, caption, reply_markup, message_id=None, previous_photo=None):
     try:
-        if not os.path.exists(photo_path):
-            photo_path = MAIN_PHOTO
+        asset = resolve_photo(photo_path)
+        photo_path = asset.path
         
         if message_id and previous_photo and previous_photo == photo_path:
             try:
@@ -131,20 +163,21 @@ def send_with_photo(chat_id, photo_path, caption, reply_markup, message_id=None,
                     user_states[chat_id]['last_photo'] = photo_path
                 return
             except Exception as e:
-                print(f"Edit caption error: {e}")
+                logger.warning('Edit caption error: %s', e)
         
         if message_id:
             delete_message_safe(chat_id, message_id)
         
-        with open(photo_path, 'rb') as photo:
-            msg = bot.send_photo(chat_id, photo, caption=caption, reply_markup=reply_markup)
-            
-            if chat_id in user_states:
-                user_states[chat_id]['last_message_id'] = msg.message_id
-                user_states[chat_id]['last_photo'] = photo_path
+        msg = send_asset(chat_id, asset, caption, reply_markup)
+        if chat_id in user_states:
+            user_states[chat_id]['last_message_id'] = msg.message_id
+            user_states[chat_id]['last_photo'] = photo_path
     
     except Exception as e:
-        print(f"Send photo error: {e}")
+        logger.warning('Send photo error: %s', e)
+        # a text fallback would only fail the same way while the API itself is down
+        if is_unavailable(e):
+            raise
         msg = bot.send_message(chat_id, caption, reply_markup=reply_markup)
         if chat_id in user_states:
             user_states[chat_id]['last_message_id'] = msg.message_id
@@ -174,39 +207,6 @@ def generate_national_quiz():
         'options': options
     }
 
-def generate_food_quiz():
-    all_items = []
-    nationals = get_all_nationals()
-    
-    for national in nationals:
-        items = get_category_items(national, 'food')
-        for item in items:
-            all_items.append({
-                'item': item,
-                'national': national
-            })
-    
-    if not all_items:
-        return None
-    
-    correct = random.choice(all_items)
-    
-    if len(all_items) < 4:
-        options = [item['item']['name'] for item in all_items]
-    else:
-        options = [correct['item']['name']]
-        other_items = [item for item in all_items if item['item']['name'] != correct['item']['name']]
-        options.extend([item['item']['name'] for item in random.sample(other_items, min(3, len(other_items)))])
-        random.shuffle(options)
-    
-    return {
-        'type': 'food_quiz',
-        'item': correct['item'],
-        'national': correct['national'],
-        'correct_answer': correct['item']['name'],
-        'options': options
-    }
-
 def generate_marathon_question():
     question_type = random.choice(['national', 'category', 'fact'])
     
@@ -290,6 +290,12 @@ def generate_match_pairs():
         'current_item': None
     }
 
+def quiz_item_key(quiz):
+    if quiz['type'] == 'image_quiz':
+        return quiz['national'], quiz['category'], quiz['correct_answer']
+    item = quiz['item']
+    return item['national'], item['category'], item['name']
+
 def create_main_menu():
     markup = types.InlineKeyboardMarkup(row_width=1)
     markup.add(
@@ -306,10 +312,13 @@ def create_games_menu():
     markup = types.InlineKeyboardMarkup(row_width=1)
     markup.add(
         types.InlineKeyboardButton('🌍 Угадай национальность', callback_data='game_national_quiz'),
-        types.InlineKeyboardButton('🍲 Угадай блюдо', callback_data='game_food_quiz'),
+        types.InlineKeyboardButton('🍲 Угадай блюдо', callback_data='game_image_bludo'),
+        types.InlineKeyboardButton('👘 Угадай костюм', callback_data='game_image_kostyum'),
+        types.InlineKeyboardButton('🌀 Угадай орнамент', callback_data='game_image_ornament'),
         types.InlineKeyboardButton('🏆 Культурный марафон', callback_data='game_marathon'),
         types.InlineKeyboardButton('🎯 Найди пару', callback_data='game_match_pairs'),
         types.InlineKeyboardButton('⚡ Блиц-викторина', callback_data='game_blitz'),
+        types.InlineKeyboardButton('🏅 Таблица лидеров', callback_data='leaders_marathon_all'),
         types.InlineKeyboardButton('🏠 Главное меню', callback_data='main_menu')
     )
     return markup
@@ -366,6 +375,49 @@ def create_match_pairs_menu(game_data):
     
     return markup
 
+def player_name(user):
+    if not user:
+        return 'Игрок'
+    return user.first_name or user.username or 'Игрок'
+
+def create_leaderboard_view(chat_id, game='marathon', scope='all'):
+    game_names = {'marathon': '🏆 Культурный марафон', 'blitz': '⚡ Блиц-викторина'}
+    scope_names = {'all': 'за всё время', 'week': 'за неделю', 'class': 'в классе'}
+    
+    class_name = leaderboard.get_class(chat_id)
+    text = f'🏅 <b>Таблица лидеров</b>\n{game_names[game]} — {scope_names[scope]}\n\n'
+    
+    if scope == 'class' and not class_name:
+        text += 'Укажите свой класс командой /class, например: <code>/class 7А</code>'
+    else:
+        rows = leaderboard.top(game, scope, class_name if scope == 'class' else None, LEADERBOARD_SIZE)
+        if not rows:
+            text += 'Пока нет результатов. Сыграйте первым!'
+        medals = {1: '🥇', 2: '🥈', 3: '🥉'}
+        for place, row in enumerate(rows, 1):
+            name = html.escape(row['name'] or 'Игрок')
+            if row['class_name'] and scope != 'class':
+                name += f" ({html.escape(row['class_name'])})"
+            text += f"{medals.get(place, f'{place}.')} {name} — {row['score']}\n"
+    
+    rank = leaderboard.rank(game, chat_id)
+    if rank:
+        text += f'\n📍 Ваше место: {rank} из {leaderboard.players(game)} (лучший результат: {leaderboard.best_score(game, chat_id)})'
+    
+    markup = types.InlineKeyboardMarkup()
+    markup.row(*[
+        types.InlineKeyboardButton(('• ' if g == game else '') + name.split(' ', 1)[1], callback_data=f'leaders_{g}_{scope}')
+        for g, name in game_names.items()
+    ])
+    markup.row(*[
+        types.InlineKeyboardButton(('• ' if s == scope else '') + name.capitalize(), callback_data=f'leaders_{game}_{s}')
+        for s, name in scope_names.items()
+    ])
+    markup.add(types.InlineKeyboardButton('🎮 Другие игры', callback_data='games_menu'))
+    markup.add(types.InlineKeyboardButton('🏠 Главное меню', callback_data='main_menu'))
+    
+    return text, markup
+
 def create_search_type_menu():
     markup = types.InlineKeyboardMarkup(row_width=1)
     markup.add(
@@ -478,8 +530,162 @@ def create_items_menu(national, category, page=0, selected_idx=None):
     
     return markup
 
+def create_card_markup(variant, national, category, item_idx, page=0, pages=1):
+    markup = types.InlineKeyboardMarkup()
+    
+    if pages > 1:
+        nav_buttons = []
+        if page > 0:
+            nav_buttons.append(types.InlineKeyboardButton(
+                '◀️ Назад', callback_data=f'cardpage_{variant}_{national}_{category}_{item_idx}_{page-1}'))
+        if page < pages - 1:
+            nav_buttons.append(types.InlineKeyboardButton(
+                'Дальше ▶️', callback_data=f'cardpage_{variant}_{national}_{category}_{item_idx}_{page+1}'))
+        markup.row(*nav_buttons)
+    
+    if variant == 'search':
+        markup.add(types.InlineKeyboardButton('⬅️ К списку', callback_data=f'natcat_{national}_{category}'))
+        markup.add(types.InlineKeyboardButton('🔍 Новый поиск', callback_data='search_name'))
+    else:
+        markup.add(types.InlineKeyboardButton('⬅️ Назад к списку', callback_data=f'natcat_{national}_{category}'))
+    markup.add(types.InlineKeyboardButton('🏠 Главное меню', callback_data='main_menu'))
+    return markup
+
+def create_inline_result(entry):
+    item = entry['item']
+    ru_name = get_russian_name(entry['national'])
+    cat_name = CATEGORY_NAMES.get(entry['category'], entry['category'])
+    text = get_cards().pages('search', entry['national'], entry['category'], entry['idx'])[0]
+    
+    asset = get_catalog().assets.item(entry['national'], entry['category'], item['image'])
+    file_id = None if asset.fallback else cached_file_id(asset)
+    if file_id:
+        return types.InlineQueryResultCachedPhoto(
+            entry['id'],
+            file_id,
+            title=item['name'],
+            description=f'{ru_name} · {cat_name}',
+            caption=text,
+            parse_mode='HTML'
+        )
+    
+    return types.InlineQueryResultArticle(
+        entry['id'],
+        item['name'],
+        types.InputTextMessageContent(text, parse_mode='HTML'),
+        description=f"{ru_name} · {cat_name} · {item['date']}"
+    )
+
+def is_admin(chat_id):
+    return chat_id in ADMIN_IDS
+
+def create_feedback_page(page=0):
+    records, has_more = feedback_page(page, FEEDBACK_PER_PAGE)
+    
+    if not records:
+        text = '💬 <b>Отзывы</b>\n\nОтзывов пока нет.' if page == 0 else '💬 <b>Отзывы</b>\n\nБольше отзывов нет.'
+    else:
+        lines = [f'💬 <b>Отзывы</b> — страница {page + 1}\n']
+        for record in records:
+            when = time.strftime('%d.%m.%Y %H:%M', time.localtime(record.get('ts', 0)))
+            author = html.escape(record.get('name') or 'Без имени')
+            if record.get('username'):
+                author += f" (@{html.escape(record['username'])})"
+            body = html.escape((record.get('text') or '')[:600])
+            lines.append(f'🕒 {when} · {author}\n{body}\n')
+        text = '\n'.join(lines)
+    
+    markup = types.InlineKeyboardMarkup()
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(types.InlineKeyboardButton('◀️', callback_data=f'fbpage_{page-1}'))
+    if has_more:
+        nav_buttons.append(types.InlineKeyboardButton('▶️', callback_data=f'fbpage_{page+1}'))
+    if nav_buttons:
+        markup.row(*nav_buttons)
+    
+    return text, markup
+
+BROADCAST_STATUSES = {
+    'pending': '⏳ в очереди',
+    'running': '📤 отправляется',
+    'done': '✅ завершена',
+    'cancelled': '⛔ отменена',
+}
+
+def create_broadcast_status():
+    jobs = broadcasts.recent()
+    lines = [
+        '📣 <b>Рассылки</b>\n',
+        f'Получателей: {broadcasts.active_chats()}\n',
+    ]
+    for job in jobs:
+        when = time.strftime('%d.%m.%Y %H:%M', time.localtime(job['created']))
+        lines.append(
+            f"#{job['id']} · {when} · {BROADCAST_STATUSES.get(job['status'], job['status'])}\n"
+            f"доставлено {job['sent']}/{job['total']}, заблокировали {job['blocked']}, ошибок {job['failed']}"
+        )
+    if not jobs:
+        lines.append('Рассылок ещё не было.')
+    lines.append(
+        '\nНовая рассылка: <code>/broadcast текст</code> или '
+        '<code>/broadcast regionals/.../фото.png текст</code>\n'
+        'Отмена: <code>/broadcast cancel номер</code>'
+    )
+    return '\n'.join(lines)
+
+MEMORY_KINDS = {
+    'quiz': 'викторины',
+    'marathon': 'марафон',
+    'blitz': 'блиц',
+    'match': '«Найди пару»',
+    'search': 'поиск',
+    'navigation': 'навигация',
+    'feedback': 'обратная связь',
+    'other': 'прочее',
+}
+
+def create_memory_report():
+    report = memory_report(user_states, peek_catalog())
+    lines = [f"🧠 <b>Память</b> (pid {report['pid']})\n", f"RSS: {format_bytes(report['rss_bytes'])}"]
+    catalog = report.get('catalog')
+    if catalog:
+        line = f"Каталог ({catalog['mode']}, {catalog['items']} элементов): {format_bytes(catalog['bytes'])}"
+        if 'descriptions_bytes' in catalog:
+            line += f", описания {format_bytes(catalog['descriptions_bytes'])}"
+        lines.append(line)
+    
+    sessions = report['sessions']
+    lines.append(f"\n<b>Сессии:</b> {sessions['entries']}, {format_bytes(sessions['bytes'])}")
+    for kind, entry in sessions['kinds'].items():
+        lines.append(f"• {MEMORY_KINDS.get(kind, kind)}: {entry['sessions']}, {format_bytes(entry['bytes'])}")
+    
+    lines.append('\n<b>Кэши:</b>')
+    for name, entry in report['caches'].items():
+        lines.append(f"• {name}: {entry['entries']}, {format_bytes(entry['bytes'])}")
+    
+    tracing = report['tracing']
+    if tracing['enabled']:
+        lines.append(f"\ntracemalloc: {format_bytes(tracing['traced_bytes'])}, накладные {format_bytes(tracing['overhead_bytes'])}")
+    lines.append(f"\nОтчёт за {report['report_ms']:.0f} мс. Трассировка: <code>/mem trace start</code>, <code>/mem trace</code>, <code>/mem trace stop</code>")
+    return '\n'.join(lines)
+
+def create_trace_report(diff):
+    since = time.strftime('%d.%m %H:%M:%S', time.localtime(diff['since'])) if diff['since'] else 'запуска'
+    lines = [f'🔬 <b>Рост памяти с {since}</b>\n']
+    for entry in diff['top']:
+        lines.append(
+            f"<code>{html.escape(entry['where'])}</code>\n"
+            f"{format_bytes(entry['size_diff'])} ({entry['count_diff']:+d} объектов), всего {format_bytes(entry['size'])}"
+        )
+    if not diff['top']:
+        lines.append('Изменений нет.')
+    return '\n'.join(lines)
+
 @bot.message_handler(commands=['start'])
+@snapshots.tracked
 def start_handler(message):
+    broadcasts.remember_chat(message.chat.id)
     delete_message_safe(message.chat.id, message.message_id)
     
     user_states[message.chat.id] = {'last_photo': MAIN_PHOTO}
@@ -498,10 +704,154 @@ def start_handler(message):
     
     send_with_photo(message.chat.id, MAIN_PHOTO, welcome_text, create_main_menu())
 
+@bot.message_handler(commands=['feedback'], func=lambda message: is_admin(message.chat.id))
+def feedback_list_handler(message):
+    delete_message_safe(message.chat.id, message.message_id)
+    
+    text, markup = create_feedback_page(0)
+    bot.send_message(message.chat.id, text, reply_markup=markup)
+
+@bot.message_handler(commands=['broadcast'], func=lambda message: is_admin(message.chat.id))
+def broadcast_handler(message):
+    chat_id = message.chat.id
+    parts = message.text.split(maxsplit=1)
+    args = parts[1].strip() if len(parts) > 1 else ''
+    
+    if not args:
+        bot.send_message(chat_id, create_broadcast_status())
+        return
+    
+    if args.split()[0] == 'cancel':
+        job_id = args.split()[-1]
+        if job_id.isdigit() and broadcasts.cancel(int(job_id)):
+            text = f'⛔ Рассылка #{job_id} отменена'
+        else:
+            text = '❌ Рассылка не найдена или уже завершена'
+        bot.send_message(chat_id, text)
+        return
+    
+    asset = None
+    text = args
+    first = args.split(maxsplit=1)
+    if first[0].startswith(DATA_DIR + '/'):
+        asset = get_catalog().assets.resolve(first[0])
+        if asset.fallback:
+            bot.send_message(chat_id, f'❌ Изображение не найдено: {html.escape(first[0])}')
+            return
+        text = first[1] if len(first) > 1 else ''
+    
+    if not text:
+        bot.send_message(chat_id, '❌ Укажите текст рассылки')
+        return
+    
+    # the preview checks the markup and uploads the photo once for the whole broadcast
+    try:
+        if asset:
+            msg = send_asset(chat_id, asset, text, None)
+            file_id = msg.photo[-1].file_id if msg.photo else None
+        else:
+            bot.send_message(chat_id, text)
+            file_id = None
+    except Exception as e:
+        bot.send_message(chat_id, f'❌ Не удалось отправить предпросмотр: {html.escape(str(e))}')
+        return
+    
+    job_id = broadcasts.enqueue(chat_id, text, asset.path if asset else None, file_id)
+    bot.send_message(
+        chat_id,
+        f'📣 Рассылка #{job_id} поставлена в очередь. Получателей: {broadcasts.active_chats()}\n'
+        f'Отменить: <code>/broadcast cancel {job_id}</code>'
+    )
+
+@bot.message_handler(commands=['mem'], func=lambda message: is_admin(message.chat.id))
+def memory_handler(message):
+    chat_id = message.chat.id
+    args = message.text.split()[1:]
+    
+    if args[:1] == ['trace']:
+        action = args[1] if len(args) > 1 else 'diff'
+        if action == 'start':
+            tracer.start()
+            text = '🔬 tracemalloc включён. <code>/mem trace</code> покажет рост памяти с этого момента.'
+        elif action == 'stop':
+            tracer.stop()
+            text = '🔬 tracemalloc выключен.'
+        else:
+            diff = tracer.diff()
+            text = create_trace_report(diff) if diff else '🔬 tracemalloc не запущен: <code>/mem trace start</code>'
+    else:
+        text = create_memory_report()
+    
+    bot.send_message(chat_id, text)
+
+@bot.message_handler(commands=['class'])
+@snapshots.tracked
+def class_handler(message):
+    chat_id = message.chat.id
+    delete_message_safe(chat_id, message.message_id)
+    
+    if chat_id not in user_states:
+        user_states[chat_id] = {}
+    last_msg_id = user_states[chat_id].get('last_message_id')
+    last_photo = user_states[chat_id].get('last_photo', MAIN_PHOTO)
+    
+    parts = message.text.split(maxsplit=1)
+    if len(parts) > 1:
+        class_name = parts[1].strip().upper()[:10]
+        leaderboard.set_class(chat_id, class_name)
+        text = f'✅ <b>Класс сохранён:</b> {html.escape(class_name)}\n\nТеперь вы участвуете в рейтинге своего класса.'
+    else:
+        class_name = leaderboard.get_class(chat_id)
+        current = html.escape(class_name) if class_name else 'не указан'
+        text = f'🏫 <b>Ваш класс:</b> {current}\n\nЧтобы указать класс, отправьте: <code>/class 7А</code>'
+    
+    send_with_photo(chat_id, MAIN_PHOTO, text, create_games_menu(), last_msg_id, last_photo)
+
+def answer_callback(call, text=None):
+    # a query can be answered only once; a toast for a press already acknowledged goes to the chat instead
+    if getattr(call, 'answered', False):
+        if text:
+            bot.send_message(call.message.chat.id, text)
+        return
+    call.answered = True
+    bot.answer_callback_query(call.id, text)
+
+def route_args(data, count):
+    # the national key comes first and may contain underscores, the fields after it never do
+    return data.split('_', 1)[1].rsplit('_', count - 1)
+
 @bot.callback_query_handler(func=lambda call: True)
 def callback_handler(call):
+    data = call.data or ''
+    message = call.message
+    # the next marathon question reuses the message and its buttons but not its caption,
+    # a match selection keeps the caption and changes only the keyboard
+    markup = message.reply_markup.to_json() if message.reply_markup else None
+    screen = (message.edit_date, message.caption or message.text, hash(markup))
+    # workers get the time the router received the update, the queue in between is not the user's
+    key = debouncer.press(message.chat.id, data, message.message_id, screen, getattr(call, 'received_at', None))
+    if key is None:
+        # the first tap is already being handled, this one only needs its spinner stopped
+        try:
+            answer_callback(call)
+        except Exception as e:
+            logger.warning('Callback answer error: %s', e)
+        return
+    if not data.startswith(TOAST_ROUTES):
+        # stop the button spinner before any parsing, quiz generation or upload
+        try:
+            answer_callback(call)
+        except Exception as e:
+            logger.warning('Callback answer error: %s', e)
+    renders.submit(call.message.chat.id, render_callback, call, droppable=data.startswith(NAVIGATION_ROUTES),
+                   done=functools.partial(debouncer.release, key))
+
+@snapshots.tracked
+@traced('callback')
+def render_callback(call):
     chat_id = call.message.chat.id
     data = call.data
+    broadcasts.remember_chat(chat_id)
     
     if chat_id not in user_states:
         user_states[chat_id] = {}
@@ -512,6 +862,7 @@ def callback_handler(call):
     try:
         
         if data == 'games_menu':
+            track('menu', chat_id, m=data)
             text = (
                 '🎮 <b>Игры и викторины</b>\n\n'
                 'Проверьте свои знания о культуре народов!\n\n'
@@ -520,9 +871,10 @@ def callback_handler(call):
             send_with_photo(chat_id, MAIN_PHOTO, text, create_games_menu(), last_msg_id, last_photo)
         
         elif data == 'game_national_quiz':
+            track('game', chat_id, g=data[5:])
             quiz = generate_national_quiz()
             if not quiz:
-                bot.answer_callback_query(call.id, '❌ Недостаточно данных для игры')
+                answer_callback(call, '❌ Недостаточно данных для игры')
                 return
             
             user_states[chat_id]['current_quiz'] = quiz
@@ -531,40 +883,50 @@ def callback_handler(call):
             
             item = quiz['item']
             cat_name = CATEGORY_NAMES.get(item['category'], item['category'])
+            excerpt = get_catalog().excerpt(item['national'], item['category'], item['idx'])
             
             text = (
                 f'🌍 <b>Угадай национальность</b>\n\n'
                 f'📂 Категория: {cat_name}\n'
                 f'📌 Элемент: {item["name"]}\n\n'
-                f'📝 Описание:\n{item["item_data"]["description"][:200]}...\n\n'
+                f'📝 Описание:\n{excerpt}...\n\n'
                 f'❓ К какой национальности относится этот элемент культуры?'
             )
             
             markup = create_quiz_answer_buttons(quiz['options'], 'national', 'national')
             send_with_photo(chat_id, MAIN_PHOTO, text, markup, last_msg_id, last_photo)
         
-        elif data == 'game_food_quiz':
-            quiz = generate_food_quiz()
+        elif data == 'game_food_quiz' or data.startswith(('game_image_', 'imgnext_')):
+            # game_food_quiz is what the button sent before the other image quizzes existed
+            category = 'bludo' if data == 'game_food_quiz' else data.split('_')[-1]
+            if not data.startswith('imgnext_'):
+                track('game', chat_id, g=f'image_{category}')
+                user_states[chat_id]['quiz_score'] = 0
+                user_states[chat_id]['quiz_total'] = 0
+            
+            image_quiz = get_image_quiz()
+            quiz = image_quiz.next(chat_id, category)
             if not quiz:
-                bot.answer_callback_query(call.id, '❌ Недостаточно данных для игры')
+                answer_callback(call, '❌ Недостаточно данных для игры')
                 return
             
             user_states[chat_id]['current_quiz'] = quiz
-            user_states[chat_id]['quiz_score'] = 0
-            user_states[chat_id]['quiz_total'] = 0
-            
-            item = quiz['item']
-            photo_path = os.path.join(DATA_DIR, quiz['national'], 'food', item['image'])
+            emoji, title, question = IMAGE_QUIZZES[category]
+            score = user_states[chat_id].get('quiz_score', 0)
+            total = user_states[chat_id].get('quiz_total', 0)
             
             text = (
-                f'🍲 <b>Угадай блюдо</b>\n\n'
-                f'❓ Как называется это блюдо?'
+                f'{emoji} <b>{title}</b>\n\n'
+                f'⭐ Очки: {score}/{total}\n\n'
+                f'❓ {question}'
             )
             
-            markup = create_quiz_answer_buttons(quiz['options'], 'food', 'food')
-            send_with_photo(chat_id, photo_path, text, markup, last_msg_id, last_photo)
+            markup = create_quiz_answer_buttons(quiz['options'], 'image', 'image')
+            swap_photo(chat_id, image_quiz.asset(quiz), text, markup, last_msg_id, last_photo)
+            image_quiz.prefetch(chat_id, category, warm_file_id, exclude=quiz['correct_answer'])
         
         elif data == 'game_marathon':
+            track('game', chat_id, g=data[5:])
             user_states[chat_id]['marathon'] = {
                 'score': 0,
                 'question_num': 0,
@@ -573,7 +935,7 @@ def callback_handler(call):
             
             question = generate_marathon_question()
             if not question:
-                bot.answer_callback_query(call.id, '❌ Недостаточно данных для игры')
+                answer_callback(call, '❌ Недостаточно данных для игры')
                 return
             
             user_states[chat_id]['current_quiz'] = question
@@ -609,9 +971,10 @@ def callback_handler(call):
             send_with_photo(chat_id, MAIN_PHOTO, text, markup, last_msg_id, last_photo)
         
         elif data == 'game_match_pairs':
+            track('game', chat_id, g=data[5:])
             game_data = generate_match_pairs()
             if not game_data:
-                bot.answer_callback_query(call.id, '❌ Недостаточно данных для игры')
+                answer_callback(call, '❌ Недостаточно данных для игры')
                 return
             
             user_states[chat_id]['match_game'] = game_data
@@ -628,6 +991,7 @@ def callback_handler(call):
             send_with_photo(chat_id, MAIN_PHOTO, text, markup, last_msg_id, last_photo)
         
         elif data == 'game_blitz':
+            track('game', chat_id, g=data[5:])
             user_states[chat_id]['blitz'] = {
                 'score': 0,
                 'question_num': 0,
@@ -636,7 +1000,7 @@ def callback_handler(call):
             
             question = generate_marathon_question()
             if not question:
-                bot.answer_callback_query(call.id, '❌ Недостаточно данных для игры')
+                answer_callback(call, '❌ Недостаточно данных для игры')
                 return
             
             user_states[chat_id]['current_quiz'] = question
@@ -664,13 +1028,13 @@ def callback_handler(call):
             
             current_quiz = user_states[chat_id].get('current_quiz')
             if not current_quiz:
-                bot.answer_callback_query(call.id, '❌ Ошибка')
+                answer_callback(call, '❌ Ошибка')
                 return
             
             selected_option = current_quiz['options'][answer_idx]
             correct_answer = current_quiz['correct_answer']
             
-            if quiz_type == 'national' or quiz_type == 'food':
+            if quiz_type == 'national' or quiz_type == 'image':
                 is_correct = selected_option == correct_answer
             elif quiz_type == 'marathon' or quiz_type == 'blitz':
                 if current_quiz['type'] == 'true_false':
@@ -680,6 +1044,9 @@ def callback_handler(call):
             else:
                 is_correct = False
             
+            national, category, name = quiz_item_key(current_quiz)
+            track('answer', chat_id, g=quiz_type, q=current_quiz['type'], n=national, c=category, i=name, ok=is_correct)
+            
             if quiz_type == 'marathon':
                 marathon = user_states[chat_id].get('marathon', {})
                 marathon['question_num'] += 1
@@ -707,16 +1074,20 @@ def callback_handler(call):
                     else:
                         grade = '📚 Есть что подтянуть!'
                     
+                    rank = leaderboard.submit('marathon', chat_id, player_name(call.from_user), final_score)
+                    
                     text = (
                         f'🏆 <b>Марафон завершён!</b>\n\n'
                         f'{grade}\n\n'
                         f'📊 Ваш результат: {final_score}/{max_score} очков\n'
-                        f'✅ Правильных ответов: {final_score//10}/{marathon["total_questions"]}\n\n'
+                        f'✅ Правильных ответов: {final_score//10}/{marathon["total_questions"]}\n'
+                        f'🏅 Ваше место в рейтинге: {rank}\n\n'
                         f'Отличная работа! Продолжайте изучать культуру народов! 🎓'
                     )
                     
                     markup = types.InlineKeyboardMarkup()
                     markup.add(types.InlineKeyboardButton('🔄 Играть снова', callback_data='game_marathon'))
+                    markup.add(types.InlineKeyboardButton('🏅 Таблица лидеров', callback_data='leaders_marathon_all'))
                     markup.add(types.InlineKeyboardButton('🎮 Другие игры', callback_data='games_menu'))
                     markup.add(types.InlineKeyboardButton('🏠 Главное меню', callback_data='main_menu'))
                     
@@ -724,7 +1095,7 @@ def callback_handler(call):
                 else:
                     question = generate_marathon_question()
                     if not question:
-                        bot.answer_callback_query(call.id, '❌ Ошибка генерации вопроса')
+                        answer_callback(call, '❌ Ошибка генерации вопроса')
                         return
                     
                     user_states[chat_id]['current_quiz'] = question
@@ -769,15 +1140,19 @@ def callback_handler(call):
                     final_score = blitz['score']
                     max_score = blitz['total_questions'] * 20
                     
+                    rank = leaderboard.submit('blitz', chat_id, player_name(call.from_user), final_score)
+                    
                     text = (
                         f'⚡ <b>Блиц завершён!</b>\n\n'
                         f'📊 Результат: {final_score}/{max_score} очков\n'
-                        f'✅ Правильных: {final_score//20}/{blitz["total_questions"]}\n\n'
+                        f'✅ Правильных: {final_score//20}/{blitz["total_questions"]}\n'
+                        f'🏅 Ваше место в рейтинге: {rank}\n\n'
                         f'Молодец! ⭐'
                     )
                     
                     markup = types.InlineKeyboardMarkup()
                     markup.add(types.InlineKeyboardButton('🔄 Ещё раз', callback_data='game_blitz'))
+                    markup.add(types.InlineKeyboardButton('🏅 Таблица лидеров', callback_data='leaders_blitz_all'))
                     markup.add(types.InlineKeyboardButton('🎮 Другие игры', callback_data='games_menu'))
                     markup.add(types.InlineKeyboardButton('🏠 Главное меню', callback_data='main_menu'))
                     
@@ -829,16 +1204,25 @@ def callback_handler(call):
                     result_emoji = '❌'
                 
                 markup = types.InlineKeyboardMarkup()
-                markup.add(types.InlineKeyboardButton('🔄 Ещё вопрос', callback_data=f'game_{quiz_type}_quiz'))
+                if current_quiz['type'] == 'image_quiz':
+                    # the answer stays on the same picture, so this is a caption edit
+                    user_states[chat_id]['quiz_score'] = user_states[chat_id].get('quiz_score', 0) + int(is_correct)
+                    user_states[chat_id]['quiz_total'] = user_states[chat_id].get('quiz_total', 0) + 1
+                    text += f'\n\n⭐ Очки: {user_states[chat_id]["quiz_score"]}/{user_states[chat_id]["quiz_total"]}'
+                    markup.add(types.InlineKeyboardButton('🔄 Ещё вопрос', callback_data=f'imgnext_{current_quiz["category"]}'))
+                    photo = get_image_quiz().asset(current_quiz).path
+                else:
+                    markup.add(types.InlineKeyboardButton('🔄 Ещё вопрос', callback_data=f'game_{quiz_type}_quiz'))
+                    photo = MAIN_PHOTO
                 markup.add(types.InlineKeyboardButton('🎮 Другие игры', callback_data='games_menu'))
                 markup.add(types.InlineKeyboardButton('🏠 Главное меню', callback_data='main_menu'))
                 
-                send_with_photo(chat_id, MAIN_PHOTO, text, markup, last_msg_id, last_photo)
+                send_with_photo(chat_id, photo, text, markup, last_msg_id, last_photo)
         
         elif data.startswith('match_select_'):
             game_data = user_states[chat_id].get('match_game')
             if not game_data:
-                bot.answer_callback_query(call.id, '❌ Ошибка')
+                answer_callback(call, '❌ Ошибка')
                 return
             
             select_type = data.split('_')[2]
@@ -846,7 +1230,7 @@ def callback_handler(call):
             
             if select_type == 'item':
                 game_data['current_item'] = idx
-                bot.answer_callback_query(call.id, f'Выбран элемент. Теперь выберите национальность.')
+                answer_callback(call, f'Выбран элемент. Теперь выберите национальность.')
                 
                 matches_found = len(game_data.get('matches_found', []))
                 text = (
@@ -866,7 +1250,7 @@ def callback_handler(call):
             elif select_type == 'nat':
                 current_item_idx = game_data.get('current_item')
                 if current_item_idx is None:
-                    bot.answer_callback_query(call.id, '⚠️ Сначала выберите элемент!')
+                    answer_callback(call, '⚠️ Сначала выберите элемент!')
                     return
                 
                 items = game_data['items']
@@ -890,7 +1274,7 @@ def callback_handler(call):
                         
                         send_with_photo(chat_id, MAIN_PHOTO, text, markup, last_msg_id, last_photo)
                     else:
-                        bot.answer_callback_query(call.id, '✅ Правильно!')
+                        answer_callback(call, '✅ Правильно!')
                         
                         text = (
                             f'🎯 <b>Найди пару</b>\n\n'
@@ -907,7 +1291,7 @@ def callback_handler(call):
                         )
                 else:
                     game_data['current_item'] = None
-                    bot.answer_callback_query(call.id, '❌ Неправильно! Попробуйте ещё раз.')
+                    answer_callback(call, '❌ Неправильно! Попробуйте ещё раз.')
                     
                     matches_found = len(game_data.get('matches_found', []))
                     text = (
@@ -925,6 +1309,7 @@ def callback_handler(call):
                     )
         
         elif data == 'main_menu':
+            track('menu', chat_id, m=data)
             text = (
                 '🌟 <b>Добро пожаловать в Этносферу!</b>\n\n'
                 'Цифровая платформа народной культуры России.\n\n'
@@ -939,6 +1324,7 @@ def callback_handler(call):
             send_with_photo(chat_id, MAIN_PHOTO, text, create_main_menu(), last_msg_id, last_photo)
         
         elif data == 'search_name':
+            track('menu', chat_id, m=data)
             text = (
                 '🔍 <b>Поиск по названию</b>\n\n'
                 '👇 Что вы хотите найти?'
@@ -962,6 +1348,7 @@ def callback_handler(call):
             send_with_photo(chat_id, MAIN_PHOTO, text, markup, last_msg_id, last_photo)
         
         elif data == 'select_national':
+            track('menu', chat_id, m=data)
             text = '🌍 <b>Выберите национальность:</b>\n\nНажмите на название для выбора, затем "Далее"'
             user_states[chat_id]['selected_nationals'] = []
             user_states[chat_id]['nat_page'] = 0
@@ -998,16 +1385,14 @@ def callback_handler(call):
         elif data == 'natcontinue':
             selected = user_states[chat_id].get('selected_nationals', [])
             if not selected:
-                bot.answer_callback_query(call.id, 'Выберите хотя бы одну национальность')
+                answer_callback(call, 'Выберите хотя бы одну национальность')
                 return
             
             if len(selected) == 1:
                 national = selected[0]
                 ru_name = get_russian_name(national)
                 
-                photo_path = f'regionals/{national}/preview.png'
-                if not os.path.exists(photo_path):
-                    photo_path = MAIN_PHOTO
+                photo_path = get_catalog().assets.national(national).path
                 
                 text = f'📋 <b>{ru_name}</b>\n\n👇 Выберите категорию для просмотра:'
                 send_with_photo(chat_id, photo_path, text, create_categories_menu(national), last_msg_id, last_photo)
@@ -1023,28 +1408,24 @@ def callback_handler(call):
         
         elif data.startswith('nat_'):
             national = data[4:]
+            track('menu', chat_id, m='national', n=national)
             ru_name = get_russian_name(national)
             
-            photo_path = f'regionals/{national}/preview.png'
-            if not os.path.exists(photo_path):
-                photo_path = MAIN_PHOTO
+            photo_path = get_catalog().assets.national(national).path
             
             text = f'📂 <b>{ru_name}</b>\n\n👇 Выберите категорию для просмотра:'
             send_with_photo(chat_id, photo_path, text, create_categories_menu(national), last_msg_id, last_photo)
         
         elif data.startswith('natcat_'):
-            parts = data.split('_')
-            national = parts[1]
-            category = parts[2]
+            national, category = route_args(data, 2)
+            track('menu', chat_id, m='category', n=national, c=category)
             
             ru_name = get_russian_name(national)
             cat_name = CATEGORY_NAMES.get(category, category)
             
             items = get_category_items(national, category)
             
-            photo_path = f'regionals/{national}/{category}/preview.png'
-            if not os.path.exists(photo_path):
-                photo_path = MAIN_PHOTO
+            photo_path = get_catalog().assets.category(national, category).path
             
             if not items:
                 text = f'📂 <b>{ru_name} - {cat_name}</b>\n\n❌ Список пуст. Данные еще не добавлены.'
@@ -1054,10 +1435,8 @@ def callback_handler(call):
             send_with_photo(chat_id, photo_path, text, create_items_menu(national, category, 0), last_msg_id, last_photo)
         
         elif data.startswith('itempage_'):
-            parts = data.split('_')
-            national = parts[1]
-            category = parts[2]
-            page = int(parts[3])
+            national, category, page = route_args(data, 3)
+            page = int(page)
             
             bot.edit_message_reply_markup(
                 chat_id=chat_id,
@@ -1066,75 +1445,72 @@ def callback_handler(call):
             )
         
         elif data.startswith('item_'):
-            parts = data.split('_')
-            national = parts[1]
-            category = parts[2]
-            item_idx = int(parts[3])
+            national, category, item_idx = route_args(data, 3)
+            item_idx = int(item_idx)
             
             items = get_category_items(national, category)
             if item_idx >= len(items):
-                bot.answer_callback_query(call.id, '❌ Элемент не найден')
+                answer_callback(call, '❌ Элемент не найден')
                 return
             
             item = items[item_idx]
+            track('view', chat_id, n=national, c=category, i=item['name'], src='list')
             
-            photo_path = os.path.join(DATA_DIR, national, category, item['image'])
-            if not os.path.exists(photo_path):
-                photo_path = MAIN_PHOTO
-            
-            text = (
-                f"📌 <b>{item['name']}</b>\n"
-                f"📅 {item['date']}\n\n"
-                f"{item['description']}"
-            )
-            
-            markup = types.InlineKeyboardMarkup()
-            markup.add(types.InlineKeyboardButton('⬅️ Назад к списку', callback_data=f'natcat_{national}_{category}'))
-            markup.add(types.InlineKeyboardButton('🏠 Главное меню', callback_data='main_menu'))
+            photo_path = get_catalog().assets.item(national, category, item['image']).path
+            pages = get_cards().pages('item', national, category, item_idx)
+            markup = create_card_markup('item', national, category, item_idx, 0, len(pages))
             
-            send_with_photo(chat_id, photo_path, text, markup, last_msg_id, last_photo)
+            send_with_photo(chat_id, photo_path, pages[0], markup, last_msg_id, last_photo)
         
         elif data.startswith('searchitem_'):
-            parts = data.split('_')
-            national = parts[1]
-            category = parts[2]
-            item_idx = int(parts[3])
+            national, category, item_idx = route_args(data, 3)
+            item_idx = int(item_idx)
             
             items = get_category_items(national, category)
             if item_idx >= len(items):
-                bot.answer_callback_query(call.id, '❌ Элемент не найден')
+                answer_callback(call, '❌ Элемент не найден')
                 return
             
             item = items[item_idx]
+            track('view', chat_id, n=national, c=category, i=item['name'], src='search')
             
-            photo_path = os.path.join(DATA_DIR, national, category, item['image'])
-            if not os.path.exists(photo_path):
-                photo_path = MAIN_PHOTO
-            
-            ru_name = get_russian_name(national)
-            cat_name = CATEGORY_NAMES.get(category, category)
+            photo_path = get_catalog().assets.item(national, category, item['image']).path
+            pages = get_cards().pages('search', national, category, item_idx)
+            markup = create_card_markup('search', national, category, item_idx, 0, len(pages))
             
-            text = (
-                f"📌 <b>{item['name']}</b>\n"
-                f"🌍 {ru_name}\n"
-                f"📂 {cat_name}\n"
-                f"📅 {item['date']}\n\n"
-                f"{item['description']}"
-            )
-            
-            markup = types.InlineKeyboardMarkup()
-            markup.add(types.InlineKeyboardButton('⬅️ К списку', callback_data=f'natcat_{national}_{category}'))
-            markup.add(types.InlineKeyboardButton('🔍 Новый поиск', callback_data='search_name'))
-            markup.add(types.InlineKeyboardButton('🏠 Главное меню', callback_data='main_menu'))
+            send_with_photo(chat_id, photo_path, pages[0], markup, last_msg_id, last_photo)
+        
+        elif data.startswith('cardpage_'):
+            # national keys may contain underscores, so everything after it is split from the right
+            _, variant, rest = data.split('_', 2)
+            national, category, item_idx, page = rest.rsplit('_', 3)
+            item_idx = int(item_idx)
+            page = int(page)
+            
+            pages = get_cards().pages(variant, national, category, item_idx)
+            if not pages or page >= len(pages):
+                answer_callback(call, '❌ Элемент не найден')
+                return
             
-            send_with_photo(chat_id, photo_path, text, markup, last_msg_id, last_photo)
+            markup = create_card_markup(variant, national, category, item_idx, page, len(pages))
+            if call.message.content_type == 'photo':
+                bot.edit_message_caption(
+                    caption=pages[page],
+                    chat_id=chat_id,
+                    message_id=call.message.message_id,
+                    reply_markup=markup
+                )
+            else:
+                bot.edit_message_text(pages[page], chat_id=chat_id, message_id=call.message.message_id, reply_markup=markup)
         
         elif data == 'select_category':
+            track('menu', chat_id, m=data)
             text = '📂 <b>Выберите категорию:</b>'
             send_with_photo(chat_id, MAIN_PHOTO, text, create_categories_menu(), last_msg_id, last_photo)
         
         elif data.startswith('multicat_'):
             category = data[9:]
+            track('menu', chat_id, m='multicat', c=category)
             selected = user_states[chat_id].get('selected_nationals', [])
             cat_name = CATEGORY_NAMES.get(category, category)
             
@@ -1184,6 +1560,7 @@ def callback_handler(call):
             send_with_photo(chat_id, MAIN_PHOTO, text, markup, last_msg_id, last_photo)
         
         elif data == 'contacts':
+            track('menu', chat_id, m=data)
             text = (
                 '📞 <b>Контакты</b>\n\n'
                 '🏛 <b>Владелец, помощники</b>\n'
@@ -1198,6 +1575,7 @@ def callback_handler(call):
             send_with_photo(chat_id, MAIN_PHOTO, text, markup, last_msg_id, last_photo)
         
         elif data == 'feedback':
+            track('menu', chat_id, m=data)
             text = (
                 '💬 <b>Обратная связь</b>\n\n'
                 'Для отправки отзыва или предложения напишите сообщение в чат.\n'
@@ -1210,6 +1588,24 @@ def callback_handler(call):
             user_states[chat_id]['waiting_feedback'] = True
             send_with_photo(chat_id, MAIN_PHOTO, text, markup, last_msg_id, last_photo)
         
+        elif data.startswith('leaders_'):
+            parts = data.split('_')
+            game = parts[1] if parts[1] in ('marathon', 'blitz') else 'marathon'
+            scope = parts[2] if parts[2] in ('all', 'week', 'class') else 'all'
+            track('menu', chat_id, m='leaders', g=game, s=scope)
+            
+            text, markup = create_leaderboard_view(chat_id, game, scope)
+            send_with_photo(chat_id, MAIN_PHOTO, text, markup, last_msg_id, last_photo)
+        
+        elif data.startswith('fbpage_'):
+            if not is_admin(chat_id):
+                answer_callback(call, '❌ Недоступно')
+                return
+            
+            page = int(data.split('_')[1])
+            text, markup = create_feedback_page(page)
+            bot.edit_message_text(text, chat_id=chat_id, message_id=call.message.message_id, reply_markup=markup)
+        
         elif data.startswith('search_'):
             search_type = data[7:]
             
@@ -1220,17 +1616,19 @@ def callback_handler(call):
             user_states[chat_id]['search_type'] = search_type
             send_with_photo(chat_id, MAIN_PHOTO, text, markup, last_msg_id, last_photo)
         
-        bot.answer_callback_query(call.id)
+        answer_callback(call)
     
     except Exception as e:
-        print(f"Callback error: {e}")
-        import traceback
-        traceback.print_exc()
-        bot.answer_callback_query(call.id, '❌ Произошла ошибка')
+        logger.exception('Callback error')
+        if not is_unavailable(e):
+            answer_callback(call, '❌ Произошла ошибка')
 
 @bot.message_handler(func=lambda message: True)
+@snapshots.tracked
+@traced('text')
 def text_handler(message):
     chat_id = message.chat.id
+    broadcasts.remember_chat(chat_id)
     
     delete_message_safe(chat_id, message.message_id)
     
@@ -1240,6 +1638,7 @@ def text_handler(message):
         last_msg_id = state.get('last_message_id')
         
         if state.get('waiting_feedback'):
+            save_feedback(message)
             text = '✅ <b>Спасибо за ваш отзыв!</b>\n\nМы его обязательно рассмотрим.'
             send_with_photo(chat_id, MAIN_PHOTO, text, create_main_menu(), last_msg_id, last_photo)
             user_states[chat_id] = {'last_photo': MAIN_PHOTO}
@@ -1254,6 +1653,7 @@ def text_handler(message):
                 
                 found_ru = fuzzy_search(query, ru_nationals, threshold=50)
                 found = [get_english_name(n) for n in found_ru]
+                track('search', chat_id, m='national', q=query[:100], h=len(found))
                 
                 if found:
                     markup = types.InlineKeyboardMarkup(row_width=1)
@@ -1274,6 +1674,7 @@ def text_handler(message):
                 item_names = [item['name'] for item in all_items]
                 
                 found_names = fuzzy_search(query, item_names, threshold=50)
+                track('search', chat_id, m='all_items', q=query[:100], h=len(found_names))
                 
                 if found_names:
                     found_items = []
@@ -1318,6 +1719,7 @@ def text_handler(message):
                 
                 found_ru = fuzzy_search(query, ru_nationals, threshold=50)
                 found = [get_english_name(n) for n in found_ru]
+                track('search', chat_id, m='national', q=query[:100], h=len(found))
                 
                 if found:
                     markup = types.InlineKeyboardMarkup(row_width=1)
@@ -1333,14 +1735,13 @@ def text_handler(message):
                     send_with_photo(chat_id, MAIN_PHOTO, text, create_main_menu(), last_msg_id, last_photo)
             
             elif state['search_type'].startswith('items_'):
-                parts = state['search_type'].split('_')
-                national = parts[1]
-                category = parts[2]
+                national, category = route_args(state['search_type'], 2)
                 
                 items = get_category_items(national, category)
                 item_names = [item['name'] for item in items]
                 
                 found_names = fuzzy_search(query, item_names, threshold=50)
+                track('search', chat_id, m='category', n=national, c=category, q=query[:100], h=len(found_names))
                 
                 if found_names:
                     markup = types.InlineKeyboardMarkup(row_width=1)
@@ -1368,8 +1769,60 @@ def text_handler(message):
     last_photo = user_states[chat_id].get('last_photo', MAIN_PHOTO)
     send_with_photo(chat_id, MAIN_PHOTO, text, create_main_menu(), last_msg_id, last_photo)
 
+@bot.inline_handler(func=lambda query: True)
+def inline_handler(query):
+    offset = int(query.offset) if query.offset.isdigit() else 0
+    
+    index = get_search_index()
+    matches = index.search(query.query)
+    if offset == 0 and query.query.strip():
+        track('search', query.from_user.id, m='inline', q=query.query[:100], h=len(matches))
+    
+    page = matches[offset:offset + INLINE_PAGE_SIZE]
+    results = [create_inline_result(index.entries[entry_id]) for entry_id in page]
+    next_offset = str(offset + INLINE_PAGE_SIZE) if offset + INLINE_PAGE_SIZE < len(matches) else ''
+    
+    try:
+        bot.answer_inline_query(
+            query.id,
+            results,
+            cache_time=INLINE_CACHE_TIME,
+            is_personal=False,
+            next_offset=next_offset
+        )
+    except Exception as e:
+        logger.warning('Inline query error: %s', e)
+
+def on_catalog_ready(catalog):
+    get_search_index()
+    logger.info('Найдено национальностей: %s', len(catalog.nationals))
+    logger.info('Каталог загружен: %s элементов за %.0f мс', len(catalog.all_items), catalog.build_time * 1000)
+    if catalog.descriptions is not None:
+        logger.info('Описания загружаются по требованию, бюджет %s КБ', catalog.descriptions.budget // 1024)
+    if catalog.assets.missing:
+        logger.warning('Изображений не найдено: %s (используется %s)', len(catalog.assets.missing), MAIN_PHOTO)
+
 if __name__ == '__main__':
-    print('Бот запущен...')
-    print('Все обработчики загружены!')
-    print(f'Найдено национальностей: {len(get_all_nationals())}')
-    bot.infinity_polling()
\ No newline at end of file
+    setup_logging()
+    logger.info('Бот запущен...')
+    if WORKERS > 1:
+        from workers import serve
+        serve()
+    else:
+        warmup(on_catalog_ready)
+        watch_catalog(on_reload=on_catalog_ready)
+        snapshots.restore()
+        snapshots.start()
+        broadcasts.start(bot)
+        start_monitor(user_states, peek_catalog)
+        if API_PORT:
+            from api_server import start_api_server
+            start_api_server()
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        logger.info('Все обработчики загружены!')
+        updates, offset = recover(TOKEN, load_offset())
+        if offset:
+            bot.last_update_id = offset - 1
+        bot.process_new_updates([types.Update.de_json(update) for update in updates])
+        OffsetKeeper().watch(lambda: bot.last_update_id + 1 if bot.last_update_id else None)
+        bot.infinity_polling()
\ No newline at end of file
@@ -0,0 +1,342 @@
+import atexit
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from telebot.apihelper import ApiTelegramException
+
+from assets import cached_file_id, load_asset, remember_file_id
+from config import BREAKER_RESET, BROADCAST_RATE, BROADCAST_THREADS
+from db import connect
+from journal import BatchWorker
+from transport import CircuitOpenError, is_unavailable
+
+MIN_CHAT_ID = -(2 ** 63)
+# seconds to wait before resending after a 5xx or a network error
+UNAVAILABLE_PAUSE = 5
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS chats (
+    chat_id INTEGER PRIMARY KEY,
+    first_seen INTEGER NOT NULL,
+    blocked INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY,
+    author INTEGER,
+    text TEXT NOT NULL,
+    photo TEXT,
+    file_id TEXT,
+    status TEXT NOT NULL,
+    cursor INTEGER NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    blocked INTEGER NOT NULL DEFAULT 0,
+    created INTEGER NOT NULL,
+    finished INTEGER
+);
+'''
+
+JOB_FIELDS = ('id', 'author', 'status', 'total', 'sent', 'failed', 'blocked', 'created')
+BLOCKED_ERRORS = ('bot was blocked', 'user is deactivated', 'chat not found', 'bot was kicked')
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+class ChatWriter(BatchWorker):
+    def __init__(self, db_name):
+        super().__init__('Chats', queue_size=10000, batch_size=500, flush_interval=0.5)
+        self.db_name = db_name
+        self.conn = None
+
+    def open(self):
+        self.conn = connect(self.db_name)
+        self.conn.executescript(SCHEMA)
+
+    def process(self, batch):
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO chats (chat_id, first_seen) VALUES (?, ?) '
+                'ON CONFLICT (chat_id) DO UPDATE SET blocked = 0',
+                batch,
+            )
+        self.written += len(batch)
+
+    def shutdown(self):
+        if self.conn:
+            self.conn.close()
+
+
+class Broadcasts:
+    def __init__(self, db_name='broadcasts.db', rate=BROADCAST_RATE, threads=BROADCAST_THREADS):
+        self.db_name = db_name
+        self.rate = rate
+        self.threads = threads
+        self.writer = ChatWriter(db_name)
+        self.bot = None
+
+        self._conn = None
+        self._known = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    conn = connect(self.db_name)
+                    conn.executescript(SCHEMA)
+                    self._conn = conn
+        return self._conn
+
+    def _execute(self, sql, params=()):
+        conn = self.conn
+        with self._lock, conn:
+            return conn.execute(sql, params).fetchall()
+
+    def remember_chat(self, chat_id):
+        if self._known is None:
+            rows = self._execute('SELECT chat_id FROM chats WHERE blocked = 0')
+            self._known = {chat_id for chat_id, in rows}
+        if chat_id not in self._known:
+            self._known.add(chat_id)
+            self.writer.submit((chat_id, int(time.time())))
+
+    def active_chats(self):
+        return self._execute('SELECT COUNT(*) FROM chats WHERE blocked = 0')[0][0]
+
+    def enqueue(self, author, text, photo=None, file_id=None):
+        conn = self.conn
+        with self._lock, conn:
+            cursor = conn.execute(
+                'INSERT INTO broadcasts (author, text, photo, file_id, status, cursor, total, created) '
+                "VALUES (?, ?, ?, ?, 'pending', ?, (SELECT COUNT(*) FROM chats WHERE blocked = 0), ?)",
+                (author, text, photo, file_id, MIN_CHAT_ID, int(time.time())),
+            )
+            job_id = cursor.lastrowid
+        self._wakeup.set()
+        return job_id
+
+    def cancel(self, job_id):
+        conn = self.conn
+        with self._lock, conn:
+            cursor = conn.execute(
+                "UPDATE broadcasts SET status = 'cancelled', finished = ? "
+                "WHERE id = ? AND status IN ('pending', 'running')",
+                (int(time.time()), job_id),
+            )
+            return cursor.rowcount > 0
+
+    def recent(self, limit=5):
+        rows = self._execute(
+            'SELECT id, author, status, total, sent, failed, blocked, created FROM broadcasts '
+            'ORDER BY id DESC LIMIT ?',
+            (limit,),
+        )
+        return [dict(zip(JOB_FIELDS, row)) for row in rows]
+
+    def job(self, job_id):
+        rows = self._execute(
+            'SELECT id, author, status, total, sent, failed, blocked, created FROM broadcasts WHERE id = ?',
+            (job_id,),
+        )
+        return dict(zip(JOB_FIELDS, rows[0])) if rows else None
+
+    def _next_job(self):
+        rows = self._execute(
+            'SELECT id, author, text, photo, file_id, cursor FROM broadcasts '
+            "WHERE status IN ('pending', 'running') ORDER BY id LIMIT 1"
+        )
+        if not rows:
+            return None
+        return dict(zip(('id', 'author', 'text', 'photo', 'file_id', 'cursor'), rows[0]))
+
+    def _send(self, bucket, job, chat_id):
+        bucket.acquire()
+        try:
+            if job['photo']:
+                if job['file_id']:
+                    self.bot.send_photo(chat_id, job['file_id'], caption=job['text'])
+                else:
+                    with open(job['photo'], 'rb') as photo:
+                        msg = self.bot.send_photo(chat_id, photo, caption=job['text'])
+                    if msg.photo:
+                        self._remember_file_id(job, msg.photo[-1].file_id)
+            else:
+                self.bot.send_message(chat_id, job['text'])
+            return 'sent'
+        except ApiTelegramException as e:
+            if e.error_code == 429:
+                bucket.pause((e.result_json.get('parameters') or {}).get('retry_after', 1))
+                return 'retry'
+            description = (e.description or '').lower()
+            if e.error_code == 403 or any(error in description for error in BLOCKED_ERRORS):
+                return 'blocked'
+            if is_unavailable(e):
+                bucket.pause(UNAVAILABLE_PAUSE)
+                return 'retry'
+            logger.warning('Broadcast %s error for %s: %s', job['id'], chat_id, e)
+            return 'failed'
+        except Exception as e:
+            # the message may have been delivered before the read timed out, so it is not sent again
+            if is_unavailable(e) and not isinstance(e, requests.exceptions.ReadTimeout):
+                # the API is down rather than this chat; wait it out instead of failing the whole batch
+                bucket.pause(BREAKER_RESET if isinstance(e, CircuitOpenError) else UNAVAILABLE_PAUSE)
+                return 'retry'
+            logger.warning('Broadcast %s error for %s: %s', job['id'], chat_id, e)
+            return 'failed'
+
+    def _remember_file_id(self, job, file_id):
+        job['file_id'] = file_id
+        asset = load_asset(job['photo'])
+        if asset:
+            remember_file_id(asset, file_id)
+        self._execute('UPDATE broadcasts SET file_id = ? WHERE id = ?', (file_id, job['id']))
+
+    def _run_job(self, pool, bucket, job):
+        if job['photo'] and not job['file_id']:
+            asset = load_asset(job['photo'])
+            job['file_id'] = cached_file_id(asset) if asset else None
+        self._execute("UPDATE broadcasts SET status = 'running' WHERE id = ? AND status = 'pending'", (job['id'],))
+
+        while not self._stop.is_set():
+            status = self._execute('SELECT status FROM broadcasts WHERE id = ?', (job['id'],))[0][0]
+            if status == 'cancelled':
+                return
+
+            rows = self._execute(
+                'SELECT chat_id FROM chats WHERE blocked = 0 AND chat_id > ? ORDER BY chat_id LIMIT ?',
+                (job['cursor'], self.rate),
+            )
+            if not rows:
+                break
+            chat_ids = [chat_id for chat_id, in rows]
+
+            # upload the photo to one chat at a time until Telegram returns a file_id, then everyone else gets it
+            results = {}
+            pending = chat_ids
+            while pending and job['photo'] and not job['file_id'] and not self._stop.is_set():
+                result = self._send(bucket, job, pending[0])
+                if result != 'retry':
+                    results[pending[0]] = result
+                    pending = pending[1:]
+            while pending and not self._stop.is_set():
+                outcome = dict(zip(pending, pool.map(lambda chat_id: self._send(bucket, job, chat_id), pending)))
+                results.update(outcome)
+                pending = [chat_id for chat_id, result in outcome.items() if result == 'retry']
+
+            # every chat is retried until it settles, so only a stop leaves some unsettled; the cursor then
+            # moves past the chats settled in a row and the job resumes from there on the next start
+            settled = list(itertools.takewhile(lambda chat_id: results.get(chat_id, 'retry') != 'retry', chat_ids))
+            if not settled:
+                continue
+            results = {chat_id: results[chat_id] for chat_id in settled}
+            blocked = [chat_id for chat_id, result in results.items() if result == 'blocked']
+            job['cursor'] = settled[-1]
+            conn = self.conn
+            with self._lock, conn:
+                conn.execute(
+                    'UPDATE broadcasts SET cursor = ?, sent = sent + ?, failed = failed + ?, blocked = blocked + ? '
+                    'WHERE id = ?',
+                    (
+                        job['cursor'],
+                        sum(1 for result in results.values() if result == 'sent'),
+                        sum(1 for result in results.values() if result == 'failed'),
+                        len(blocked),
+                        job['id'],
+                    ),
+                )
+                if blocked:
+                    conn.executemany('UPDATE chats SET blocked = 1 WHERE chat_id = ?', [(chat_id,) for chat_id in blocked])
+            if blocked and self._known is not None:
+                self._known.difference_update(blocked)
+
+        if self._stop.is_set():
+            return
+        self._execute(
+            "UPDATE broadcasts SET status = 'done', finished = ? WHERE id = ? AND status = 'running'",
+            (int(time.time()), job['id']),
+        )
+        self._report(job['id'])
+
+    def _report(self, job_id):
+        job = self.job(job_id)
+        if not job or not job['author']:
+            return
+        try:
+            self.bot.send_message(
+                job['author'],
+                f"📣 <b>Рассылка #{job_id} завершена</b>\n\n"
+                f"✅ Доставлено: {job['sent']}\n"
+                f"🚫 Заблокировали бота: {job['blocked']}\n"
+                f"⚠️ Ошибок: {job['failed']}"
+            )
+        except Exception as e:
+            logger.warning('Broadcast report error: %s', e)
+
+    def _run(self):
+        bucket = TokenBucket(self.rate)
+        with ThreadPoolExecutor(self.threads, thread_name_prefix='BroadcastSend') as pool:
+            while not self._stop.is_set():
+                self._wakeup.clear()
+                try:
+                    job = self._next_job()
+                    if job:
+                        self._run_job(pool, bucket, job)
+                        continue
+                except Exception:
+                    logger.exception('Broadcast error')
+                self._wakeup.wait(10)
+
+    def start(self, bot):
+        self.bot = bot
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='Broadcasts', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+
+broadcasts = Broadcasts()
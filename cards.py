@@ -0,0 +1,135 @@
+import html
+import threading
+from collections import OrderedDict
+
+from catalog import get_catalog
+from config import CATEGORY_NAMES
+from nationals import get_russian_name
+
+CAPTION_LIMIT = 1024
+ELLIPSIS = '…'
+VARIANTS = ('item', 'search')
+
+
+def text_length(text):
+    # Telegram counts caption length in UTF-16 code units after entity parsing
+    return len(text.encode('utf-16-le')) // 2
+
+
+def find_cut(text, limit):
+    cut = limit
+    while cut > 0 and text_length(text[:cut]) > limit:
+        # a character takes at most two units, so this never cuts below the limit
+        cut -= max(1, (text_length(text[:cut]) - limit + 1) // 2)
+    if cut >= len(text):
+        return len(text)
+    for separator in ('\n\n', '\n', '. ', ' '):
+        position = text.rfind(separator, cut // 2, cut)
+        if position > 0:
+            return position + len(separator)
+    return max(cut, 1)
+
+
+def split_text(text, first_limit, limit):
+    chunks = []
+    budget = first_limit
+    while text_length(text) > budget:
+        cut = find_cut(text, budget - len(ELLIPSIS))
+        chunks.append(text[:cut].rstrip() + ELLIPSIS)
+        text = text[cut:].lstrip()
+        budget = limit
+    chunks.append(text)
+    return chunks
+
+
+def header_lines(variant, national, category, item):
+    lines = [('📌 ', item['name'], True)]
+    if variant == 'search':
+        lines.append(('🌍 ', get_russian_name(national), False))
+        lines.append(('📂 ', CATEGORY_NAMES.get(category, category), False))
+    lines.append(('📅 ', item['date'], False))
+    return lines
+
+
+def render_lines(lines):
+    plain = '\n'.join(prefix + value for prefix, value, _ in lines)
+    markup = '\n'.join(
+        prefix + (f'<b>{html.escape(value, quote=False)}</b>' if bold else html.escape(value, quote=False))
+        for prefix, value, bold in lines
+    )
+    return plain, markup
+
+
+def render_pages(variant, national, category, item, description, limit=CAPTION_LIMIT):
+    header_plain, header = render_lines(header_lines(variant, national, category, item))
+
+    first_budget = limit - text_length(header_plain) - 2
+    if text_length(description) <= first_budget:
+        if not description:
+            return [header]
+        return [f'{header}\n\n{html.escape(description, quote=False)}']
+
+    # reserve room for the widest "n/m" counter a continuation header can show
+    continuation_plain, _ = render_lines([('📌 ', item['name'], True)])
+    continuation_budget = limit - text_length(continuation_plain) - len(' · 99/99') - 2
+    chunks = split_text(description, first_budget, max(continuation_budget, limit // 2))
+
+    pages = [f'{header}\n\n{html.escape(chunks[0], quote=False)}']
+    name = html.escape(item['name'], quote=False)
+    for number, chunk in enumerate(chunks[1:], 2):
+        pages.append(f'📌 <b>{name}</b> · {number}/{len(chunks)}\n\n{html.escape(chunk, quote=False)}')
+    return pages
+
+
+class CardCache:
+    def __init__(self, catalog, cache_size=4096):
+        self.catalog = catalog
+        self.cache_size = cache_size
+        self.rendered = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def pages(self, variant, national, category, idx):
+        key = (variant, national, category, idx)
+        with self._lock:
+            pages = self._pages.get(key)
+            if pages is not None:
+                self._pages.move_to_end(key)
+                return pages
+
+        items = self.catalog.category_items(national, category)
+        if idx >= len(items):
+            return None
+        description = self.catalog.description(national, category, idx)
+        pages = render_pages(variant, national, category, items[idx], description)
+
+        # bounded, so rendered cards don't pin every description the lazy catalog evicted
+        with self._lock:
+            self._pages[key] = pages
+            self.rendered += 1
+            if len(self._pages) > self.cache_size:
+                self._pages.popitem(last=False)
+        return pages
+
+    def stats(self):
+        return {
+            'cards': len(self._pages),
+            'pages': sum(len(pages) for pages in self._pages.values()),
+            'rendered': self.rendered,
+        }
+
+
+_cards = None
+_cards_lock = threading.Lock()
+
+
+def get_cards():
+    global _cards
+    catalog = get_catalog()
+    cards = _cards
+    if cards is None or cards.catalog is not catalog:
+        with _cards_lock:
+            if _cards is None or _cards.catalog is not catalog:
+                _cards = CardCache(catalog)
+            cards = _cards
+    return cards
@@ -0,0 +1,244 @@
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from assets import AssetManifest, probe
+from config import DATA_DIR, CATEGORY_NAMES, CATALOG_MODE, CATALOG_CHECK_INTERVAL, DESCRIPTION_BUDGET, DESCRIPTION_CODEC
+from config import DESCRIPTION_HOT_CACHE
+from descriptions import EXCERPT_LENGTH, CompressedDescriptions, LazyDescriptions, text_bytes
+
+ITEM_PATTERN = re.compile(r'=START=\s*{([^}]+)}\s*===([\s\S]*?)=END=\s*{[^}]+}\s*===')
+
+logger = logging.getLogger(__name__)
+
+
+def scan_nationals(data_dir=DATA_DIR):
+    nationals = []
+    if os.path.exists(data_dir):
+        for item in os.listdir(data_dir):
+            path = os.path.join(data_dir, item)
+            if os.path.isdir(path):
+                nationals.append(sys.intern(item))
+    return sorted(nationals)
+
+
+def parse_item_file(filepath):
+    items = []
+    if not os.path.exists(filepath):
+        return items
+
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except Exception as e:
+        logger.warning('Error reading %s: %s', filepath, e)
+        return items
+
+    matches = ITEM_PATTERN.findall(content)
+
+    for match in matches:
+        try:
+            header_content = match[0].strip()
+            description = match[1].strip()
+
+            parts = header_content.split('/')
+            if len(parts) < 3:
+                continue
+
+            name_part = parts[0].strip()
+            if ':' in name_part:
+                name = name_part.split(':', 1)[1].strip()
+            else:
+                name = name_part
+
+            image = parts[1].strip()
+            date_raw = parts[2].strip()
+
+            if date_raw.endswith('g'):
+                date = date_raw[:-1] + ' год'
+            elif date_raw.endswith('gg'):
+                date = date_raw[:-2] + ' гг'
+            elif '.' in date_raw or len(date_raw) >= 8:
+                date = date_raw
+            else:
+                date = date_raw
+
+            # names, file names and dates repeat across items and nationals
+            items.append({
+                'name': sys.intern(name),
+                'image': sys.intern(image),
+                'date': sys.intern(date),
+                'description': description
+            })
+        except Exception as e:
+            logger.warning('Error parsing block: %s', e)
+            continue
+
+    return items
+
+
+def catalog_version(data_dir, nationals, assets):
+    # list.txt size/mtime plus image content digests; changes whenever anything the bot shows does
+    sha1 = hashlib.sha1()
+    for national in nationals:
+        for category in CATEGORY_NAMES.keys():
+            stat = probe(os.path.join(data_dir, national, category, 'list.txt'))
+            if stat:
+                sha1.update(f'{national}/{category}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode('utf-8'))
+    for path in sorted(assets.assets):
+        sha1.update(f'{path}:{assets.assets[path].digest}\n'.encode('utf-8'))
+    return sha1.hexdigest()[:16]
+
+
+def source_signature(data_dir=DATA_DIR):
+    # sizes and mtimes of every file under the data dir; nothing is read, so it is cheap enough to poll
+    sha1 = hashlib.sha1()
+    for root, dirs, files in os.walk(data_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = probe(path)
+            if stat:
+                sha1.update(f'{path}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode('utf-8'))
+    return sha1.hexdigest()
+
+
+class Catalog:
+    def __init__(self, data_dir=DATA_DIR, mode=None, budget=None):
+        started = time.perf_counter()
+        mode = mode or CATALOG_MODE
+        self.data_dir = data_dir
+        self.mode = mode
+        # taken before parsing, so an edit made while the catalog is built triggers another reload
+        self.source = source_signature(data_dir)
+        self.nationals = scan_nationals(data_dir)
+        self.items = {}
+        self.all_items = []
+
+        for national in self.nationals:
+            for category in CATEGORY_NAMES.keys():
+                filepath = os.path.join(data_dir, national, category, 'list.txt')
+                items = parse_item_file(filepath)
+                if mode == 'lazy':
+                    # only a quiz-sized excerpt stays resident, the full text is read on demand
+                    for item in items:
+                        item['excerpt'] = item.pop('description')[:EXCERPT_LENGTH]
+                self.items[(national, category)] = items
+                for idx, item in enumerate(items):
+                    self.all_items.append({
+                        'name': item['name'],
+                        'national': national,
+                        'category': category,
+                        'idx': idx,
+                        'item_data': item
+                    })
+
+        if mode == 'lazy':
+            self.descriptions = LazyDescriptions(data_dir, self.items, budget or DESCRIPTION_BUDGET)
+        elif mode == 'compressed':
+            self.descriptions = CompressedDescriptions(self.items, DESCRIPTION_CODEC, DESCRIPTION_HOT_CACHE)
+        else:
+            self.descriptions = None
+        self.assets = AssetManifest(data_dir, self.nationals, self.items)
+        self.version = catalog_version(data_dir, self.nationals, self.assets)
+        self.build_time = time.perf_counter() - started
+
+    def category_items(self, national, category):
+        return self.items.get((national, category), [])
+
+    def description(self, national, category, idx):
+        if self.descriptions is not None:
+            return self.descriptions.get(national, category, idx)
+        items = self.category_items(national, category)
+        return items[idx]['description'] if idx < len(items) else ''
+
+    def excerpt(self, national, category, idx):
+        if self.mode == 'lazy':
+            items = self.category_items(national, category)
+            return items[idx]['excerpt'] if idx < len(items) else ''
+        return self.description(national, category, idx)[:EXCERPT_LENGTH]
+
+    def description_stats(self):
+        if self.descriptions is not None:
+            return self.descriptions.stats()
+        return {
+            'mode': self.mode,
+            'resident_bytes': sum(text_bytes(item['description'] for item in items) for items in self.items.values()),
+        }
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = Catalog(DATA_DIR)
+    return _catalog
+
+
+def peek_catalog():
+    return _catalog
+
+
+def reload_catalog(data_dir=DATA_DIR):
+    # the search index, cards, quizzes and API responses are keyed on the catalog and follow it
+    global _catalog
+    catalog = Catalog(data_dir)
+    with _catalog_lock:
+        _catalog = catalog
+    return catalog
+
+
+def reset_catalog():
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
+
+
+def refresh_catalog():
+    # the new catalog if files changed since the current one was built, otherwise None
+    catalog = _catalog
+    if catalog is None or source_signature(catalog.data_dir) == catalog.source:
+        return None
+    catalog = reload_catalog(catalog.data_dir)
+    logger.info('Каталог перечитан: %s элементов за %.0f мс', len(catalog.all_items), catalog.build_time * 1000)
+    return catalog
+
+
+def watch_catalog(interval=CATALOG_CHECK_INTERVAL, on_reload=None):
+    # edits to list.txt and images take effect without a restart
+    if not interval:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                catalog = refresh_catalog()
+                if catalog is not None and on_reload:
+                    on_reload(catalog)
+            except Exception as e:
+                logger.warning('Catalog reload error: %s', e)
+
+    thread = threading.Thread(target=run, name='CatalogWatcher', daemon=True)
+    thread.start()
+    return thread
+
+
+def warmup(on_ready=None):
+    def run():
+        catalog = get_catalog()
+        if on_ready:
+            on_ready(catalog)
+
+    thread = threading.Thread(target=run, name='CatalogWarmup', daemon=True)
+    thread.start()
+    return thread
@@ -1,11 +1,69 @@
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+
+if os.path.exists(ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
 
 TOKEN = os.getenv('BOT_TOKEN')
 ITEMS_PER_PAGE = 4
 DATA_DIR = 'regionals'
+MAIN_PHOTO = 'imgs/example.png'
+PHOTO_MAX_BYTES = 10 * 1024 * 1024
+STORAGE_DIR = os.getenv('STORAGE_DIR', 'storage')
+
+CATALOG_MODE = os.getenv('CATALOG_MODE', 'eager')
+DESCRIPTION_BUDGET = int(os.getenv('DESCRIPTION_BUDGET', str(16 * 1024 * 1024)))
+DESCRIPTION_CODEC = os.getenv('DESCRIPTION_CODEC', 'zlib')
+DESCRIPTION_HOT_CACHE = 256
+CATALOG_CHECK_INTERVAL = float(os.getenv('CATALOG_CHECK_INTERVAL', '30'))
+
+WORKERS = int(os.getenv('WORKERS', '1'))
+SESSION_STORE = os.getenv('SESSION_STORE', 'sqlite://sessions.db')
+SNAPSHOT_INTERVAL = float(os.getenv('SNAPSHOT_INTERVAL', '5'))
+SESSION_TTL = int(os.getenv('SESSION_TTL', str(30 * 24 * 3600)))
+RENDER_THREADS = int(os.getenv('RENDER_THREADS', '4'))
+DEBOUNCE_WINDOW = float(os.getenv('DEBOUNCE_WINDOW', '10'))
+BACKLOG_MAX_AGE = int(os.getenv('BACKLOG_MAX_AGE', '300'))
+OFFSET_SAVE_INTERVAL = float(os.getenv('OFFSET_SAVE_INTERVAL', '5'))
+
+ADMIN_IDS = {int(x) for x in os.getenv('ADMIN_IDS', '').split(',') if x.strip()}
+
+FEEDBACK_MAX_BYTES = 5 * 1024 * 1024
+FEEDBACK_BACKUPS = 10
+FEEDBACK_PER_PAGE = 5
+
+EVENTS_ENABLED = os.getenv('EVENTS_ENABLED', '1') != '0'
+EVENTS_MAX_BYTES = 50 * 1024 * 1024
+EVENTS_BACKUPS = 20
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_MAX_BYTES = 20 * 1024 * 1024
+LOG_BACKUPS = 5
+LOG_DEDUP_WINDOW = 60
+LOG_SAMPLE_EVERY = 100
+MEMSTATS_INTERVAL = float(os.getenv('MEMSTATS_INTERVAL', '0'))
+
+BROADCAST_RATE = int(os.getenv('BROADCAST_RATE', '25'))
+BROADCAST_THREADS = 8
+
+TRANSPORT_RETRIES = int(os.getenv('TRANSPORT_RETRIES', '2'))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '0'))
+BREAKER_THRESHOLD = 5
+BREAKER_RESET = 30
+
+INLINE_PAGE_SIZE = 20
+INLINE_CACHE_TIME = 300
+
+# a private chat or channel the bot can post to; quiz photos are uploaded there ahead of time for their file_id
+MEDIA_CACHE_CHAT_ID = int(os.getenv('MEDIA_CACHE_CHAT_ID', '0'))
+
+API_HOST = os.getenv('API_HOST', '127.0.0.1')
+API_PORT = int(os.getenv('API_PORT', '0'))
+
+LEADERBOARD_SIZE = 10
+LEADERBOARD_CACHE_TTL = 30
 
 CATEGORIES = [
     'bludo',
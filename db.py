@@ -0,0 +1,12 @@
+import os
+import sqlite3
+
+from config import STORAGE_DIR
+
+
+def connect(name):
+    os.makedirs(STORAGE_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(STORAGE_DIR, name), timeout=10, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
@@ -0,0 +1,220 @@
+import logging
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+EXCERPT_LENGTH = 200
+
+logger = logging.getLogger(__name__)
+
+
+def text_bytes(texts):
+    return sum(sys.getsizeof(text) for text in texts)
+
+
+class LazyDescriptions:
+    def __init__(self, data_dir, items, budget):
+        self.data_dir = data_dir
+        self.budget = budget
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time = 0.0
+        self.resident = 0
+
+        # names are kept to line descriptions back up if list.txt changed after the build
+        self._names = {key: [item['name'] for item in category_items] for key, category_items in items.items()}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def path(self, national, category):
+        return os.path.join(self.data_dir, national, category, 'list.txt')
+
+    def get(self, national, category, idx):
+        descriptions = self.category(national, category)
+        return descriptions[idx] if idx < len(descriptions) else ''
+
+    def category(self, national, category):
+        key = (national, category)
+        with self._lock:
+            descriptions = self._cache.get(key)
+            if descriptions is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return descriptions
+
+        with self._load_lock:
+            with self._lock:
+                descriptions = self._cache.get(key)
+                if descriptions is not None:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    return descriptions
+            descriptions = self._load(national, category)
+            with self._lock:
+                self.misses += 1
+                self._cache[key] = descriptions
+                self.resident += text_bytes(descriptions)
+                while self.resident > self.budget and len(self._cache) > 1:
+                    _, evicted = self._cache.popitem(last=False)
+                    self.resident -= text_bytes(evicted)
+                    self.evictions += 1
+        return descriptions
+
+    def _load(self, national, category):
+        from catalog import parse_item_file
+
+        started = time.perf_counter()
+        names = self._names.get((national, category), [])
+        items = parse_item_file(self.path(national, category))
+        if [item['name'] for item in items] == names:
+            descriptions = tuple(item['description'] for item in items)
+        else:
+            logger.warning('Descriptions changed since catalog build: %s/%s', national, category)
+            by_name = {item['name']: item['description'] for item in items}
+            descriptions = tuple(by_name.get(name, '') for name in names)
+        self.load_time += time.perf_counter() - started
+        return descriptions
+
+    def stats(self):
+        return {
+            'mode': 'lazy',
+            'budget': self.budget,
+            'resident_bytes': self.resident,
+            'categories': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'load_ms': round(self.load_time * 1000, 1),
+        }
+
+
+def build_dictionary(texts, size=32 * 1024):
+    # zlib only looks back 32 KB, so an even sample of the corpus makes the best preset dictionary
+    texts = [text for text in texts if text]
+    if not texts:
+        return b''
+    step = max(1, len(texts) * 400 // size)
+    sample = b''
+    for text in texts[::step]:
+        sample += text.encode('utf-8')[:400] + b'\n'
+        if len(sample) >= size:
+            break
+    return sample[-size:]
+
+
+class ZlibCodec:
+    name = 'zlib'
+
+    def __init__(self, texts, level=6):
+        self.level = level
+        self.zdict = build_dictionary(texts)
+
+    def compress(self, text):
+        compressor = zlib.compressobj(self.level, zdict=self.zdict) if self.zdict else zlib.compressobj(self.level)
+        return compressor.compress(text.encode('utf-8')) + compressor.flush()
+
+    def decompress(self, blob):
+        decompressor = zlib.decompressobj(zdict=self.zdict) if self.zdict else zlib.decompressobj()
+        return (decompressor.decompress(blob) + decompressor.flush()).decode('utf-8')
+
+    def size(self):
+        return sys.getsizeof(self.zdict)
+
+
+class ZstdCodec:
+    name = 'zstd'
+
+    def __init__(self, texts, level=19, dict_size=64 * 1024):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError('zstd description codec requires the zstandard package (pip install zstandard)')
+
+        samples = [text.encode('utf-8') for text in texts if text]
+        try:
+            self.dictionary = zstandard.train_dictionary(dict_size, samples)
+        except zstandard.ZstdError:
+            # too few samples to train on, compress without a dictionary
+            self.dictionary = None
+        self.compressor = zstandard.ZstdCompressor(level=level, dict_data=self.dictionary)
+        self.decompressor = zstandard.ZstdDecompressor(dict_data=self.dictionary)
+        self._lock = threading.Lock()
+
+    def compress(self, text):
+        return self.compressor.compress(text.encode('utf-8'))
+
+    def decompress(self, blob):
+        with self._lock:
+            return self.decompressor.decompress(blob).decode('utf-8')
+
+    def size(self):
+        return len(self.dictionary.as_bytes()) if self.dictionary else 0
+
+
+CODECS = {
+    'zlib': ZlibCodec,
+    'zstd': ZstdCodec,
+}
+
+
+class CompressedDescriptions:
+    def __init__(self, items, codec='zlib', hot_size=256):
+        if codec not in CODECS:
+            raise ValueError(f'unknown description codec: {codec}')
+        texts = [item['description'] for category_items in items.values() for item in category_items]
+        self.codec = CODECS[codec](texts)
+        self.hot_size = hot_size
+        self.raw = text_bytes(texts)
+        self.hits = 0
+        self.misses = 0
+        self.decode_time = 0.0
+
+        self._blobs = {}
+        for key, category_items in items.items():
+            self._blobs[key] = tuple(self.codec.compress(item.pop('description')) for item in category_items)
+        self.resident = self.codec.size() + sum(text_bytes(blobs) for blobs in self._blobs.values())
+
+        self._hot = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, national, category, idx):
+        key = (national, category, idx)
+        with self._lock:
+            text = self._hot.get(key)
+            if text is not None:
+                self._hot.move_to_end(key)
+                self.hits += 1
+                return text
+
+        blobs = self._blobs.get((national, category), ())
+        if idx >= len(blobs):
+            return ''
+        started = time.perf_counter()
+        text = self.codec.decompress(blobs[idx])
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.misses += 1
+            self.decode_time += elapsed
+            self._hot[key] = text
+            if len(self._hot) > self.hot_size:
+                self._hot.popitem(last=False)
+        return text
+
+    def stats(self):
+        return {
+            'mode': 'compressed',
+            'codec': self.codec.name,
+            'raw_bytes': self.raw,
+            'resident_bytes': self.resident,
+            'ratio': round(self.raw / self.resident, 2) if self.resident else 0,
+            'hot': len(self._hot),
+            'hits': self.hits,
+            'misses': self.misses,
+            'decode_ms': round(self.decode_time * 1000, 1),
+        }
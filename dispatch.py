@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from config import DEBOUNCE_WINDOW, RENDER_THREADS
+
+logger = logging.getLogger(__name__)
+
+
+class ChatExecutor:
+    # renders for different chats run in parallel, renders for one chat run in press order
+    def __init__(self, threads=RENDER_THREADS):
+        self.threads = threads
+        self.submitted = 0
+        self.rendered = 0
+        self.dropped = 0
+        self.errors = 0
+
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix='Render') if threads > 0 else None
+
+    def submit(self, chat_id, func, *args, droppable=False, done=None):
+        # done is called once the task has run or was dropped
+        if self._pool is None:
+            self.submitted += 1
+            self._run(func, args, done)
+            return
+        with self._lock:
+            self.submitted += 1
+            queue = self._queues.get(chat_id)
+            if queue is not None:
+                # a drain for this chat is already scheduled and will pick it up
+                queue.append((func, args, droppable, done))
+                return
+            self._queues[chat_id] = deque([(func, args, droppable, done)])
+        self._pool.submit(self._drain, chat_id)
+
+    def _drain(self, chat_id):
+        while True:
+            with self._lock:
+                queue = self._queues[chat_id]
+                if not queue:
+                    del self._queues[chat_id]
+                    return
+                func, args, droppable, done = queue.popleft()
+                # the user already pressed something newer, so this screen would only flash by
+                stale = droppable and bool(queue)
+                if stale:
+                    self.dropped += 1
+            if stale:
+                if done is not None:
+                    done()
+            else:
+                self._run(func, args, done)
+
+    def _run(self, func, args, done=None):
+        try:
+            func(*args)
+            self.rendered += 1
+        except Exception:
+            self.errors += 1
+            logger.exception('Render error')
+        finally:
+            if done is not None:
+                done()
+
+    def pending(self):
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self):
+        return {
+            'threads': self.threads,
+            'submitted': self.submitted,
+            'rendered': self.rendered,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'pending': self.pending(),
+        }
+
+
+class Debouncer:
+    # a repeated tap on the same button of the same screen is a duplicate if it reached the bot before
+    # the first tap was rendered. A tap after that is a new press even if the screen did not change,
+    # e.g. a second wrong guess in the match game. The window bounds how long a stuck render holds the button.
+    def __init__(self, window=DEBOUNCE_WINDOW):
+        self.window = window
+        self.dropped = 0
+
+        self._presses = OrderedDict()
+        self._lock = threading.Lock()
+
+    def press(self, chat_id, data, message_id, screen=None, received_at=None):
+        # returns the key to release once the press is rendered, or None for a duplicate
+        key = (chat_id, data, message_id, screen)
+        if not self.window:
+            return key
+        received_at = time.time() if received_at is None else received_at
+        with self._lock:
+            # entries are kept in press order, so expired ones are always at the front
+            while self._presses:
+                pressed_at, _ = next(iter(self._presses.values()))
+                if received_at - pressed_at <= self.window:
+                    break
+                self._presses.popitem(last=False)
+            entry = self._presses.get(key)
+            if entry is not None and (entry[1] is None or received_at < entry[1]):
+                self.dropped += 1
+                return None
+            self._presses[key] = [received_at, None]
+            self._presses.move_to_end(key)
+        return key
+
+    def release(self, key):
+        with self._lock:
+            entry = self._presses.get(key)
+            if entry is not None:
+                entry[1] = time.time()
+
+    def stats(self):
+        return {'window': self.window, 'dropped': self.dropped, 'tracked': len(self._presses)}
@@ -0,0 +1,36 @@
+import hashlib
+import os
+import time
+
+from config import STORAGE_DIR, EVENTS_ENABLED, EVENTS_MAX_BYTES, EVENTS_BACKUPS
+from journal import JournalWriter, encode_json
+
+EVENTS_FILE = os.path.join(STORAGE_DIR, 'events.jsonl')
+
+
+def chat_hash(chat_id):
+    return hashlib.blake2b(str(chat_id).encode(), digest_size=6).hexdigest()
+
+
+def encode_event(record):
+    ts, event, chat_id, fields = record
+    payload = {'t': round(ts, 3), 'e': event, 'u': chat_hash(chat_id)}
+    payload.update(fields)
+    return encode_json(payload)
+
+
+writer = JournalWriter(
+    EVENTS_FILE,
+    max_bytes=EVENTS_MAX_BYTES,
+    backup_count=EVENTS_BACKUPS,
+    queue_size=100000,
+    batch_size=5000,
+    flush_interval=1.0,
+    fsync=False,
+    encode=encode_event,
+)
+
+
+def track(event, chat_id, **fields):
+    if EVENTS_ENABLED:
+        writer.submit((time.time(), event, chat_id, fields))
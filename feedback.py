@@ -0,0 +1,45 @@
+import glob
+import heapq
+import itertools
+import os
+import time
+
+from config import STORAGE_DIR, FEEDBACK_MAX_BYTES, FEEDBACK_BACKUPS
+from journal import JournalWriter, read_records_reverse
+
+FEEDBACK_FILE = os.path.join(STORAGE_DIR, 'feedback.jsonl')
+
+writer = JournalWriter(
+    FEEDBACK_FILE,
+    max_bytes=FEEDBACK_MAX_BYTES,
+    backup_count=FEEDBACK_BACKUPS,
+    queue_size=5000,
+    batch_size=200,
+    flush_interval=0.2,
+    fsync=True,
+)
+
+
+def save_feedback(message):
+    user = message.from_user
+    return writer.submit({
+        'ts': int(time.time()),
+        'chat_id': message.chat.id,
+        'user_id': user.id if user else None,
+        'username': user.username if user else None,
+        'name': ' '.join(filter(None, [user.first_name, user.last_name])) if user else None,
+        'text': message.text,
+    })
+
+
+def feedback_paths():
+    # the single-process file plus one per worker process, each rotated on its own
+    workers = [path for path in glob.glob(f'{glob.escape(FEEDBACK_FILE)}.w*') if path.rsplit('.w', 1)[1].isdigit()]
+    return [FEEDBACK_FILE] + sorted(workers)
+
+
+def feedback_page(page, per_page):
+    streams = [read_records_reverse(path, FEEDBACK_BACKUPS) for path in feedback_paths()]
+    records = heapq.merge(*streams, key=lambda record: record.get('ts', 0), reverse=True)
+    window = list(itertools.islice(records, page * per_page, (page + 1) * per_page + 1))
+    return window[:per_page], len(window) > per_page
@@ -0,0 +1,132 @@
+import logging
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from catalog import get_catalog
+
+IMAGE_CATEGORIES = ('bludo', 'kostyum', 'ornament')
+OPTIONS = 4
+
+logger = logging.getLogger(__name__)
+
+
+class ImageQuiz:
+    def __init__(self, catalog, max_prefetched=10000):
+        self.catalog = catalog
+        self.max_prefetched = max_prefetched
+        self.prefetched = 0
+        self.hits = 0
+        self.misses = 0
+
+        self.pools = {}
+        self.names = {}
+        for category in IMAGE_CATEGORIES:
+            pool = []
+            names = {}
+            for national in catalog.nationals:
+                for idx, item in enumerate(catalog.category_items(national, category)):
+                    names.setdefault(item['name'], None)
+                    # a missing picture would be replaced by the main photo and give nothing to guess
+                    if item['image'] and not catalog.assets.item(national, category, item['image']).fallback:
+                        pool.append((national, idx))
+            self.pools[category] = pool
+            self.names[category] = list(names)
+
+        self._next = OrderedDict()
+        self._lock = threading.Lock()
+
+    def available(self, category):
+        return bool(self.pools.get(category)) and len(self.names[category]) >= 2
+
+    def generate(self, category, exclude=None):
+        if not self.available(category):
+            return None
+        pool = self.pools[category]
+        national, idx = random.choice(pool)
+        item = self.catalog.category_items(national, category)[idx]
+        if item['name'] == exclude and len(pool) > 1:
+            national, idx = random.choice(pool)
+            item = self.catalog.category_items(national, category)[idx]
+
+        others = [name for name in self.names[category] if name != item['name']]
+        options = [item['name']] + random.sample(others, min(OPTIONS - 1, len(others)))
+        random.shuffle(options)
+
+        # only keys go into the session, the item itself stays in the catalog
+        return {
+            'type': 'image_quiz',
+            'category': category,
+            'national': national,
+            'idx': idx,
+            'image': item['image'],
+            'correct_answer': item['name'],
+            'options': options,
+        }
+
+    def asset(self, quiz):
+        return self.catalog.assets.item(quiz['national'], quiz['category'], quiz['image'])
+
+    def prefetch(self, chat_id, category, warm, exclude=None):
+        # built while the user thinks about the current question, so showing the next one uploads nothing
+        def run():
+            quiz = self.generate(category, exclude)
+            if quiz is None:
+                return
+            try:
+                warm(self.asset(quiz))
+            except Exception as e:
+                logger.warning('Image quiz prefetch error: %s', e)
+            with self._lock:
+                self._next[chat_id] = quiz
+                self._next.move_to_end(chat_id)
+                while len(self._next) > self.max_prefetched:
+                    self._next.popitem(last=False)
+                self.prefetched += 1
+
+        prefetcher().submit(run)
+
+    def next(self, chat_id, category):
+        with self._lock:
+            quiz = self._next.pop(chat_id, None)
+        if quiz is not None and quiz['category'] == category:
+            self.hits += 1
+            return quiz
+        self.misses += 1
+        return self.generate(category)
+
+    def stats(self):
+        return {
+            'items': {category: len(pool) for category, pool in self.pools.items()},
+            'prefetched': self.prefetched,
+            'hits': self.hits,
+            'misses': self.misses,
+            'waiting': len(self._next),
+        }
+
+
+_image_quiz = None
+_image_quiz_lock = threading.Lock()
+_prefetcher = None
+
+
+def prefetcher():
+    global _prefetcher
+    if _prefetcher is None:
+        with _image_quiz_lock:
+            if _prefetcher is None:
+                _prefetcher = ThreadPoolExecutor(2, thread_name_prefix='ImageQuiz')
+    return _prefetcher
+
+
+def get_image_quiz():
+    global _image_quiz
+    catalog = get_catalog()
+    image_quiz = _image_quiz
+    if image_quiz is None or image_quiz.catalog is not catalog:
+        with _image_quiz_lock:
+            if _image_quiz is None or _image_quiz.catalog is not catalog:
+                _image_quiz = ImageQuiz(catalog)
+            image_quiz = _image_quiz
+    return image_quiz
@@ -0,0 +1,210 @@
+import abc
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWorker(abc.ABC):
+    def __init__(self, name, queue_size=10000, batch_size=500, flush_interval=0.5):
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self.open()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+        return self
+
+    def submit(self, record):
+        if self._thread is None:
+            try:
+                self.start()
+            except Exception as e:
+                self.errors += 1
+                logger.error('%s start error: %s', self.name, e)
+                return False
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self, timeout=5):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def open(self):
+        pass
+
+    @abc.abstractmethod
+    def process(self, batch):
+        pass
+
+    def shutdown(self):
+        pass
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    record = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+
+                batch = [record]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                stop = _STOP in batch
+                if stop:
+                    batch = [record for record in batch if record is not _STOP]
+
+                if batch:
+                    try:
+                        self.process(batch)
+                        self.batches += 1
+                    except Exception as e:
+                        self.errors += 1
+                        logger.error('%s error: %s', self.name, e)
+
+                if stop:
+                    break
+        finally:
+            self.shutdown()
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'errors': self.errors,
+        }
+
+
+class JournalWriter(BatchWorker):
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=5, queue_size=10000,
+                 batch_size=500, flush_interval=0.5, fsync=True, encode=None):
+        super().__init__(f'Journal:{os.path.basename(path)}', queue_size, batch_size, flush_interval)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.fsync = fsync
+        self.encode = encode or encode_json
+        self.rotations = 0
+        self._file = None
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'ab')
+
+    def process(self, batch):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.encode(record))
+            except Exception as e:
+                self.errors += 1
+                logger.warning('Journal encode error: %s', e)
+        if not lines:
+            return
+
+        f = self._file
+        f.write(b''.join(lines))
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+        self.written += len(lines)
+
+        if self.max_bytes and f.tell() >= self.max_bytes:
+            f.close()
+            self._rotate()
+            self._file = open(self.path, 'ab')
+
+    def shutdown(self):
+        if self._file:
+            self._file.close()
+
+    def _rotate(self):
+        for idx in range(self.backup_count - 1, 0, -1):
+            source = f'{self.path}.{idx}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{idx + 1}')
+        if self.backup_count > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+
+    def stats(self):
+        stats = super().stats()
+        stats['rotations'] = self.rotations
+        return stats
+
+
+def encode_json(record):
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def journal_files(path, backup_count):
+    # newest first: the live file, then .1, .2, ...
+    files = [path] + [f'{path}.{idx}' for idx in range(1, backup_count + 1)]
+    return [name for name in files if os.path.exists(name)]
+
+
+def read_lines_reverse(path, block_size=64 * 1024):
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        remainder = b''
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + remainder).split(b'\n')
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line
+        if remainder:
+            yield remainder
+
+
+def read_records_reverse(path, backup_count):
+    for name in journal_files(path, backup_count):
+        for line in read_lines_reverse(name):
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
@@ -0,0 +1,226 @@
+import threading
+import time
+
+from config import LEADERBOARD_CACHE_TTL
+from db import connect
+from journal import BatchWorker
+
+GAMES = ('marathon', 'blitz')
+SCOPES = ('all', 'week', 'class')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    game TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    name TEXT,
+    class_name TEXT,
+    score INTEGER NOT NULL,
+    week TEXT NOT NULL,
+    ts INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_week ON scores (game, week, score DESC);
+
+CREATE TABLE IF NOT EXISTS best (
+    game TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    name TEXT,
+    class_name TEXT,
+    score INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    PRIMARY KEY (game, chat_id)
+);
+CREATE INDEX IF NOT EXISTS best_score ON best (game, score DESC);
+CREATE INDEX IF NOT EXISTS best_class ON best (game, class_name, score DESC);
+
+CREATE TABLE IF NOT EXISTS players (
+    chat_id INTEGER PRIMARY KEY,
+    class_name TEXT
+);
+'''
+
+
+def current_week(ts=None):
+    return time.strftime('%G-%V', time.localtime(ts))
+
+
+class ScoreWriter(BatchWorker):
+    def __init__(self, db_name, on_written=None):
+        super().__init__('Leaderboard', queue_size=10000, batch_size=500, flush_interval=0.5)
+        self.db_name = db_name
+        self.on_written = on_written
+        self.conn = None
+
+    def open(self):
+        self.conn = connect(self.db_name)
+        self.conn.executescript(SCHEMA)
+
+    def process(self, batch):
+        with self.conn:
+            for kind, row in batch:
+                if kind == 'score':
+                    game, chat_id, name, class_name, score, week, ts = row
+                    self.conn.execute(
+                        'INSERT INTO scores (game, chat_id, name, class_name, score, week, ts) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        row,
+                    )
+                    self.conn.execute(
+                        'INSERT INTO best (game, chat_id, name, class_name, score, ts) VALUES (?, ?, ?, ?, ?, ?) '
+                        'ON CONFLICT (game, chat_id) DO UPDATE SET '
+                        'name = excluded.name, class_name = excluded.class_name, '
+                        'score = excluded.score, ts = excluded.ts '
+                        'WHERE excluded.score > best.score',
+                        (game, chat_id, name, class_name, score, ts),
+                    )
+                elif kind == 'class':
+                    chat_id, class_name = row
+                    self.conn.execute(
+                        'INSERT INTO players (chat_id, class_name) VALUES (?, ?) '
+                        'ON CONFLICT (chat_id) DO UPDATE SET class_name = excluded.class_name',
+                        row,
+                    )
+                    self.conn.execute('UPDATE best SET class_name = ? WHERE chat_id = ?', (class_name, chat_id))
+        self.written += len(batch)
+        if self.on_written:
+            self.on_written(batch)
+
+    def shutdown(self):
+        if self.conn:
+            self.conn.close()
+
+
+class Leaderboard:
+    # places are counted in the database, which every worker process shares; only what this process
+    # submitted and the writer has not flushed yet is kept in memory on top of it
+    def __init__(self, db_name='leaderboard.db', cache_ttl=LEADERBOARD_CACHE_TTL):
+        self.db_name = db_name
+        self.cache_ttl = cache_ttl
+        self.writer = ScoreWriter(db_name, self._written)
+
+        self._conn = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._pending = {}
+        self._pending_classes = {}
+        self._cache = {}
+
+    def _ensure_loaded(self):
+        if self._conn is not None:
+            return
+        with self._lock:
+            if self._conn is not None:
+                return
+            conn = connect(self.db_name)
+            conn.executescript(SCHEMA)
+            self._conn = conn
+
+    def _query(self, sql, args):
+        self._ensure_loaded()
+        with self._lock:
+            return self._conn.execute(sql, args).fetchone()
+
+    def _written(self, batch):
+        with self._lock:
+            for kind, row in batch:
+                if kind == 'score':
+                    key = (row[0], row[1])
+                    if self._pending.get(key) == row[4]:
+                        del self._pending[key]
+                elif self._pending_classes.get(row[0]) == row[1]:
+                    del self._pending_classes[row[0]]
+
+    def submit(self, game, chat_id, name, score):
+        ts = int(time.time())
+        class_name = self.get_class(chat_id)
+
+        with self._lock:
+            key = (game, chat_id)
+            previous = self._pending.get(key)
+            if previous is None or score > previous:
+                self._pending[key] = score
+
+        self.writer.submit(('score', (game, chat_id, name, class_name, score, current_week(ts), ts)))
+        return self.rank(game, chat_id)
+
+    def rank(self, game, chat_id):
+        best = self.best_score(game, chat_id)
+        if best is None:
+            return None
+        higher, = self._query(
+            'SELECT COUNT(*) FROM best WHERE game = ? AND score > ? AND chat_id != ?',
+            (game, best, chat_id),
+        )
+        return higher + 1
+
+    def best_score(self, game, chat_id):
+        row = self._query('SELECT score FROM best WHERE game = ? AND chat_id = ?', (game, chat_id))
+        pending = self._pending.get((game, chat_id))
+        scores = [score for score in (row[0] if row else None, pending) if score is not None]
+        return max(scores) if scores else None
+
+    def players(self, game):
+        count, = self._query('SELECT COUNT(*) FROM best WHERE game = ?', (game,))
+        with self._lock:
+            pending = [chat_id for pending_game, chat_id in self._pending if pending_game == game]
+        for chat_id in pending:
+            if self._query('SELECT 1 FROM best WHERE game = ? AND chat_id = ?', (game, chat_id)) is None:
+                count += 1
+        return count
+
+    def set_class(self, chat_id, class_name):
+        with self._lock:
+            self._pending_classes[chat_id] = class_name
+        self.writer.submit(('class', (chat_id, class_name)))
+
+    def get_class(self, chat_id):
+        class_name = self._pending_classes.get(chat_id)
+        if class_name is not None:
+            return class_name
+        row = self._query('SELECT class_name FROM players WHERE chat_id = ?', (chat_id,))
+        return row[0] if row else None
+
+    def top(self, game, scope='all', class_name=None, limit=10):
+        self._ensure_loaded()
+        week = current_week() if scope == 'week' else None
+        key = (game, scope, class_name, week, limit)
+
+        entry = self._cache.get(key)
+        if entry and time.monotonic() - entry[0] < self.cache_ttl:
+            return entry[1]
+
+        with self._refresh_lock:
+            entry = self._cache.get(key)
+            if entry and time.monotonic() - entry[0] < self.cache_ttl:
+                return entry[1]
+            with self._lock:
+                rows = self._query_top(game, scope, class_name, week, limit)
+            self._cache[key] = (time.monotonic(), rows)
+            return rows
+
+    def _query_top(self, game, scope, class_name, week, limit):
+        if scope == 'week':
+            cursor = self._conn.execute(
+                'SELECT chat_id, name, class_name, MAX(score) AS top_score FROM scores '
+                'WHERE game = ? AND week = ? GROUP BY chat_id ORDER BY top_score DESC LIMIT ?',
+                (game, week, limit),
+            )
+        elif scope == 'class':
+            cursor = self._conn.execute(
+                'SELECT chat_id, name, class_name, score FROM best '
+                'WHERE game = ? AND class_name = ? ORDER BY score DESC LIMIT ?',
+                (game, class_name, limit),
+            )
+        else:
+            cursor = self._conn.execute(
+                'SELECT chat_id, name, class_name, score FROM best '
+                'WHERE game = ? ORDER BY score DESC LIMIT ?',
+                (game, limit),
+            )
+        return [
+            {'chat_id': chat_id, 'name': name, 'class_name': class_name, 'score': score}
+            for chat_id, name, class_name, score in cursor.fetchall()
+        ]
+
+
+leaderboard = Leaderboard()
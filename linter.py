@@ -0,0 +1,211 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from assets import AssetManifest, category_preview_path, national_preview_path
+from config import CATEGORIES, MAIN_PHOTO, PHOTO_MAX_BYTES
+from nationals import NATIONALS_RU
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+START_RE = re.compile(r'^=START=\s*\{([^}]*)\}\s*===\s*$')
+END_RE = re.compile(r'^=END=\s*\{([^}]*)\}\s*===\s*$')
+DATE_RES = [
+    re.compile(r'^\d{1,4}g$'),
+    re.compile(r'^\d{1,4}(-\d{1,4})?gg$'),
+    re.compile(r'^\d{4}$'),
+    re.compile(r'^\d{4}-\d{4}$'),
+]
+
+
+def issue(path, line, level, code, message):
+    return {'file': path, 'line': line, 'level': level, 'code': code, 'message': message}
+
+
+def check_date(value):
+    if any(pattern.match(value) for pattern in DATE_RES):
+        return True
+    try:
+        datetime.strptime(value, '%d.%m.%Y')
+        return True
+    except ValueError:
+        return False
+
+
+def check_block(path, line_no, header, description, category, seen_names, assets):
+    issues = []
+    parts = [part.strip() for part in header.split('/')]
+    if len(parts) < 3:
+        return [issue(path, line_no, 'error', 'bad-header',
+                      f'header must be "category: name / image / date", got "{header.strip()}"')]
+
+    name_part, image, date = parts[0], parts[1], parts[2]
+    if ':' in name_part:
+        header_category, name = [part.strip() for part in name_part.split(':', 1)]
+        if header_category != category:
+            issues.append(issue(path, line_no, 'warning', 'category-mismatch',
+                                f'block category "{header_category}" is in the "{category}" folder'))
+    else:
+        name = name_part
+
+    if not name:
+        issues.append(issue(path, line_no, 'error', 'empty-name', 'item name is empty'))
+    elif name in seen_names:
+        issues.append(issue(path, line_no, 'error', 'duplicate-name',
+                            f'"{name}" is already defined on line {seen_names[name]}'))
+    else:
+        seen_names[name] = line_no
+
+    if not check_date(date):
+        issues.append(issue(path, line_no, 'error', 'bad-date', f'unrecognized date "{date}"'))
+
+    if not description.strip():
+        issues.append(issue(path, line_no, 'warning', 'empty-description', f'"{name}" has no description'))
+
+    if not image:
+        issues.append(issue(path, line_no, 'error', 'missing-image', f'"{name}" has no image'))
+    else:
+        if not image.lower().endswith(IMAGE_EXTENSIONS):
+            issues.append(issue(path, line_no, 'warning', 'image-extension', f'unexpected image type "{image}"'))
+        # the same manifest the catalog builds, so the bot and the linter agree on which images fall back
+        image_path = os.path.join(os.path.dirname(path), image)
+        assets.add(image_path)
+        if image_path in assets.missing:
+            size = assets.missing[image_path]
+            if size is None:
+                issues.append(issue(path, line_no, 'error', 'missing-image', f'image "{image}" does not exist'))
+            elif size > assets.max_bytes:
+                issues.append(issue(path, line_no, 'error', 'oversized-image',
+                                    f'image "{image}" is {size} bytes (limit {assets.max_bytes})'))
+            else:
+                issues.append(issue(path, line_no, 'error', 'unreadable-image', f'image "{image}" cannot be read'))
+
+    return issues
+
+
+def lint_file(path, max_image_bytes=PHOTO_MAX_BYTES, assets=None):
+    category = os.path.basename(os.path.dirname(path))
+    if assets is None:
+        data_dir = os.path.dirname(os.path.dirname(os.path.dirname(path)))
+        assets = AssetManifest(data_dir, [], {}, max_image_bytes)
+    issues = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except (OSError, UnicodeDecodeError) as e:
+        return [issue(path, 0, 'error', 'unreadable', str(e))]
+
+    seen_names = {}
+    open_block = None
+    body = []
+    blocks = 0
+
+    for line_no, line in enumerate(lines, 1):
+        start = START_RE.match(line)
+        end = END_RE.match(line)
+
+        if start:
+            if open_block:
+                issues.append(issue(path, open_block[0], 'error', 'unclosed-block',
+                                    'block is not closed before the next =START='))
+            open_block = (line_no, start.group(1))
+            body = []
+        elif end:
+            if not open_block:
+                issues.append(issue(path, line_no, 'error', 'unexpected-end', '=END= without a matching =START='))
+                continue
+            start_line, header = open_block
+            if end.group(1).strip() != header.strip():
+                issues.append(issue(path, line_no, 'error', 'header-mismatch',
+                                    f'=END= header "{end.group(1).strip()}" does not match '
+                                    f'=START= header "{header.strip()}" on line {start_line}'))
+            issues.extend(check_block(path, start_line, header, '\n'.join(body), category,
+                                      seen_names, assets))
+            blocks += 1
+            open_block = None
+        elif line.startswith(('=START=', '=END=')):
+            issues.append(issue(path, line_no, 'error', 'bad-marker', f'malformed marker line "{line.strip()}"'))
+        elif open_block:
+            body.append(line)
+        elif line.strip():
+            issues.append(issue(path, line_no, 'warning', 'stray-text', 'text outside of any block is ignored'))
+
+    if open_block:
+        issues.append(issue(path, open_block[0], 'error', 'unclosed-block', 'block is never closed'))
+    if not blocks and not issues:
+        issues.append(issue(path, 0, 'warning', 'empty-file', 'file has no items'))
+
+    return issues
+
+
+def lint_structure(data_dir):
+    issues = []
+    files = []
+    if not os.path.isdir(data_dir):
+        return [issue(data_dir, 0, 'error', 'missing-data-dir', 'data directory does not exist')], files
+    assets = AssetManifest(data_dir, [], {})
+    if assets.fallback.digest is None:
+        issues.append(issue(MAIN_PHOTO, 0, 'warning', 'missing-fallback',
+                            'fallback photo is missing, items without images are sent as text'))
+
+    for national in sorted(os.listdir(data_dir)):
+        national_dir = os.path.join(data_dir, national)
+        if not os.path.isdir(national_dir):
+            continue
+        if national not in NATIONALS_RU:
+            issues.append(issue(national_dir, 0, 'error', 'unknown-national',
+                                f'"{national}" is not a key of NATIONALS_RU'))
+        if assets.add(national_preview_path(national, data_dir)).fallback:
+            issues.append(issue(national_dir, 0, 'warning', 'missing-preview', 'national has no preview.png'))
+        for category in sorted(os.listdir(national_dir)):
+            category_dir = os.path.join(national_dir, category)
+            if not os.path.isdir(category_dir):
+                continue
+            if category not in CATEGORIES:
+                issues.append(issue(category_dir, 0, 'warning', 'unknown-category',
+                                    f'"{category}" is not one of {", ".join(CATEGORIES)}'))
+                continue
+            if assets.add(category_preview_path(national, category, data_dir)).fallback:
+                issues.append(issue(category_dir, 0, 'warning', 'missing-preview', 'category has no preview.png'))
+            list_path = os.path.join(category_dir, 'list.txt')
+            if os.path.exists(list_path):
+                files.append(list_path)
+            else:
+                issues.append(issue(category_dir, 0, 'warning', 'missing-list', 'category has no list.txt'))
+    return issues, files
+
+
+def _lint_chunk(args):
+    data_dir, paths, max_image_bytes = args
+    # one manifest per chunk, so the images of a chunk are read and hashed in its own process
+    assets = AssetManifest(data_dir, [], {}, max_image_bytes)
+    issues = []
+    for path in paths:
+        issues.extend(lint_file(path, max_image_bytes, assets))
+    return issues
+
+
+def lint_content(data_dir, processes=None, max_image_bytes=PHOTO_MAX_BYTES):
+    issues, files = lint_structure(data_dir)
+
+    processes = min(processes or os.cpu_count() or 1, max(len(files), 1))
+    chunk_size = max(1, len(files) // (processes * 4))
+    chunks = [(data_dir, files[idx:idx + chunk_size], max_image_bytes) for idx in range(0, len(files), chunk_size)]
+
+    if processes <= 1:
+        for chunk in chunks:
+            issues.extend(_lint_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            for chunk_issues in pool.map(_lint_chunk, chunks):
+                issues.extend(chunk_issues)
+
+    errors = sum(1 for entry in issues if entry['level'] == 'error')
+    return {
+        'data_dir': data_dir,
+        'files': len(files),
+        'errors': errors,
+        'warnings': len(issues) - errors,
+        'issues': issues,
+    }
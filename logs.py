@@ -0,0 +1,206 @@
+import atexit
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from config import LOG_BACKUPS, LOG_DEDUP_WINDOW, LOG_LEVEL, LOG_MAX_BYTES, LOG_SAMPLE_EVERY, STORAGE_DIR
+from events import chat_hash
+
+LOG_FILE = os.path.join(STORAGE_DIR, 'bot.log')
+SLOW_HANDLER_MS = 2000
+
+logger = logging.getLogger(__name__)
+
+_context = threading.local()
+_handler = None
+_listener = None
+_registered = False
+_setup_lock = threading.Lock()
+
+
+@contextmanager
+def log_context(chat_id=None, **fields):
+    # every record logged inside carries the chat, the route and the time since the context opened
+    previous = getattr(_context, 'fields', None)
+    current = dict(previous or {})
+    if chat_id is not None:
+        current['u'] = chat_hash(chat_id)
+    current.update(fields)
+    current['_started'] = time.perf_counter()
+    _context.fields = current
+    try:
+        yield
+    finally:
+        _context.fields = previous
+
+
+def traced(kind):
+    # handlers run inside a log context for their chat and route, and report themselves when slow
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(update):
+            message = getattr(update, 'message', None) or update
+            data = getattr(update, 'data', None)
+            route = data.split('_', 1)[0] if data else kind
+            with log_context(message.chat.id, route=route):
+                started = time.perf_counter()
+                try:
+                    return handler(update)
+                finally:
+                    elapsed = (time.perf_counter() - started) * 1000
+                    if elapsed > SLOW_HANDLER_MS:
+                        logger.warning('Slow %s handler: %.0f ms', kind, elapsed)
+        return wrapper
+    return decorator
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        fields = getattr(_context, 'fields', None)
+        if fields:
+            record.context = {key: value for key, value in fields.items() if key != '_started'}
+            record.context['ms'] = round((time.perf_counter() - fields['_started']) * 1000, 1)
+        return True
+
+
+class DedupFilter(logging.Filter):
+    # an error that hits every user would otherwise flood the log with copies of itself:
+    # the first one passes, repeats inside the window are counted and every Nth is let through
+    def __init__(self, window=LOG_DEDUP_WINDOW, sample_every=LOG_SAMPLE_EVERY, max_keys=1000):
+        super().__init__()
+        self.window = window
+        self.sample_every = sample_every
+        self.max_keys = max_keys
+        self.suppressed = 0
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        key = (record.name, record.levelno, record.msg, exc_type)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is None or now - entry[0] > self.window:
+                if entry is None and len(self._seen) >= self.max_keys:
+                    self._seen.clear()
+                repeated = entry[1] if entry else 0
+                self._seen[key] = [now, 0]
+            else:
+                entry[1] += 1
+                if entry[1] % self.sample_every:
+                    self.suppressed += 1
+                    return False
+                repeated = entry[1]
+        if repeated:
+            record.repeated = repeated
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            't': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        payload.update(getattr(record, 'context', None) or {})
+        if getattr(record, 'data', None) is not None:
+            payload['data'] = record.data
+        if getattr(record, 'repeated', None):
+            payload['repeated'] = record.repeated
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        if getattr(record, 'repeated', None):
+            text += f' (повторов: {record.repeated})'
+        return text
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # only the message is rendered here; tracebacks are formatted by the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup(path=LOG_FILE, level=LOG_LEVEL, console=True, queue_size=10000):
+    # calling it again replaces the queue and listener, e.g. to give a worker process its own file
+    global _handler, _listener, _registered
+    with _setup_lock:
+        root = logging.getLogger()
+        if _handler is not None:
+            root.removeHandler(_handler)
+            if _listener is not None and _listener._thread is not None and _listener._thread.is_alive():
+                _listener.stop()
+
+        handlers = []
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8', delay=True,
+            )
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+        if console:
+            console_handler = logging.StreamHandler(sys.stderr)
+            console_handler.setFormatter(ConsoleFormatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+            handlers.append(console_handler)
+
+        _handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+        _handler.addFilter(ContextFilter())
+        _handler.addFilter(DedupFilter())
+        _listener = logging.handlers.QueueListener(_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        root.addHandler(_handler)
+        root.setLevel(level)
+        if not _registered:
+            atexit.register(shutdown)
+            _registered = True
+    return _handler
+
+
+def shutdown():
+    with _setup_lock:
+        if _listener is not None and _listener._thread is not None and _listener._thread.is_alive():
+            _listener.stop()
+
+
+def stats():
+    if _handler is None:
+        return {'configured': False}
+    dedup = next((f for f in _handler.filters if isinstance(f, DedupFilter)), None)
+    return {
+        'configured': True,
+        'queued': _handler.queue.qsize(),
+        'dropped': _handler.dropped,
+        'suppressed': dedup.suppressed if dedup else 0,
+    }
@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from config import API_HOST, API_PORT, DATA_DIR, PHOTO_MAX_BYTES
+
+
+def write_report(report, output):
+    data = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(data + '\n')
+    else:
+        print(data)
+
+
+def events_report_command(args):
+    from analytics import events_report
+    from events import EVENTS_FILE
+
+    paths = args.paths or [os.path.dirname(EVENTS_FILE)]
+    write_report(events_report(paths, processes=args.processes, top=args.top), args.output)
+    return 0
+
+
+def lint_content_command(args):
+    from linter import lint_content
+
+    report = lint_content(args.data_dir, processes=args.processes, max_image_bytes=args.max_image_bytes)
+    write_report(report, args.output)
+    if report['errors'] or (args.strict and report['warnings']):
+        return 1
+    return 0
+
+
+def export_site_command(args):
+    from site_export import export_site
+
+    report = export_site(args.data_dir, args.output_dir, processes=args.processes,
+                         max_size=args.max_size, quality=args.quality, force=args.force)
+    write_report(report, None)
+    return 0
+
+
+def serve_api_command(args):
+    from api_server import get_responses, start_api_server
+    from catalog import watch_catalog
+    from logs import setup
+
+    setup()
+    get_responses()
+    watch_catalog()
+    server = start_api_server(args.host, args.port)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Этносфера: служебные команды')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    report = commands.add_parser('events-report', help='aggregate interaction event logs')
+    report.add_argument('paths', nargs='*', help='event log files or directories (default: the live event log)')
+    report.add_argument('--processes', type=int, help='worker processes (default: one per CPU)')
+    report.add_argument('--top', type=int, default=10)
+    report.add_argument('--output', help='write JSON report to this file instead of stdout')
+    report.set_defaults(func=events_report_command)
+
+    lint = commands.add_parser('lint-content', help='validate list.txt files and images')
+    lint.add_argument('--data-dir', default=DATA_DIR)
+    lint.add_argument('--processes', type=int, help='worker processes (default: one per CPU)')
+    lint.add_argument('--max-image-bytes', type=int, default=PHOTO_MAX_BYTES,
+                      help='largest image Telegram will accept as a photo')
+    lint.add_argument('--strict', action='store_true', help='exit non-zero on warnings too')
+    lint.add_argument('--output', help='write JSON report to this file instead of stdout')
+    lint.set_defaults(func=lint_content_command)
+
+    export = commands.add_parser('export-site', help='render the catalog into static HTML pages')
+    export.add_argument('output_dir', nargs='?', default='site')
+    export.add_argument('--data-dir', default=DATA_DIR)
+    export.add_argument('--processes', type=int, help='worker processes (default: one per CPU)')
+    export.add_argument('--max-size', type=int, default=800, help='longest image side in pixels, 0 keeps originals')
+    export.add_argument('--quality', type=int, default=85, help='JPEG quality of resized images')
+    export.add_argument('--force', action='store_true', help='ignore the manifest and render everything')
+    export.set_defaults(func=export_site_command)
+
+    api = commands.add_parser('serve-api', help='serve the read-only catalog JSON API')
+    api.add_argument('--host', default=API_HOST)
+    api.add_argument('--port', type=int, default=API_PORT or 8080)
+    api.set_defaults(func=serve_api_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
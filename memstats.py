@@ -0,0 +1,255 @@
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+from config import MEMSTATS_INTERVAL
+
+# which part of the bot each session key belongs to
+STATE_KINDS = {
+    'current_quiz': 'quiz',
+    'quiz_score': 'quiz',
+    'quiz_total': 'quiz',
+    'marathon': 'marathon',
+    'blitz': 'blitz',
+    'match_game': 'match',
+    'search_mode': 'search',
+    'search_type': 'search',
+    'selected_nationals': 'navigation',
+    'nat_page': 'navigation',
+    'last_message_id': 'navigation',
+    'last_photo': 'navigation',
+    'waiting_feedback': 'feedback',
+}
+CONTAINERS = (dict, list, tuple, set, frozenset, deque)
+
+logger = logging.getLogger(__name__)
+
+
+def deep_size(obj, seen):
+    # objects already counted elsewhere (catalog items referenced from a quiz, interned names) count once
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, CONTAINERS):
+            stack.extend(obj)
+    return size
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # peak rather than current, but better than nothing off Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def catalog_memory(catalog, seen):
+    report = {
+        'mode': catalog.mode,
+        'items': len(catalog.all_items),
+        'bytes': deep_size((catalog.items, catalog.all_items, catalog.nationals), seen),
+    }
+    if catalog.descriptions is not None:
+        report['descriptions_bytes'] = catalog.descriptions.resident
+    return report
+
+
+def loaded_module(name):
+    # caches are only inspected if something already built them; the report must not build them itself
+    return sys.modules.get(name)
+
+
+def cache_memory(seen):
+    caches = {}
+
+    def add(name, entries, *containers):
+        caches[name] = {'entries': entries, 'bytes': sum(deep_size(container, seen) for container in containers)}
+
+    module = loaded_module('search_index')
+    if module and module._index is not None:
+        index = module._index
+        add('search_index', len(index.entries), index.entries, index.prefixes, index.grams)
+        add('search_results', len(index._cache), index._cache)
+    module = loaded_module('cards')
+    if module and module._cards is not None:
+        add('cards', len(module._cards._pages), module._cards._pages)
+    module = loaded_module('api_server')
+    if module and module._responses is not None:
+        responses = module._responses
+        add('api_responses', len(responses._static) + len(responses._cache), responses._static, responses._cache)
+    module = loaded_module('image_quiz')
+    if module and module._image_quiz is not None:
+        image_quiz = module._image_quiz
+        add('image_quiz', len(image_quiz._next), image_quiz.pools, image_quiz.names, image_quiz._next)
+    module = loaded_module('leaderboard')
+    if module:
+        board = module.leaderboard
+        add('leaderboard', len(board._pending) + len(board._cache), board._pending, board._pending_classes, board._cache)
+    module = loaded_module('assets')
+    if module:
+        add('file_ids', len(module._file_ids), module._file_ids)
+        add('image_digests', len(module._digests), module._digests)
+    return caches
+
+
+def session_memory(states, seen):
+    kinds = {}
+    total = 0
+    for chat_id, state in list(states.items()):
+        total += sys.getsizeof(chat_id) + sys.getsizeof(state)
+        present = set()
+        for key, value in list(state.items()):
+            kind = STATE_KINDS.get(key, 'other')
+            entry = kinds.setdefault(kind, {'sessions': 0, 'bytes': 0})
+            size = deep_size(key, seen) + deep_size(value, seen)
+            entry['bytes'] += size
+            total += size
+            if kind not in present:
+                present.add(kind)
+                entry['sessions'] += 1
+    return {
+        'entries': len(states),
+        'bytes': total + sys.getsizeof(states),
+        'kinds': dict(sorted(kinds.items(), key=lambda kind: -kind[1]['bytes'])),
+    }
+
+
+def memory_report(states, catalog=None):
+    started = time.perf_counter()
+    seen = set()
+    report = {'pid': os.getpid(), 'rss_bytes': rss_bytes()}
+    # the catalog goes first, so sessions and caches are charged only for what they hold on their own
+    if catalog is not None:
+        report['catalog'] = catalog_memory(catalog, seen)
+    report['caches'] = cache_memory(seen)
+    report['sessions'] = session_memory(states, seen)
+    report['tracing'] = tracer.stats()
+    report['report_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+def short_path(filename):
+    # site-packages and the bot's own directory say nothing, only the module path does
+    prefixes = [path for path in sys.path if path and filename.startswith(path.rstrip(os.sep) + os.sep)]
+    if not prefixes:
+        return filename
+    return filename[len(max(prefixes, key=len).rstrip(os.sep)) + 1:]
+
+
+class Tracer:
+    # tracemalloc costs memory and CPU, so it only runs between an explicit start and stop
+    def __init__(self):
+        self.baseline = None
+        self.baseline_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def take():
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ))
+
+    def start(self, frames=1):
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self.baseline = self.take()
+            self.baseline_at = time.time()
+
+    def stop(self):
+        with self._lock:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self.baseline = None
+            self.baseline_at = None
+
+    def diff(self, top=10, key_type='lineno'):
+        # growth since the previous snapshot, which then becomes the new baseline
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                return None
+            snapshot = self.take()
+            since = self.baseline_at
+            if self.baseline is None:
+                stats = snapshot.statistics(key_type)
+            else:
+                stats = snapshot.compare_to(self.baseline, key_type)
+            self.baseline = snapshot
+            self.baseline_at = time.time()
+
+        result = []
+        for stat in stats[:top]:
+            frame = stat.traceback[0]
+            result.append({
+                'where': f'{short_path(frame.filename)}:{frame.lineno}',
+                'size': stat.size,
+                'size_diff': getattr(stat, 'size_diff', stat.size),
+                'count': stat.count,
+                'count_diff': getattr(stat, 'count_diff', stat.count),
+            })
+        return {'since': since, 'top': result}
+
+    def stats(self):
+        if not tracemalloc.is_tracing():
+            return {'enabled': False}
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            'enabled': True,
+            'traced_bytes': current,
+            'peak_bytes': peak,
+            'overhead_bytes': tracemalloc.get_tracemalloc_memory(),
+            'since': self.baseline_at,
+        }
+
+
+tracer = Tracer()
+
+
+def start_monitor(states, get_catalog, interval=MEMSTATS_INTERVAL):
+    # a memory record in the log every interval, so growth over weeks can be attributed afterwards
+    if not interval:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                logger.info('memory', extra={'data': memory_report(states, get_catalog())})
+            except Exception as e:
+                logger.warning('Memory report error: %s', e)
+
+    thread = threading.Thread(target=run, name='MemoryMonitor', daemon=True)
+    thread.start()
+    return thread
+
+
+def format_bytes(size):
+    if size is None:
+        return '—'
+    for unit in ('Б', 'КБ', 'МБ'):
+        if abs(size) < 1024:
+            return f'{size:.0f} {unit}'
+        size /= 1024
+    return f'{size:.1f} ГБ'
@@ -0,0 +1,153 @@
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from catalog import get_catalog
+
+WORD_RE = re.compile(r'\w+')
+MAX_PREFIX = 20
+MAX_RESULTS = 200
+FUZZY_THRESHOLD = 0.35
+
+
+def normalize(text):
+    return ' '.join(WORD_RE.findall(text.lower().replace('ё', 'е')))
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[idx:idx + 3] for idx in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    def __init__(self, catalog, cache_size=4096):
+        self.catalog = catalog
+        self.entries = []
+        self.prefixes = {}
+        self.grams = {}
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        records = []
+        for (national, category), items in catalog.items.items():
+            for idx, item in enumerate(items):
+                records.append((normalize(item['name']), national, category, idx, item))
+        # ids follow (length, name) order, so every posting list is already ranked
+        records.sort(key=lambda record: (len(record[0]), record[0]))
+
+        for name, national, category, idx, item in records:
+            entry_id = len(self.entries)
+            self.entries.append({
+                'id': f'{national}_{category}_{idx}',
+                'national': national,
+                'category': category,
+                'idx': idx,
+                'item': item,
+                'key': name,
+                'words': name.split(),
+                'grams': len(trigrams(name)),
+            })
+            prefixes = set()
+            for word in name.split():
+                for length in range(1, min(len(word), MAX_PREFIX) + 1):
+                    prefixes.add(word[:length])
+            for prefix in prefixes:
+                self.prefixes.setdefault(prefix, []).append(entry_id)
+            for gram in trigrams(name):
+                self.grams.setdefault(gram, []).append(entry_id)
+
+    def search(self, query):
+        key = normalize(query)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+
+        results = self._search(key)
+
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = results
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return results
+
+    def _search(self, key):
+        if not key:
+            return []
+
+        words = [word[:MAX_PREFIX] for word in key.split()]
+        postings = [self.prefixes.get(word) for word in words]
+        matched = set()
+        exact, starts, contains = [], [], []
+        if all(postings):
+            shortest = min(postings, key=len)
+            others = [word for word, posting in zip(words, postings) if posting is not shortest]
+            for entry_id in shortest:
+                entry = self.entries[entry_id]
+                if others and not all(any(name_word.startswith(word) for name_word in entry['words'])
+                                      for word in others):
+                    continue
+                matched.add(entry_id)
+                if entry['key'] == key:
+                    exact.append(entry_id)
+                elif entry['key'].startswith(key):
+                    starts.append(entry_id)
+                else:
+                    contains.append(entry_id)
+                if len(exact) + len(starts) >= MAX_RESULTS:
+                    break
+
+        results = (exact + starts + contains)[:MAX_RESULTS]
+        if len(results) >= MAX_RESULTS or len(key) < 3:
+            return results
+
+        # typo-tolerant fallback: rank the rest by shared trigrams
+        query_grams = trigrams(key)
+        shared = Counter()
+        for gram in query_grams:
+            for entry_id in self.grams.get(gram, ()):
+                shared[entry_id] += 1
+
+        fuzzy = []
+        for entry_id, count in shared.items():
+            if entry_id in matched:
+                continue
+            score = count / max(len(query_grams), self.entries[entry_id]['grams'])
+            if score >= FUZZY_THRESHOLD:
+                fuzzy.append((-score, self.entries[entry_id]['key'], entry_id))
+        fuzzy.sort()
+        results.extend(entry_id for _, _, entry_id in fuzzy[:MAX_RESULTS - len(results)])
+        return results
+
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'prefixes': len(self.prefixes),
+            'trigrams': len(self.grams),
+            'cached_queries': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    global _index
+    catalog = get_catalog()
+    index = _index
+    if index is None or index.catalog is not catalog:
+        with _index_lock:
+            if _index is None or _index.catalog is not catalog:
+                _index = SearchIndex(catalog)
+            index = _index
+    return index
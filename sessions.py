@@ -0,0 +1,175 @@
+import json
+import threading
+import time
+
+from config import SESSION_TTL
+from db import connect
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sessions (
+    chat_id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL,
+    updated INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated);
+'''
+PRUNE_INTERVAL = 3600
+
+
+def encode_session(state):
+    return json.dumps(state, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def decode_session(data):
+    return json.loads(data)
+
+
+class MemoryStore:
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, chat_id):
+        return self._data.get(chat_id)
+
+    def set(self, chat_id, data):
+        with self._lock:
+            self._data[chat_id] = data
+
+    def set_many(self, entries):
+        with self._lock:
+            self._data.update(entries)
+
+    def delete(self, chat_id):
+        with self._lock:
+            self._data.pop(chat_id, None)
+
+    def items(self):
+        return list(self._data.items())
+
+    def prune(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+class SQLiteStore:
+    # sessions untouched for ttl seconds are expired, like keys in the Redis store
+    def __init__(self, name='sessions.db', ttl=SESSION_TTL):
+        self.name = name
+        self.ttl = ttl
+        self.pruned = 0
+        self._conn = None
+        self._lock = threading.Lock()
+        self._pruned_at = 0
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    conn = connect(self.name)
+                    conn.executescript(SCHEMA)
+                    self._conn = conn
+        return self._conn
+
+    def cutoff(self):
+        return int(time.time()) - self.ttl if self.ttl else 0
+
+    def get(self, chat_id):
+        row = self.conn.execute(
+            'SELECT data FROM sessions WHERE chat_id = ? AND updated >= ?', (chat_id, self.cutoff()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, chat_id, data):
+        self.set_many({chat_id: data})
+
+    def set_many(self, entries):
+        now = int(time.time())
+        conn = self.conn
+        with self._lock, conn:
+            conn.executemany(
+                'INSERT INTO sessions (chat_id, data, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT (chat_id) DO UPDATE SET data = excluded.data, updated = excluded.updated',
+                [(chat_id, data, now) for chat_id, data in entries.items()],
+            )
+        if self.ttl and time.monotonic() - self._pruned_at > PRUNE_INTERVAL:
+            self.prune()
+
+    def prune(self):
+        self._pruned_at = time.monotonic()
+        conn = self.conn
+        with self._lock, conn:
+            deleted = conn.execute('DELETE FROM sessions WHERE updated < ?', (self.cutoff(),)).rowcount
+        self.pruned += deleted
+        return deleted
+
+    def delete(self, chat_id):
+        conn = self.conn
+        with self._lock, conn:
+            conn.execute('DELETE FROM sessions WHERE chat_id = ?', (chat_id,))
+
+    def items(self):
+        return self.conn.execute('SELECT chat_id, data FROM sessions WHERE updated >= ?', (self.cutoff(),)).fetchall()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class RedisStore:
+    def __init__(self, url, prefix='etnosfera:session:', ttl=SESSION_TTL):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('redis:// session store requires the redis package (pip install redis)')
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def key(self, chat_id):
+        return f'{self.prefix}{chat_id}'
+
+    def get(self, chat_id):
+        return self.client.get(self.key(chat_id))
+
+    def set(self, chat_id, data):
+        self.client.set(self.key(chat_id), data, ex=self.ttl or None)
+
+    def set_many(self, entries):
+        pipe = self.client.pipeline(transaction=False)
+        for chat_id, data in entries.items():
+            pipe.set(self.key(chat_id), data, ex=self.ttl or None)
+        pipe.execute()
+
+    def delete(self, chat_id):
+        self.client.delete(self.key(chat_id))
+
+    def items(self):
+        items = []
+        for key in self.client.scan_iter(match=f'{self.prefix}*', count=1000):
+            data = self.client.get(key)
+            if data is not None:
+                items.append((int(key.decode()[len(self.prefix):]), data))
+        return items
+
+    def prune(self):
+        # keys expire on their own
+        return 0
+
+    def close(self):
+        self.client.close()
+
+
+def open_store(url):
+    if url.startswith('redis://') or url.startswith('rediss://') or url.startswith('unix://'):
+        return RedisStore(url)
+    if url.startswith('sqlite://'):
+        return SQLiteStore(url[len('sqlite://'):].lstrip('/') or 'sessions.db')
+    if url in ('', 'memory', 'memory://'):
+        return MemoryStore()
+    raise ValueError(f'unknown session store: {url}')
@@ -0,0 +1,308 @@
+import hashlib
+import html
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from assets import category_preview_path, file_digest, item_image_path, national_preview_path, probe
+from catalog import parse_item_file, scan_nationals
+from config import CATEGORY_NAMES, DATA_DIR
+from nationals import get_russian_name
+
+logger = logging.getLogger(__name__)
+
+# bump when the templates change so every page is rendered again
+EXPORT_VERSION = 1
+MANIFEST = 'manifest.json'
+
+STYLE = '''body { font-family: sans-serif; max-width: 860px; margin: 0 auto; padding: 16px; color: #222; }
+a { color: #1565c0; text-decoration: none; }
+nav { margin-bottom: 16px; color: #666; }
+ul.grid { list-style: none; padding: 0; display: grid; grid-template-columns: repeat(auto-fill, minmax(180px, 1fr)); gap: 12px; }
+ul.grid li { border: 1px solid #ddd; border-radius: 8px; padding: 8px; }
+ul.grid img { width: 100%; height: 120px; object-fit: cover; border-radius: 4px; }
+img.photo { max-width: 100%; border-radius: 8px; }
+.date { color: #666; }
+.description { white-space: pre-wrap; line-height: 1.5; }
+'''
+
+
+def page_hash(*parts):
+    sha1 = hashlib.sha1(str(EXPORT_VERSION).encode('utf-8'))
+    for part in parts:
+        sha1.update(b'\0')
+        sha1.update(str(part).encode('utf-8'))
+    return sha1.hexdigest()
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def render_page(title, root, breadcrumbs, body):
+    crumbs = ' › '.join(
+        f'<a href="{root}{href}">{html.escape(label)}</a>' if href is not None else html.escape(label)
+        for label, href in breadcrumbs
+    )
+    return (
+        '<!DOCTYPE html>\n<html lang="ru">\n<head>\n<meta charset="utf-8">\n'
+        '<meta name="viewport" content="width=device-width, initial-scale=1">\n'
+        f'<title>{html.escape(title)} — Этносфера</title>\n'
+        f'<link rel="stylesheet" href="{root}style.css">\n</head>\n<body>\n'
+        f'<nav>{crumbs}</nav>\n<h1>{html.escape(title)}</h1>\n{body}\n</body>\n</html>\n'
+    ).encode('utf-8')
+
+
+def image_tag(root, image, css_class=''):
+    if not image:
+        return ''
+    class_attr = f' class="{css_class}"' if css_class else ''
+    return f'<img src="{root}{image}" alt="" loading="lazy"{class_attr}>'
+
+
+class ImageExporter:
+    def __init__(self, out_dir, sources, max_size, quality):
+        self.out_dir = out_dir
+        self.sources = sources
+        self.max_size = max_size
+        self.quality = quality
+        self.written = 0
+
+        self.used_sources = {}
+        self.used_images = {}
+
+    def digest(self, path):
+        stat = probe(path)
+        if stat is None:
+            return None
+        # rehashing every image on each export would dominate incremental runs
+        cached = self.sources.get(path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            digest = cached[2]
+        else:
+            digest = file_digest(path, stat.st_size, stat.st_mtime_ns)
+        self.used_sources[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def export(self, path):
+        digest = self.digest(path)
+        if digest is None:
+            return None
+        extension = '.jpg' if resize_available() and self.max_size else os.path.splitext(path)[1].lower()
+        # images are named by content, so an existing file is always up to date
+        relpath = f'images/{digest[:2]}/{digest}{extension}'
+        if not os.path.exists(os.path.join(self.out_dir, relpath)):
+            self.write(path, os.path.join(self.out_dir, relpath))
+            self.written += 1
+        self.used_images[relpath] = digest
+        return relpath
+
+    def write(self, source, target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f'{target}.{os.getpid()}.tmp'
+        if resize_available() and self.max_size:
+            from PIL import Image
+
+            with Image.open(source) as image:
+                image.thumbnail((self.max_size, self.max_size))
+                image.convert('RGB').save(tmp_path, 'JPEG', quality=self.quality, optimize=True)
+        else:
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, target)
+
+
+def resize_available():
+    try:
+        import PIL.Image  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_national(task):
+    data_dir, out_dir, national, previous, max_size, quality = task
+    images = ImageExporter(out_dir, previous['sources'], max_size, quality)
+    pages = {}
+    rendered = 0
+    ru_name = get_russian_name(national)
+
+    def emit(relpath, digest, render):
+        nonlocal rendered
+        pages[relpath] = digest
+        if previous['pages'].get(relpath) == digest and os.path.exists(os.path.join(out_dir, relpath)):
+            return
+        write_file(os.path.join(out_dir, relpath), render())
+        rendered += 1
+
+    categories = []
+    for category, cat_name in CATEGORY_NAMES.items():
+        items = parse_item_file(os.path.join(data_dir, national, category, 'list.txt'))
+        if not items:
+            continue
+        preview = images.export(category_preview_path(national, category, data_dir))
+        categories.append((category, cat_name, len(items), preview))
+
+        entries = []
+        for idx, item in enumerate(items):
+            image = images.export(item_image_path(national, category, item['image'], data_dir)) if item['image'] else None
+            entries.append((idx, item['name'], item['date'], image))
+
+            def render_item(item=item, image=image):
+                body = (
+                    f'{image_tag("../../", image, "photo")}\n'
+                    f'<p class="date">📅 {html.escape(item["date"])}</p>\n'
+                    f'<div class="description">{html.escape(item["description"])}</div>'
+                )
+                return render_page(item['name'], '../../', [
+                    ('Этносфера', 'index.html'), (ru_name, f'{national}/index.html'),
+                    (cat_name, f'{national}/{category}/index.html'), (item['name'], None),
+                ], body)
+
+            emit(f'{national}/{category}/{idx}.html',
+                 page_hash(ru_name, cat_name, item['name'], item['date'], item['description'], image),
+                 render_item)
+
+        def render_category(entries=entries, cat_name=cat_name, category=category):
+            cards = '\n'.join(
+                f'<li><a href="{idx}.html">{image_tag("../../", image)}<br>{html.escape(name)}</a>'
+                f'<br><span class="date">{html.escape(date)}</span></li>'
+                for idx, name, date, image in entries
+            )
+            return render_page(cat_name, '../../', [
+                ('Этносфера', 'index.html'), (ru_name, f'{national}/index.html'), (cat_name, None),
+            ], f'<ul class="grid">\n{cards}\n</ul>')
+
+        emit(f'{national}/{category}/index.html', page_hash(ru_name, cat_name, entries), render_category)
+
+    preview = images.export(national_preview_path(national, data_dir))
+
+    def render_national():
+        cards = '\n'.join(
+            f'<li><a href="{category}/index.html">{image_tag("../", image)}<br>{html.escape(cat_name)}</a>'
+            f'<br><span class="date">{count}</span></li>'
+            for category, cat_name, count, image in categories
+        )
+        return render_page(ru_name, '../', [('Этносфера', 'index.html'), (ru_name, None)],
+                           f'{image_tag("../", preview, "photo")}\n<ul class="grid">\n{cards}\n</ul>')
+
+    emit(f'{national}/index.html', page_hash(ru_name, categories, preview), render_national)
+
+    return {
+        'national': national,
+        'name': ru_name,
+        'preview': preview,
+        'items': sum(count for _, _, count, _ in categories),
+        'pages': pages,
+        'sources': images.used_sources,
+        'images': images.used_images,
+        'rendered': rendered,
+        'images_written': images.written,
+    }
+
+
+def load_manifest(out_dir, options):
+    try:
+        with open(os.path.join(out_dir, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != EXPORT_VERSION or manifest.get('options') != options:
+        return None
+    return manifest
+
+
+def previous_for(manifest, national, data_dir):
+    if manifest is None:
+        return {'pages': {}, 'sources': {}}
+    page_prefix = f'{national}/'
+    source_prefix = os.path.join(data_dir, national) + os.sep
+    return {
+        'pages': {path: digest for path, digest in manifest['pages'].items() if path.startswith(page_prefix)},
+        'sources': {path: entry for path, entry in manifest['sources'].items() if path.startswith(source_prefix)},
+    }
+
+
+def export_site(data_dir=DATA_DIR, out_dir='site', processes=None, max_size=800, quality=85, force=False):
+    started = time.perf_counter()
+    if max_size and not resize_available():
+        logger.warning('Pillow is not installed, images are copied at full size (pip install Pillow)')
+    options = {'max_size': max_size if resize_available() else None, 'quality': quality}
+    manifest = None if force else load_manifest(out_dir, options)
+    nationals = scan_nationals(data_dir)
+    tasks = [(data_dir, out_dir, national, previous_for(manifest, national, data_dir), max_size, quality)
+             for national in nationals]
+
+    processes = min(processes or os.cpu_count() or 1, max(len(tasks), 1))
+    if processes <= 1:
+        results = [export_national(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(export_national, tasks, chunksize=max(1, len(tasks) // (processes * 4))))
+
+    pages, sources, images = {}, {}, {}
+    for result in results:
+        pages.update(result['pages'])
+        sources.update(result['sources'])
+        images.update(result['images'])
+    rendered = sum(result['rendered'] for result in results)
+
+    index = [(result['national'], result['name'], result['items'], result['preview'])
+             for result in results if result['items']]
+    index_digest = page_hash(index)
+    pages['index.html'] = index_digest
+    pages['style.css'] = page_hash(STYLE)
+    previous_pages = manifest['pages'] if manifest else {}
+    if previous_pages.get('index.html') != index_digest or not os.path.exists(os.path.join(out_dir, 'index.html')):
+        cards = '\n'.join(
+            f'<li><a href="{national}/index.html">{image_tag("", preview)}<br>{html.escape(name)}</a>'
+            f'<br><span class="date">{count}</span></li>'
+            for national, name, count, preview in index
+        )
+        write_file(os.path.join(out_dir, 'index.html'),
+                   render_page('Культура народов', '', [('Этносфера', None)], f'<ul class="grid">\n{cards}\n</ul>'))
+        rendered += 1
+    if previous_pages.get('style.css') != pages['style.css'] or not os.path.exists(os.path.join(out_dir, 'style.css')):
+        write_file(os.path.join(out_dir, 'style.css'), STYLE.encode('utf-8'))
+        rendered += 1
+
+    # pages and images from removed items, categories or nationals
+    removed = 0
+    if manifest:
+        for relpath in set(manifest['pages']) - set(pages) | set(manifest['images']) - set(images):
+            path = os.path.join(out_dir, relpath)
+            try:
+                os.remove(path)
+                removed += 1
+                os.removedirs(os.path.dirname(path))
+            except OSError:
+                pass
+
+    write_file(os.path.join(out_dir, MANIFEST), json.dumps({
+        'version': EXPORT_VERSION,
+        'options': options,
+        'pages': pages,
+        'sources': sources,
+        'images': images,
+    }, ensure_ascii=False).encode('utf-8'))
+
+    return {
+        'data_dir': data_dir,
+        'out_dir': out_dir,
+        'nationals': len(index),
+        'pages': len(pages),
+        'rendered': rendered,
+        'skipped': len(pages) - rendered,
+        'removed': removed,
+        'images': len(images),
+        'images_written': sum(result['images_written'] for result in results),
+        'resized': options['max_size'] is not None,
+        'incremental': manifest is not None,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
@@ -0,0 +1,145 @@
+import atexit
+import functools
+import logging
+import threading
+import time
+
+from config import SESSION_STORE, SNAPSHOT_INTERVAL
+from sessions import decode_session, encode_session, open_store
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshotter:
+    def __init__(self, states, store_url=SESSION_STORE, interval=SNAPSHOT_INTERVAL):
+        self.states = states
+        self.store_url = store_url
+        self.interval = interval
+        self.store = None
+
+        self.snapshots = 0
+        self.written = 0
+        self.skipped = 0
+        self.errors = 0
+
+        self._dirty = {}
+        self._digests = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def restore(self):
+        if self.store is None:
+            self.store = open_store(self.store_url)
+        started = time.perf_counter()
+        # expired sessions are dropped before anything is loaded
+        pruned = self.store.prune()
+        restored = 0
+        for chat_id, data in self.store.items():
+            try:
+                self.states[chat_id] = decode_session(data)
+            except ValueError:
+                continue
+            self._digests[chat_id] = hash(bytes(data))
+            restored += 1
+        logger.info('Восстановлено сессий: %s за %.0f мс, удалено устаревших: %s',
+                    restored, (time.perf_counter() - started) * 1000, pruned)
+        return restored
+
+    def touch(self, chat_id):
+        if self._thread is not None:
+            with self._lock:
+                self._dirty[chat_id] = time.monotonic()
+
+    def tracked(self, handler):
+        # mark the chat on the way in and again on the way out, so a snapshot taken
+        # while the handler is still running is followed by one with its final state
+        @functools.wraps(handler)
+        def wrapper(update):
+            message = getattr(update, 'message', None) or update
+            chat_id = message.chat.id
+            self.touch(chat_id)
+            try:
+                return handler(update)
+            finally:
+                self.touch(chat_id)
+        return wrapper
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            dirty = self._dirty
+            self._dirty = {}
+
+        changed = {}
+        digests = {}
+        removed = []
+        for chat_id in dirty:
+            state = self.states.get(chat_id)
+            if state is None:
+                if self._digests.pop(chat_id, None) is not None:
+                    removed.append(chat_id)
+                continue
+            try:
+                data = encode_session(state)
+            except (RuntimeError, TypeError, ValueError):
+                # mutated mid-encode or not serializable right now; retry on the next pass
+                with self._lock:
+                    self._dirty.setdefault(chat_id, now)
+                continue
+            digest = hash(data)
+            if self._digests.get(chat_id) == digest:
+                self.skipped += 1
+                continue
+            changed[chat_id] = data
+            digests[chat_id] = digest
+
+        with self._write_lock:
+            if changed:
+                self.store.set_many(changed)
+            for chat_id in removed:
+                self.store.delete(chat_id)
+        self._digests.update(digests)
+        self.snapshots += 1
+        self.written += len(changed)
+        return len(changed)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.snapshot()
+            except Exception as e:
+                self.errors += 1
+                logger.error('Session snapshot error: %s', e)
+
+    def start(self):
+        if self.store is None:
+            self.store = open_store(self.store_url)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='SessionSnapshots', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    def close(self):
+        if self._thread is None or self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(self.interval + 1)
+        try:
+            written = self.snapshot()
+            logger.info('Сессии сохранены: %s', written)
+        except Exception as e:
+            logger.error('Session snapshot error: %s', e)
+        self.store.close()
+
+    def stats(self):
+        return {
+            'dirty': len(self._dirty),
+            'tracked': len(self._digests),
+            'snapshots': self.snapshots,
+            'written': self.written,
+            'skipped': self.skipped,
+            'errors': self.errors,
+        }
@@ -0,0 +1,49 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# config is read at import time, so nothing the tests import may touch the real storage/ or token
+os.environ['BOT_TOKEN'] = '123456:test'
+os.environ['STORAGE_DIR'] = tempfile.mkdtemp(prefix='etnosfera-tests-')
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    import db
+    path = tmp_path / 'storage'
+    path.mkdir()
+    monkeypatch.setattr(db, 'STORAGE_DIR', str(path))
+    return path
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    # a small synthetic regionals/ tree in the working directory, with a fresh catalog
+    import catalog
+    from benchmarks.corpus import generate_corpus
+
+    generate_corpus(str(tmp_path), nationals=3, items_per_category=5, seed=1)
+    monkeypatch.chdir(tmp_path)
+    catalog.reset_catalog()
+    yield tmp_path
+    catalog.reset_catalog()
+
+
+@pytest.fixture
+def telegram(monkeypatch):
+    # bot handlers against a recording fake, rendering inline so every call is done on return
+    import bot
+    from benchmarks.fakebot import FakeBot
+    from dispatch import ChatExecutor, Debouncer
+
+    fake = FakeBot()
+    monkeypatch.setattr(bot, 'bot', fake)
+    monkeypatch.setattr(bot, 'renders', ChatExecutor(0))
+    monkeypatch.setattr(bot, 'debouncer', Debouncer())
+    yield fake
+    bot.user_states.clear()
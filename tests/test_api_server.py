@@ -0,0 +1,98 @@
+import gzip
+import http.client
+import json
+
+import pytest
+
+import catalog
+from api_server import ApiResponses, accepts_gzip, etag_matches, parse_item_id, start_api_server
+
+
+def test_parse_item_id():
+    assert parse_item_id('tatar_bludo_3') == ('tatar', 'bludo', 3)
+    assert parse_item_id('crimean_tatar_bludo_0') == ('crimean_tatar', 'bludo', 0)
+    assert parse_item_id('tatar_bludo_x') is None
+    assert parse_item_id('bludo') is None
+
+
+def test_etag_matches():
+    assert etag_matches('"v1"', '"v1"')
+    assert etag_matches('"v0", W/"v1"', '"v1"')
+    assert etag_matches(' * ', '"v1"')
+    assert not etag_matches('"v1"', '"v1-gz"')
+    assert not etag_matches('', '"v1"')
+    assert not etag_matches(None, '"v1"')
+
+
+def test_accepts_gzip():
+    assert accepts_gzip('gzip')
+    assert accepts_gzip('deflate, GZIP;q=0.5')
+    assert accepts_gzip('br, *')
+    assert not accepts_gzip('gzip;q=0')
+    assert not accepts_gzip('gzip; q=0.0, *')
+    assert not accepts_gzip('br, *;q=0')
+    assert not accepts_gzip('identity')
+    assert not accepts_gzip('')
+    assert not accepts_gzip(None)
+
+
+def test_responses(corpus):
+    responses = ApiResponses(catalog.get_catalog())
+    national = responses.catalog.nationals[0]
+
+    listing = json.loads(responses.get('/nationals', {}).body)
+    assert [entry['key'] for entry in listing['nationals']] == responses.catalog.nationals
+    item = json.loads(responses.get(f'/items/{national}_bludo_0', {}).body)
+    assert item['description'] == responses.catalog.description(national, 'bludo', 0)
+    assert responses.get(f'/items/{national}_bludo_0', {}) is responses.get(f'/items/{national}_bludo_0', {})
+    assert responses.get(f'/items/{national}_bludo_99', {}) is None
+    assert responses.get('/missing', {}) is None
+    found = json.loads(responses.get('/search', {'q': [item['name']], 'limit': ['1']}).body)
+    assert found['items'][0]['id'] == f'{national}_bludo_0'
+
+
+@pytest.fixture
+def api(corpus):
+    server = start_api_server('127.0.0.1', 0)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(server, path, **headers):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+    conn.request('GET', path, headers=headers)
+    response = conn.getresponse()
+    body = response.read()
+    conn.close()
+    return response, body
+
+
+def test_http_etags(api):
+    response, body = fetch(api, '/nationals')
+    etag = response.getheader('ETag')
+    assert response.status == 200 and json.loads(body)['nationals']
+
+    zipped, zipped_body = fetch(api, '/nationals', **{'Accept-Encoding': 'gzip'})
+    gzip_etag = zipped.getheader('ETag')
+    assert zipped.getheader('Content-Encoding') == 'gzip'
+    assert gzip.decompress(zipped_body) == body
+    assert gzip_etag != etag
+
+    assert fetch(api, '/nationals', **{'If-None-Match': etag})[0].status == 304
+    assert fetch(api, '/nationals', **{'If-None-Match': gzip_etag, 'Accept-Encoding': 'gzip'})[0].status == 304
+    # a plain body is not a match for the gzipped one, or the other way round
+    assert fetch(api, '/nationals', **{'If-None-Match': gzip_etag})[0].status == 200
+    assert fetch(api, '/nationals', **{'If-None-Match': etag, 'Accept-Encoding': 'gzip'})[0].status == 200
+
+    refused, refused_body = fetch(api, '/nationals', **{'Accept-Encoding': 'gzip;q=0, identity'})
+    assert refused.getheader('Content-Encoding') is None
+    assert (refused.getheader('ETag'), refused_body) == (etag, body)
+
+
+def test_http_missing_is_never_304(api):
+    response, body = fetch(api, '/items/nope_bludo_0', **{'If-None-Match': '*'})
+
+    assert response.status == 404
+    assert json.loads(body) == {'error': 'not found'}
+    assert response.getheader('ETag') is None
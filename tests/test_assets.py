@@ -0,0 +1,78 @@
+import os
+
+import assets
+import catalog
+
+
+def test_load_asset(tmp_path):
+    path = tmp_path / 'a.png'
+    path.write_bytes(b'png')
+
+    asset = assets.load_asset(str(path))
+
+    assert asset.size == 3 and not asset.fallback
+    assert asset.digest == assets.load_asset(str(path)).digest
+    assert assets.load_asset(str(path), max_bytes=2) is None
+    assert assets.load_asset(str(tmp_path / 'missing.png')) is None
+    assert assets.load_asset(str(tmp_path)) is None
+
+
+def test_digest_follows_content(tmp_path):
+    path = tmp_path / 'a.png'
+    path.write_bytes(b'one')
+    before = assets.load_asset(str(path)).digest
+    path.write_bytes(b'two!')
+
+    assert assets.load_asset(str(path)).digest != before
+
+
+def test_file_ids_are_shared_by_content(tmp_path):
+    (tmp_path / 'a.png').write_bytes(b'same picture')
+    (tmp_path / 'b.png').write_bytes(b'same picture')
+    first = assets.load_asset(str(tmp_path / 'a.png'))
+    second = assets.load_asset(str(tmp_path / 'b.png'))
+
+    assets.remember_file_id(first, 'file-1')
+    assert assets.cached_file_id(second) == 'file-1'
+
+    assets.forget_file_id(second)
+    assert assets.cached_file_id(first) is None
+
+    fallback = assets.Asset('missing.png', True, 0, None)
+    assets.remember_file_id(fallback, 'file-2')
+    assert assets.cached_file_id(fallback) is None
+
+
+def test_manifest_resolves_missing_images_to_fallback(corpus):
+    current = catalog.get_catalog()
+    manifest = current.assets
+    national = current.nationals[0]
+    items = current.category_items(national, 'bludo')
+    with_image = [item for item in items if item['image'] and
+                  os.path.exists(assets.item_image_path(national, 'bludo', item['image'], 'regionals'))]
+
+    asset = manifest.item(national, 'bludo', with_image[0]['image'])
+    assert not asset.fallback and asset.digest
+
+    missing = manifest.item(national, 'bludo', 'nope.png')
+    assert missing.fallback and missing.path == manifest.fallback.path
+    assert manifest.resolve(manifest.fallback.path).fallback
+
+    stats = manifest.stats()
+    assert stats['assets'] == len(manifest.assets)
+    assert stats['missing'] == len(manifest.missing)
+    assert all(manifest.resolve(path).fallback for path in manifest.missing)
+
+
+def test_oversized_image_uses_fallback(tmp_path, monkeypatch):
+    monkeypatch.setattr(assets, 'MAIN_PHOTO', str(tmp_path / 'example.png'))
+    (tmp_path / 'example.png').write_bytes(b'fallback')
+    image_dir = tmp_path / 'tatar' / 'bludo'
+    image_dir.mkdir(parents=True)
+    with open(image_dir / 'big.png', 'wb') as f:
+        f.truncate(assets.PHOTO_MAX_BYTES + 1)
+
+    manifest = assets.AssetManifest(str(tmp_path), ['tatar'], {('tatar', 'bludo'): [{'image': 'big.png'}]})
+
+    assert manifest.item('tatar', 'bludo', 'big.png').path == str(tmp_path / 'example.png')
+    assert str(image_dir / 'big.png') in manifest.missing
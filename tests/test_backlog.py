@@ -0,0 +1,140 @@
+import json
+import time
+
+import backlog
+
+NOW = 1_000_000
+
+
+def message(update_id, chat_id, date, text='привет'):
+    return {'update_id': update_id, 'message': {'message_id': update_id, 'date': date, 'text': text,
+                                                'chat': {'id': chat_id, 'type': 'private'}}}
+
+
+def press(update_id, chat_id, data, date=NOW - 10_000):
+    # the pressed message's date is when the bot last sent or edited it, long before the tap
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'data': data, 'from': {'id': chat_id},
+        'message': {'message_id': 1, 'date': date, 'chat': {'id': chat_id, 'type': 'private'}},
+    }}
+
+
+def ids(updates):
+    return [update['update_id'] for update in updates]
+
+
+def test_only_the_last_press_per_chat_is_kept():
+    updates = [press(1, 7, 'nat_0'), message(2, 7, NOW - 5), press(3, 7, 'nat_1'), press(4, 8, 'nat_0'),
+               press(5, 7, 'item_2')]
+
+    kept, report = backlog.collapse(updates, max_age=300, now=NOW)
+
+    assert ids(kept) == [2, 4, 5]
+    assert report == {'fetched': 5, 'kept': 3, 'superseded': 2, 'stale': 0}
+
+
+def test_press_is_judged_old_by_the_next_message():
+    updates = [press(1, 7, 'nat_0'), message(2, 8, NOW - 1000), press(3, 9, 'nat_0'), message(4, 8, NOW - 10)]
+
+    kept, report = backlog.collapse(updates, max_age=300, now=NOW)
+
+    assert ids(kept) == [2, 3, 4]
+    assert report['stale'] == 1
+
+
+def test_press_without_a_later_message_is_kept():
+    # its own message date is ignored, however old
+    kept, report = backlog.collapse([press(1, 7, 'nat_0', date=0)], max_age=300, now=NOW)
+
+    assert ids(kept) == [1]
+    assert report['stale'] == 0
+
+
+def test_inline_queries_are_dropped():
+    updates = [{'update_id': 1, 'inline_query': {'id': 'q', 'from': {'id': 7}, 'query': 'чак'}}, message(2, 7, NOW)]
+
+    kept, report = backlog.collapse(updates, now=NOW)
+
+    assert ids(kept) == [2]
+    assert report['stale'] == 1
+
+
+def test_offset_round_trip(tmp_path):
+    path = str(tmp_path / 'offset.json')
+
+    assert backlog.load_offset('123:a', path) is None
+    backlog.save_offset(42, '123:a', path)
+
+    assert backlog.load_offset('123:b', path) == 42
+    assert backlog.load_offset('456:a', path) is None
+
+
+def test_old_offset_is_ignored(tmp_path):
+    path = tmp_path / 'offset.json'
+    path.write_text(json.dumps({'bot': '123', 'offset': 42, 'saved': 0}))
+
+    assert backlog.load_offset('123:a', str(path)) is None
+    path.write_text('{broken')
+    assert backlog.load_offset('123:a', str(path)) is None
+
+
+def test_keeper_writes_only_when_moved(tmp_path, monkeypatch):
+    path = str(tmp_path / 'offset.json')
+    current = [None]
+    writes = []
+    save = backlog.save_offset
+    monkeypatch.setattr(backlog, 'save_offset', lambda *args: (writes.append(args[0]), save(*args)))
+    keeper = backlog.OffsetKeeper('123:a', path, interval=60)
+    keeper.current = lambda: current[0]
+
+    keeper.flush()
+    current[0] = 10
+    keeper.flush()
+    keeper.flush()
+    current[0] = 11
+    keeper.flush()
+
+    assert writes == [10, 11]
+    assert backlog.load_offset('123:a', path) == 11
+
+
+def fake_updates(monkeypatch, updates):
+    requested = []
+
+    def get_updates(token, offset=None, limit=None, timeout=None):
+        requested.append(offset)
+        start = 0 if offset is None else next((idx for idx, update in enumerate(updates)
+                                               if update['update_id'] >= offset), len(updates))
+        return updates[start:start + limit]
+
+    monkeypatch.setattr(backlog.apihelper, 'get_updates', get_updates)
+    return requested
+
+
+def test_drain_pages_and_skips_processed(monkeypatch):
+    monkeypatch.setattr(backlog, 'BATCH_SIZE', 2)
+    requested = fake_updates(monkeypatch, [message(idx, 7, NOW) for idx in range(10, 15)])
+
+    updates, offset, skipped = backlog.drain('123:a', processed=12)
+
+    assert ids(updates) == [12, 13, 14]
+    assert (offset, skipped) == (15, 2)
+    assert requested == [None, 12, 14]
+
+
+def test_recover_keeps_offset_on_error(monkeypatch):
+    def get_updates(*args, **kwargs):
+        raise ConnectionError('down')
+
+    monkeypatch.setattr(backlog.apihelper, 'get_updates', get_updates)
+
+    assert backlog.recover('123:a', processed=42) == ([], 42)
+
+
+def test_recover_collapses(monkeypatch):
+    fake_updates(monkeypatch, [press(1, 7, 'nat_0'), press(2, 7, 'nat_1'), message(3, 8, int(time.time()))])
+
+    kept, offset = backlog.recover('123:a')
+
+    assert ids(kept) == [2, 3]
+    assert offset == 4
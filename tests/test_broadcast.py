@@ -0,0 +1,160 @@
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+from telebot.apihelper import ApiTelegramException
+
+import broadcast
+from broadcast import Broadcasts, TokenBucket
+from transport import CircuitOpenError
+
+
+def api_error(code, description, **parameters):
+    result_json = {'ok': False, 'error_code': code, 'description': description}
+    if parameters:
+        result_json['parameters'] = parameters
+    return ApiTelegramException('sendMessage', None, result_json)
+
+
+class Recipients:
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = []
+        self.uploads = []
+        self._lock = threading.Lock()
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.raise_error(chat_id)
+        with self._lock:
+            self.sent.append((chat_id, text))
+        return types.SimpleNamespace(message_id=len(self.sent))
+
+    def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        self.raise_error(chat_id)
+        with self._lock:
+            if not isinstance(photo, str):
+                self.uploads.append(chat_id)
+            self.sent.append((chat_id, caption))
+        return types.SimpleNamespace(message_id=len(self.sent), photo=[types.SimpleNamespace(file_id='photo-1')])
+
+    def raise_error(self, chat_id):
+        error = self.errors.get(chat_id)
+        if isinstance(error, list):
+            if error:
+                raise error.pop(0)
+        elif error is not None:
+            raise error
+
+
+def test_bucket_limits_rate():
+    bucket = TokenBucket(50, capacity=5)
+    started = time.monotonic()
+    for _ in range(15):
+        bucket.acquire()
+
+    # the first five come from the full bucket, the other ten at 50 per second
+    assert time.monotonic() - started >= 0.18
+
+
+def test_bucket_pause():
+    bucket = TokenBucket(1000)
+    bucket.pause(0.1)
+    bucket.pause(0.01)
+    started = time.monotonic()
+    bucket.acquire()
+
+    assert time.monotonic() - started >= 0.09
+
+
+@pytest.fixture
+def broadcasts(storage):
+    broadcasts = Broadcasts('broadcasts.db', rate=3, threads=2)
+    for chat_id in range(1, 9):
+        broadcasts.remember_chat(chat_id)
+    broadcasts.remember_chat(1)
+    broadcasts.writer.close()
+    yield broadcasts
+    broadcasts.stop()
+
+
+def run(broadcasts, bot):
+    broadcasts.bot = bot
+    job = broadcasts._next_job()
+    with ThreadPoolExecutor(broadcasts.threads) as pool:
+        broadcasts._run_job(pool, TokenBucket(1000), job)
+    return broadcasts.job(job['id'])
+
+
+def test_job_counts_results(broadcasts):
+    assert broadcasts.active_chats() == 8
+    job_id = broadcasts.enqueue(100, 'Новость')
+    bot = Recipients({
+        3: api_error(403, 'Forbidden: bot was blocked by the user'),
+        5: api_error(400, 'Bad Request: chat not found'),
+        6: api_error(400, 'Bad Request: message is too long'),
+        7: [api_error(429, 'Too Many Requests', retry_after=0.01)],
+    })
+
+    job = run(broadcasts, bot)
+
+    assert job['id'] == job_id
+    assert (job['status'], job['total'], job['sent'], job['blocked'], job['failed']) == ('done', 8, 5, 2, 1)
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [1, 2, 4, 7, 8, 100]
+    assert bot.sent[-1][0] == 100 and '#1' in bot.sent[-1][1]
+    assert broadcasts.active_chats() == 6
+    assert broadcasts._next_job() is None
+
+
+def test_cancelled_job_is_not_sent(broadcasts):
+    job_id = broadcasts.enqueue(None, 'Новость')
+
+    assert broadcasts.cancel(job_id)
+    assert not broadcasts.cancel(job_id)
+    assert broadcasts._next_job() is None
+    assert broadcasts.recent()[0]['status'] == 'cancelled'
+
+
+def test_outage_is_waited_out(broadcasts, monkeypatch):
+    monkeypatch.setattr(broadcast, 'UNAVAILABLE_PAUSE', 0.01)
+    monkeypatch.setattr(broadcast, 'BREAKER_RESET', 0.01)
+    outage = [CircuitOpenError('Telegram API unavailable'), api_error(502, 'Bad Gateway')]
+    bot = Recipients({chat_id: list(outage) for chat_id in range(2, 9)})
+    bot.errors[1] = requests.exceptions.ReadTimeout()
+    broadcasts.enqueue(None, 'Новость')
+
+    job = run(broadcasts, bot)
+
+    # every chat gets the message once; only the timed out one may or may not have it
+    assert (job['sent'], job['failed'], job['blocked']) == (7, 1, 0)
+    assert sorted(chat_id for chat_id, _ in bot.sent) == list(range(2, 9))
+
+
+def make_photo(tmp_path):
+    path = tmp_path / 'photo.png'
+    # uploaded file_ids are remembered by content, so each test uploads a picture of its own
+    path.write_bytes(str(tmp_path).encode())
+    return str(path)
+
+
+def test_photo_is_uploaded_once_after_throttled_first_send(broadcasts, tmp_path):
+    broadcasts.enqueue(None, 'Новость', photo=make_photo(tmp_path))
+    bot = Recipients({1: [api_error(429, 'Too Many Requests', retry_after=0.01)]})
+
+    job = run(broadcasts, bot)
+
+    assert (job['status'], job['sent'], job['failed'], job['blocked']) == ('done', 8, 0, 0)
+    assert sorted(chat_id for chat_id, _ in bot.sent) == list(range(1, 9))
+    assert bot.uploads == [1]
+
+
+def test_photo_upload_moves_on_from_a_blocked_chat(broadcasts, tmp_path):
+    broadcasts.enqueue(None, 'Новость', photo=make_photo(tmp_path))
+    bot = Recipients({1: api_error(403, 'Forbidden: bot was blocked by the user')})
+
+    job = run(broadcasts, bot)
+
+    assert (job['status'], job['sent'], job['blocked']) == ('done', 7, 1)
+    assert bot.uploads == [2]
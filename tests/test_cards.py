@@ -0,0 +1,111 @@
+import html
+import os
+import re
+
+import pytest
+
+import bot
+import catalog
+from benchmarks.fakebot import make_callback
+from cards import CAPTION_LIMIT, render_pages, split_text, text_length
+
+ITEM = {'name': 'Чак-чак <мёд>', 'date': '1990 год'}
+
+
+def visible(page):
+    # what Telegram counts: the text after HTML entities are parsed
+    return html.unescape(re.sub(r'</?b>', '', page))
+
+
+def test_short_description_is_one_page():
+    pages = render_pages('item', 'tatar', 'bludo', ITEM, 'Сладость & угощение')
+
+    assert pages == ['📌 <b>Чак-чак &lt;мёд&gt;</b>\n📅 1990 год\n\nСладость &amp; угощение']
+    assert render_pages('item', 'tatar', 'bludo', ITEM, '') == ['📌 <b>Чак-чак &lt;мёд&gt;</b>\n📅 1990 год']
+
+
+def test_search_card_names_national_and_category():
+    page, = render_pages('search', 'tatar', 'bludo', ITEM, 'Текст')
+
+    assert page.count('\n') == 5
+    assert '🌍 ' in page and '📂 ' in page
+
+
+def test_long_description_is_split_within_limit():
+    sentence = 'Праздничное блюдо <из> теста & мёда подаётся к чаю. '
+    description = '\n\n'.join(sentence * 6 for _ in range(12))
+
+    pages = render_pages('item', 'tatar', 'bludo', ITEM, description)
+
+    assert len(pages) > 2
+    assert all(text_length(visible(page)) <= CAPTION_LIMIT for page in pages)
+    assert pages[1].startswith(f'📌 <b>Чак-чак &lt;мёд&gt;</b> · 2/{len(pages)}\n\n')
+    assert all(page.endswith('…') for page in pages[:-1])
+    # nothing is lost between pages apart from the whitespace at the cuts
+    body = ' '.join(visible(page).split('\n\n', 1)[1].rstrip('…') for page in pages)
+    assert body.split() == description.split()
+
+
+def test_split_counts_utf16_units():
+    text = '😀' * 600
+
+    chunks = split_text(text, 500, 500)
+
+    assert all(text_length(chunk) <= 500 for chunk in chunks)
+    assert ''.join(chunk.rstrip('…') for chunk in chunks) == text
+
+
+@pytest.fixture
+def crimean_corpus(tmp_path, monkeypatch):
+    directory = tmp_path / 'regionals' / 'crimean_tatar' / 'bludo'
+    directory.mkdir(parents=True)
+    header = 'bludo: Чебурек / cheburek.png / 1990g'
+    description = 'Жареный пирожок с мясом. ' * 150
+    (directory / 'list.txt').write_text(f'=START= {{{header}}} ===\n{description}\n=END= {{{header}}} ===\n',
+                                        encoding='utf-8')
+    monkeypatch.chdir(tmp_path)
+    catalog.reset_catalog()
+    yield tmp_path
+    catalog.reset_catalog()
+
+
+def test_cardpage_with_underscored_national(crimean_corpus, telegram):
+    assert os.path.isdir('regionals/crimean_tatar')
+
+    bot.callback_handler(make_callback(7, 'cardpage_item_crimean_tatar_bludo_0_1'))
+
+    edits = [kwargs for name, args, kwargs in telegram.calls if name == 'edit_message_text']
+    assert len(edits) == 1
+    buttons = [button.callback_data for row in edits[0]['reply_markup'].keyboard for button in row]
+    assert 'cardpage_item_crimean_tatar_bludo_0_0' in buttons
+
+
+def test_cardpage_past_the_end(crimean_corpus, telegram):
+    bot.callback_handler(make_callback(7, 'cardpage_item_crimean_tatar_bludo_0_99'))
+
+    # the press was acknowledged before rendering, so the error goes to the chat
+    assert telegram.calls[-1] == ('send_message', (7, '❌ Элемент не найден'), {})
+
+
+def test_route_args_keep_underscored_nationals():
+    assert bot.route_args('item_crimean_tatar_bludo_3', 3) == ['crimean_tatar', 'bludo', '3']
+    assert bot.route_args('natcat_central_asian_jew_kostyum', 2) == ['central_asian_jew', 'kostyum']
+    assert bot.route_args('items_tatar_bludo', 2) == ['tatar', 'bludo']
+
+
+def test_list_and_item_routes_with_underscored_national(crimean_corpus, telegram):
+    expected = {
+        'natcat_crimean_tatar_bludo': 'Выберите элемент',
+        'itempage_crimean_tatar_bludo_0': 'item_crimean_tatar_bludo_0',
+        'item_crimean_tatar_bludo_0': 'Чебурек',
+        'searchitem_crimean_tatar_bludo_0': 'Чебурек',
+    }
+    for data, text in expected.items():
+        telegram.reset()
+        bot.callback_handler(make_callback(7, data))
+
+        sent = ' '.join(
+            value.to_json() if hasattr(value, 'to_json') else str(value)
+            for name, args, kwargs in telegram.calls for value in (*args, *kwargs.values())
+        )
+        assert text in sent, data
@@ -0,0 +1,65 @@
+import os
+
+import catalog
+
+
+def write_items(path, *headers):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for header in headers:
+            f.write(f'=START= {{{header}}} ===\nОписание {header}\n=END= {{{header}}} ===\n\n')
+
+
+def test_parse_item_file(tmp_path):
+    path = str(tmp_path / 'list.txt')
+    write_items(path, 'bludo: Чак-чак / chak.png / 1990g', 'Эчпочмак / ech.png / 01.02.2003', 'broken / header')
+
+    items = catalog.parse_item_file(path)
+
+    assert [item['name'] for item in items] == ['Чак-чак', 'Эчпочмак']
+    assert items[0]['image'] == 'chak.png'
+    assert items[0]['date'] == '1990 год'
+    assert items[1]['date'] == '01.02.2003'
+    assert items[0]['description'] == 'Описание bludo: Чак-чак / chak.png / 1990g'
+
+
+def test_parse_missing_file(tmp_path):
+    assert catalog.parse_item_file(str(tmp_path / 'missing.txt')) == []
+
+
+def test_catalog_is_built_once(corpus):
+    first = catalog.get_catalog()
+
+    assert catalog.get_catalog() is first
+    assert catalog.peek_catalog() is first
+    assert len(first.nationals) == 3
+    national = first.nationals[0]
+    assert len(first.category_items(national, 'bludo')) == 5
+    assert first.category_items('missing', 'bludo') == []
+
+
+def test_refresh_picks_up_edits(corpus):
+    current = catalog.get_catalog()
+    assert catalog.refresh_catalog() is None
+
+    national = current.nationals[0]
+    path = os.path.join('regionals', national, 'bludo', 'list.txt')
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('\n=START= {bludo: Новое / new.png / 2020g} ===\nТекст\n=END= {bludo: Новое} ===\n')
+
+    reloaded = catalog.refresh_catalog()
+
+    assert reloaded is not None and reloaded is not current
+    assert catalog.get_catalog() is reloaded
+    assert len(reloaded.category_items(national, 'bludo')) == 6
+    assert reloaded.version != current.version
+    assert catalog.refresh_catalog() is None
+
+
+def test_source_signature_follows_images(corpus):
+    before = catalog.source_signature('regionals')
+    national = sorted(os.listdir('regionals'))[0]
+    with open(os.path.join('regionals', national, 'bludo', 'extra.png'), 'wb') as f:
+        f.write(b'png')
+
+    assert catalog.source_signature('regionals') != before
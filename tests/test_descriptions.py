@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+from catalog import Catalog
+from descriptions import EXCERPT_LENGTH, CompressedDescriptions, ZlibCodec, ZstdCodec, text_bytes
+
+
+def all_descriptions(catalog):
+    return {
+        (national, category, idx): catalog.description(national, category, idx)
+        for (national, category), items in catalog.items.items()
+        for idx in range(len(items))
+    }
+
+
+def test_lazy_matches_eager(corpus):
+    eager = Catalog('regionals', mode='eager')
+    lazy = Catalog('regionals', mode='lazy')
+
+    assert all_descriptions(lazy) == all_descriptions(eager)
+    key = next(iter(eager.items))
+    assert lazy.excerpt(*key, 0) == eager.description(*key, 0)[:EXCERPT_LENGTH]
+    assert 'description' not in lazy.category_items(*key)[0]
+    assert lazy.description(*key, 99) == ''
+
+
+def test_lazy_budget_evicts_oldest_category(corpus):
+    lazy = Catalog('regionals', mode='lazy', budget=1)
+    first, second = list(lazy.items)[:2]
+
+    lazy.description(*first, 0)
+    lazy.description(*first, 1)
+    lazy.description(*second, 0)
+    stats = lazy.description_stats()
+
+    # one category always stays resident, however small the budget
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['categories']) == (1, 2, 1, 1)
+    assert stats['resident_bytes'] == text_bytes(lazy.descriptions.category(*second))
+
+
+def test_lazy_follows_items_by_name_after_edit(corpus):
+    lazy = Catalog('regionals', mode='lazy')
+    national, category = next(iter(lazy.items))
+    names = [item['name'] for item in lazy.category_items(national, category)]
+    path = os.path.join('regionals', national, category, 'list.txt')
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    # the first block moves to the end of the file
+    blocks = text.split('=START=')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('=START='.join([blocks[0]] + blocks[2:] + [blocks[1]]))
+
+    eager = Catalog('regionals', mode='eager')
+    by_name = {item['name']: item['description'] for item in eager.category_items(national, category)}
+    assert [lazy.description(national, category, idx) for idx in range(len(names))] == [by_name[name] for name in names]
+
+
+def test_compressed_matches_eager(corpus):
+    eager = Catalog('regionals', mode='eager')
+    compressed = Catalog('regionals', mode='compressed')
+
+    assert all_descriptions(compressed) == all_descriptions(eager)
+    assert 'description' not in next(iter(compressed.items.values()))[0]
+    stats = compressed.description_stats()
+    assert stats['codec'] == 'zlib'
+    assert stats['resident_bytes'] < stats['raw_bytes']
+
+
+def test_hot_cache(corpus):
+    compressed = Catalog('regionals', mode='compressed').descriptions
+    compressed.hot_size = 1
+    key = next(iter(compressed._blobs))
+
+    first = compressed.get(*key, 0)
+    assert compressed.get(*key, 0) is first
+    compressed.get(*key, 1)
+    assert compressed.get(*key, 0) is not first
+    assert (compressed.hits, compressed.misses) == (1, 3)
+    assert compressed.get(*key, 99) == ''
+
+
+def test_zlib_without_texts():
+    codec = ZlibCodec([])
+
+    assert codec.zdict == b''
+    assert codec.decompress(codec.compress('Чак-чак')) == 'Чак-чак'
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        CompressedDescriptions({}, codec='lzma')
+
+
+def test_zstd_codec():
+    pytest.importorskip('zstandard')
+    texts = [f'Праздничное блюдо номер {idx} подаётся к чаю.' for idx in range(200)]
+    codec = ZstdCodec(texts)
+
+    assert [codec.decompress(codec.compress(text)) for text in texts[:5]] == texts[:5]
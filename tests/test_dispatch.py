@@ -0,0 +1,128 @@
+import threading
+import time
+import types
+
+import bot
+import dispatch
+from benchmarks.fakebot import make_callback
+from dispatch import ChatExecutor, Debouncer
+
+
+def test_one_chat_renders_in_order_and_skips_stale_navigation():
+    executor = ChatExecutor(4)
+    gate = threading.Event()
+    finished = threading.Event()
+    rendered = []
+    done = []
+
+    executor.submit(1, gate.wait)
+    for idx in range(5):
+        executor.submit(1, rendered.append, idx, droppable=idx < 4, done=lambda idx=idx: done.append(idx))
+    executor.submit(1, finished.set)
+    gate.set()
+    assert finished.wait(5)
+
+    # the queued screens the user already moved past are skipped, the rest run in press order
+    assert rendered == [4]
+    assert sorted(done) == [0, 1, 2, 3, 4]
+    assert executor.stats()['dropped'] == 4
+
+
+def test_chats_render_in_parallel():
+    executor = ChatExecutor(2)
+    first_started = threading.Event()
+    second_done = threading.Event()
+
+    executor.submit(1, lambda: (first_started.set(), second_done.wait(5)))
+    assert first_started.wait(5)
+    executor.submit(2, second_done.set)
+
+    assert second_done.wait(5)
+
+
+def test_failing_render_still_calls_done():
+    executor = ChatExecutor(0)
+    done = []
+
+    executor.submit(1, lambda: 1 / 0, done=lambda: done.append(True))
+
+    assert done == [True]
+    assert executor.stats()['errors'] == 1
+
+
+def test_toast_after_early_answer_goes_to_chat(telegram):
+    call = types.SimpleNamespace(id='5', message=types.SimpleNamespace(chat=types.SimpleNamespace(id=7)))
+
+    bot.answer_callback(call)
+    bot.answer_callback(call, '❌ Ошибка')
+    bot.answer_callback(call)
+
+    assert telegram.calls == [
+        ('answer_callback_query', ('5', None), {}),
+        ('send_message', (7, '❌ Ошибка'), {}),
+    ]
+
+
+def test_press_is_answered_before_render(corpus, telegram):
+    bot.callback_handler(make_callback(7, 'select_category'))
+
+    names = telegram.call_names()
+    assert names[0] == 'answer_callback_query'
+    assert len(names) > 1 and 'answer_callback_query' not in names[1:]
+
+
+def test_repeat_before_render_is_a_duplicate():
+    debouncer = Debouncer(window=10)
+    key = debouncer.press(1, 'item_0', 5, received_at=100.0)
+
+    assert key is not None
+    assert debouncer.press(1, 'item_0', 5, received_at=100.2) is None
+    # another button, message or chat is a press of its own
+    assert debouncer.press(1, 'item_1', 5, received_at=100.2) is not None
+    assert debouncer.press(1, 'item_0', 6, received_at=100.2) is not None
+    assert debouncer.press(2, 'item_0', 5, received_at=100.2) is not None
+    assert debouncer.stats()['dropped'] == 1
+
+
+def test_repeat_after_render_is_a_new_press(monkeypatch):
+    debouncer = Debouncer(window=10)
+    key = debouncer.press(1, 'match_select_0', 5, 'screen', received_at=100.0)
+    monkeypatch.setattr(dispatch.time, 'time', lambda: 100.5)
+    debouncer.release(key)
+
+    # sent while the first one was rendering, so the user never saw its result
+    assert debouncer.press(1, 'match_select_0', 5, 'screen', received_at=100.4) is None
+    # the same button on the same unchanged screen, pressed again after it was shown
+    assert debouncer.press(1, 'match_select_0', 5, 'screen', received_at=100.6) is not None
+
+
+def test_stuck_render_holds_the_button_for_the_window():
+    debouncer = Debouncer(window=10)
+    debouncer.press(1, 'item_0', 5, received_at=100.0)
+
+    assert debouncer.press(1, 'item_0', 5, received_at=109.0) is None
+    assert debouncer.press(1, 'item_0', 5, received_at=111.0) is not None
+    assert debouncer.stats()['tracked'] == 1
+
+
+def test_no_window_disables_debouncing():
+    debouncer = Debouncer(window=0)
+
+    assert debouncer.press(1, 'item_0', 5) == debouncer.press(1, 'item_0', 5)
+
+
+def test_double_tap_reaches_the_handler_once(corpus, telegram):
+    first = make_callback(7, 'select_category')
+    first.received_at = time.time()
+    bot.callback_handler(first)
+    rendered = telegram.call_names()[1:]
+
+    # the second tap arrived while the first was being rendered
+    second = make_callback(7, 'select_category', query_id='2')
+    second.received_at = first.received_at
+    telegram.reset()
+    bot.callback_handler(second)
+
+    assert rendered
+    assert telegram.calls == [('answer_callback_query', ('2', None), {})]
+    assert bot.debouncer.stats()['dropped'] == 1
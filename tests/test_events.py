@@ -0,0 +1,67 @@
+import json
+
+import analytics
+import events
+from journal import JournalWriter
+
+
+def test_chat_hash_is_stable_and_short():
+    assert events.chat_hash(42) == events.chat_hash('42')
+    assert events.chat_hash(42) != events.chat_hash(43)
+    assert len(events.chat_hash(42)) == 12
+
+
+def test_encode_event_hides_chat_id():
+    line = events.encode_event((1700000000.12345, 'view', 42, {'n': 'tatar', 'c': 'bludo', 'i': 'Чак-чак'}))
+    record = json.loads(line)
+
+    assert record == {'t': 1700000000.123, 'e': 'view', 'u': events.chat_hash(42),
+                      'n': 'tatar', 'c': 'bludo', 'i': 'Чак-чак'}
+    assert b'42' not in line.replace(record['u'].encode(), b'')
+
+
+def write_events(path, records):
+    writer = JournalWriter(path, flush_interval=0.01, encode=events.encode_event)
+    for record in records:
+        writer.submit(record)
+    writer.close()
+
+
+def test_events_report(tmp_path):
+    write_events(str(tmp_path / 'events.jsonl'), [
+        (1.0, 'view', 1, {'n': 'tatar', 'c': 'bludo', 'i': 'Чак-чак'}),
+        (2.0, 'view', 2, {'n': 'tatar', 'c': 'bludo', 'i': 'Чак-чак'}),
+        (3.0, 'view', 2, {'n': 'tatar', 'c': 'bludo', 'i': 'Эчпочмак'}),
+        (4.0, 'search', 1, {'q': 'Плов', 'h': 0}),
+        (5.0, 'search', 1, {'q': 'плов ', 'h': 0}),
+        (6.0, 'search', 1, {'q': 'чак', 'h': 2}),
+        (7.0, 'answer', 1, {'n': 'tatar', 'c': 'bludo', 'i': 'Чак-чак', 'ok': True}),
+        (8.0, 'answer', 2, {'n': 'tatar', 'c': 'bludo', 'i': 'Чак-чак', 'ok': False}),
+    ])
+    with open(tmp_path / 'events.jsonl.1', 'w', encoding='utf-8') as f:
+        f.write('not json\n{"e": "view", "n": "tatar", "c": "bludo", "i": "Эчпочмак"}\n')
+
+    report = analytics.events_report([str(tmp_path)], processes=1)
+
+    assert report['files'] == 2
+    assert report['events'] == 9
+    assert report['bad_lines'] == 1
+    assert report['top_viewed']['tatar'] == [
+        {'category': 'bludo', 'item': 'Чак-чак', 'views': 2},
+        {'category': 'bludo', 'item': 'Эчпочмак', 'views': 2},
+    ]
+    assert report['search']['total'] == 3
+    assert report['search']['zero_results'] == 2
+    assert report['search']['top_zero_queries'] == [{'query': 'плов', 'count': 2}]
+    assert report['quiz_accuracy'] == [{'national': 'tatar', 'category': 'bludo', 'item': 'Чак-чак',
+                                        'answers': 2, 'correct': 1, 'accuracy': 0.5}]
+
+
+def test_parallel_report_matches_serial(tmp_path):
+    for idx in range(3):
+        write_events(str(tmp_path / f'events.jsonl.{idx}'),
+                     [(float(n), 'view', n, {'n': 'tatar', 'c': 'bludo', 'i': f'item{n % 4}'}) for n in range(50)])
+
+    serial = analytics.events_report([str(tmp_path)], processes=1)
+
+    assert analytics.events_report([str(tmp_path)], processes=2) == serial
@@ -0,0 +1,62 @@
+import random
+import time
+
+import catalog
+from image_quiz import OPTIONS, ImageQuiz
+
+
+def wait_prefetched(quiz, count):
+    deadline = time.monotonic() + 5
+    while quiz.prefetched < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert quiz.prefetched == count
+
+
+def test_only_items_with_pictures_are_asked(corpus):
+    current = catalog.get_catalog()
+    quiz = ImageQuiz(current)
+
+    for category, pool in quiz.pools.items():
+        for national, idx in pool:
+            item = current.category_items(national, category)[idx]
+            assert item['image']
+            assert not current.assets.item(national, category, item['image']).fallback
+    assert quiz.available('bludo')
+    assert not quiz.available('missing')
+    assert quiz.generate('missing') is None
+
+
+def test_question_options(corpus):
+    random.seed(3)
+    quiz = ImageQuiz(catalog.get_catalog())
+
+    for _ in range(20):
+        question = quiz.generate('bludo')
+        assert question['correct_answer'] in question['options']
+        assert len(question['options']) == len(set(question['options'])) == OPTIONS
+        assert not quiz.asset(question).fallback
+
+
+def test_prefetched_question_is_used_once(corpus):
+    quiz = ImageQuiz(catalog.get_catalog())
+    warmed = []
+
+    quiz.prefetch(7, 'bludo', warmed.append)
+    wait_prefetched(quiz, 1)
+    question = quiz.next(7, 'bludo')
+
+    assert warmed == [quiz.asset(question)]
+    assert (quiz.hits, quiz.misses) == (1, 0)
+    assert quiz.next(7, 'bludo') is not None
+    assert quiz.misses == 1
+
+
+def test_prefetch_for_another_category_is_discarded(corpus):
+    quiz = ImageQuiz(catalog.get_catalog())
+
+    quiz.prefetch(7, 'kostyum', lambda asset: 1 / 0)
+    wait_prefetched(quiz, 1)
+
+    assert quiz.next(7, 'bludo')['category'] == 'bludo'
+    assert (quiz.hits, quiz.misses) == (0, 1)
+    assert quiz.stats()['waiting'] == 0
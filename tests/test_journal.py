@@ -0,0 +1,100 @@
+import json
+import types
+
+import pytest
+
+import feedback
+from journal import BatchWorker, JournalWriter, journal_files, read_lines_reverse, read_records_reverse
+
+
+def test_writer_appends_json_lines(tmp_path):
+    path = str(tmp_path / 'log.jsonl')
+    writer = JournalWriter(path, flush_interval=0.01)
+    for idx in range(3):
+        assert writer.submit({'n': idx, 'text': 'привет'})
+    writer.close()
+
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == [{'n': idx, 'text': 'привет'} for idx in range(3)]
+    assert writer.stats()['written'] == 3
+
+
+def test_writer_rotates_and_reads_newest_first(tmp_path):
+    path = str(tmp_path / 'log.jsonl')
+    writer = JournalWriter(path, max_bytes=200, backup_count=2, batch_size=1, flush_interval=0.01)
+    for idx in range(40):
+        writer.submit({'n': idx, 'pad': 'x' * 20})
+    writer.close()
+
+    assert journal_files(path, 2) == [path, f'{path}.1', f'{path}.2']
+    numbers = [record['n'] for record in read_records_reverse(path, 2)]
+    # the oldest records fell off the end of the rotation, the rest come back newest first
+    assert numbers == sorted(numbers, reverse=True)
+    assert numbers[0] == 39
+    assert len(numbers) < 40
+    assert writer.stats()['rotations'] > 2
+
+
+def test_read_lines_reverse_across_blocks(tmp_path):
+    path = tmp_path / 'lines.txt'
+    path.write_bytes(b''.join(f'line {idx}\n'.encode() for idx in range(100)))
+
+    lines = list(read_lines_reverse(str(path), block_size=16))
+
+    assert lines == [f'line {idx}'.encode() for idx in reversed(range(100))]
+
+
+def test_unreadable_lines_are_skipped(tmp_path):
+    path = tmp_path / 'log.jsonl'
+    path.write_text('{"n": 1}\nnot json\n{"n": 2}\n', encoding='utf-8')
+
+    assert list(read_records_reverse(str(path), 0)) == [{'n': 2}, {'n': 1}]
+
+
+def test_full_queue_drops_instead_of_blocking():
+    class Stuck(BatchWorker):
+        def process(self, batch):
+            pass
+
+    worker = Stuck('Stuck', queue_size=2)
+    worker._thread = object()  # never drained
+    results = [worker.submit(idx) for idx in range(4)]
+
+    assert results == [True, True, False, False]
+    assert worker.stats()['dropped'] == 2
+
+
+def test_worker_without_process_fails_on_creation():
+    class Forgetful(BatchWorker):
+        pass
+
+    with pytest.raises(TypeError):
+        Forgetful('Forgetful')
+
+
+@pytest.fixture
+def feedback_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'feedback.jsonl')
+    monkeypatch.setattr(feedback, 'FEEDBACK_FILE', path)
+    monkeypatch.setattr(feedback, 'writer', JournalWriter(path, flush_interval=0.01))
+    return path
+
+
+def make_message(chat_id, text):
+    user = types.SimpleNamespace(id=chat_id, username='user', first_name='Имя', last_name=None)
+    return types.SimpleNamespace(chat=types.SimpleNamespace(id=chat_id), from_user=user, text=text)
+
+
+def test_feedback_pages_newest_first(feedback_file):
+    for idx in range(7):
+        feedback.save_feedback(make_message(idx, f'отзыв {idx}'))
+    feedback.writer.close()
+
+    first, more = feedback.feedback_page(0, 5)
+    last, no_more = feedback.feedback_page(1, 5)
+
+    assert [record['text'] for record in first] == [f'отзыв {idx}' for idx in (6, 5, 4, 3, 2)]
+    assert more
+    assert [record['text'] for record in last] == ['отзыв 1', 'отзыв 0']
+    assert not no_more
+    assert first[0]['name'] == 'Имя' and first[0]['username'] == 'user'
@@ -0,0 +1,73 @@
+import pytest
+
+from leaderboard import Leaderboard
+
+
+@pytest.fixture
+def board(storage):
+    board = Leaderboard('leaderboard.db', cache_ttl=0)
+    yield board
+    board.writer.close()
+
+
+def test_rank_before_and_after_flush(board):
+    assert board.rank('marathon', 1) is None
+    assert board.submit('marathon', 1, 'Аня', 10) == 1
+    assert board.submit('marathon', 2, 'Боря', 20) == 1
+    assert board.rank('marathon', 1) == 1  # neither score is flushed yet
+
+    board.writer.close()
+
+    assert board._pending == {}
+    assert board.rank('marathon', 1) == 2
+    assert board.rank('marathon', 2) == 1
+    assert board.players('marathon') == 2
+    assert board.players('blitz') == 0
+
+
+def test_best_score_keeps_maximum(board):
+    board.submit('blitz', 1, 'Аня', 30)
+    board.submit('blitz', 1, 'Аня', 12)
+    assert board.best_score('blitz', 1) == 30
+    board.writer.close()
+
+    assert board.best_score('blitz', 1) == 30
+    assert [row['score'] for row in board.top('blitz')] == [30]
+
+
+def test_top_by_scope(board):
+    board.set_class(1, '5А')
+    board.set_class(2, '5Б')
+    assert board.get_class(1) == '5А'
+    board.submit('marathon', 1, 'Аня', 10)
+    board.submit('marathon', 2, 'Боря', 20)
+    board.submit('marathon', 3, 'Вика', 15)
+    board.writer.close()
+
+    assert [row['name'] for row in board.top('marathon')] == ['Боря', 'Вика', 'Аня']
+    assert [row['name'] for row in board.top('marathon', limit=1)] == ['Боря']
+    assert [row['name'] for row in board.top('marathon', 'week')] == ['Боря', 'Вика', 'Аня']
+    assert board.top('marathon', 'class', '5А') == [{'chat_id': 1, 'name': 'Аня', 'class_name': '5А', 'score': 10}]
+
+
+def test_class_change_moves_best_entry(board):
+    board.submit('marathon', 1, 'Аня', 10)
+    board.set_class(1, '6В')
+    board.writer.close()
+
+    assert board.get_class(1) == '6В'
+    assert [row['chat_id'] for row in board.top('marathon', 'class', '6В')] == [1]
+
+
+def test_processes_see_each_others_scores(board):
+    other = Leaderboard('leaderboard.db', cache_ttl=0)
+    try:
+        board.submit('marathon', 1, 'Аня', 10)
+        other.submit('marathon', 2, 'Боря', 20)
+        board.writer.close()
+        other.writer.close()
+
+        assert board.rank('marathon', 1) == other.rank('marathon', 1) == 2
+        assert board.players('marathon') == other.players('marathon') == 2
+    finally:
+        other.writer.close()
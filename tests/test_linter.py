@@ -0,0 +1,107 @@
+import os
+
+import assets
+import catalog
+import linter
+
+
+def write_list(tmp_path, text, category='bludo', images=()):
+    directory = tmp_path / category
+    directory.mkdir()
+    for image in images:
+        (directory / image).write_bytes(b'png')
+    path = directory / 'list.txt'
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def codes(issues):
+    return sorted(entry['code'] for entry in issues)
+
+
+def test_clean_file(tmp_path):
+    header = 'bludo: Чак-чак / chak.png / 1990g'
+    path = write_list(tmp_path, f'=START= {{{header}}} ===\nОписание\n=END= {{{header}}} ===\n', images=['chak.png'])
+
+    assert linter.lint_file(path) == []
+
+
+def test_block_errors(tmp_path):
+    path = write_list(tmp_path, '\n'.join([
+        '=START= {bludo: Чак-чак / chak.png / 1990g} ===',
+        'Описание',
+        '=END= {bludo: Чак-чак / chak.png / 1990g} ===',
+        '=START= {odezhda: Чак-чак / none.png / вчера} ===',
+        '',
+        '=END= {odezhda: Чак-чак / none.png / вчера} ===',
+        'лишний текст',
+        '=START= {Без даты / a.png} ===',
+        '=END= {Другой} ===',
+        '=END= {Лишний} ===',
+        '=START=сломано',
+        '=START= {Эчпочмак / big.gif / 2000-2010} ===',
+    ]), images=['chak.png', 'big.gif'])
+
+    issues = linter.lint_file(path, max_image_bytes=2)
+
+    assert codes(issues) == sorted([
+        'category-mismatch', 'duplicate-name', 'bad-date', 'empty-description', 'missing-image',
+        'stray-text', 'header-mismatch', 'bad-header', 'unexpected-end', 'bad-marker', 'unclosed-block',
+        'oversized-image',
+    ])
+    lines = {entry['code']: entry['line'] for entry in issues}
+    assert lines['duplicate-name'] == 4
+    assert lines['unexpected-end'] == 10
+    assert lines['unclosed-block'] == 12
+
+
+def test_image_size_limit(tmp_path):
+    header = 'Эчпочмак / ech.webp / 01.02.2003'
+    path = write_list(tmp_path, f'=START= {{{header}}} ===\nТекст\n=END= {{{header}}} ===\n', images=['ech.webp'])
+
+    assert codes(linter.lint_file(path, max_image_bytes=2)) == ['oversized-image']
+    assert linter.lint_file(path, max_image_bytes=3) == []
+
+
+def test_dates():
+    for value in ('1990g', '12-13gg', '1990', '1941-1945', '01.02.2003'):
+        assert linter.check_date(value), value
+    for value in ('вчера', '31.02.2003', '19900', ''):
+        assert not linter.check_date(value), value
+
+
+def test_empty_and_unreadable_files(tmp_path):
+    assert codes(linter.lint_file(write_list(tmp_path, ''))) == ['empty-file']
+    assert codes(linter.lint_file(str(tmp_path / 'missing' / 'list.txt'))) == ['unreadable']
+
+
+def test_unreadable_image(tmp_path, monkeypatch):
+    def denied(path, size, mtime):
+        raise PermissionError(path)
+
+    header = 'bludo: Чак-чак / chak.png / 1990g'
+    path = write_list(tmp_path, f'=START= {{{header}}} ===\nОписание\n=END= {{{header}}} ===\n', images=['chak.png'])
+    monkeypatch.setattr(assets, 'file_digest', denied)
+
+    assert codes(linter.lint_file(path)) == ['unreadable-image']
+
+
+def test_linter_agrees_with_catalog_assets(corpus):
+    issues = linter.lint_content('regionals', processes=1)['issues']
+    fallbacks = [entry for entry in issues if entry['code'] in ('missing-image', 'missing-preview')]
+
+    assert len(fallbacks) == len(catalog.get_catalog().assets.missing)
+
+
+def test_lint_content_in_parallel(corpus):
+    os.mkdir(os.path.join('regionals', 'atlantida'))
+    os.mkdir(os.path.join('regionals', sorted(os.listdir('regionals'))[0], 'misc'))
+
+    serial = linter.lint_content('regionals', processes=1)
+    parallel = linter.lint_content('regionals', processes=2)
+
+    assert serial['files'] == 15
+    assert sorted(map(str, serial['issues'])) == sorted(map(str, parallel['issues']))
+    assert {'unknown-national', 'unknown-category'} <= set(codes(serial['issues']))
+    assert serial['errors'] + serial['warnings'] == len(serial['issues'])
+    assert linter.lint_content('missing', processes=1)['issues'][0]['code'] == 'missing-data-dir'
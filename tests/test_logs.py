@@ -0,0 +1,102 @@
+import json
+import logging
+import queue
+
+import pytest
+
+import logs
+from events import chat_hash
+
+
+def make_record(msg='Send error: %s', args=('boom',), level=logging.ERROR, **fields):
+    return logging.makeLogRecord({'name': 'bot', 'levelno': level, 'levelname': logging.getLevelName(level),
+                                  'msg': msg, 'args': args, **fields})
+
+
+def test_dedup_lets_first_and_every_nth_through():
+    dedup = logs.DedupFilter(window=60, sample_every=3)
+
+    passed = [dedup.filter(make_record(args=(idx,))) for idx in range(7)]
+
+    assert passed == [True, False, False, True, False, False, True]
+    assert dedup.suppressed == 4
+    assert dedup.filter(make_record('Other error')) is True
+    assert dedup.filter(make_record(level=logging.INFO))
+
+
+def test_dedup_reports_repeats_after_window(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(logs.time, 'monotonic', lambda: now[0])
+    dedup = logs.DedupFilter(window=10, sample_every=100)
+    for _ in range(5):
+        dedup.filter(make_record())
+
+    now[0] += 11
+    record = make_record()
+
+    assert dedup.filter(record)
+    assert record.repeated == 4
+
+
+def test_json_formatter_includes_context():
+    record = make_record(context={'u': 'abc', 'route': 'item'}, data={'kept': 3}, repeated=2)
+
+    payload = json.loads(logs.JsonFormatter().format(record))
+
+    assert payload['msg'] == 'Send error: boom'
+    assert payload['level'] == 'error'
+    assert (payload['u'], payload['route'], payload['data'], payload['repeated']) == ('abc', 'item', {'kept': 3}, 2)
+
+
+def test_context_is_nested_and_restored():
+    context = logs.ContextFilter()
+    with logs.log_context(7, route='item'):
+        with logs.log_context(route='search'):
+            inner = make_record()
+            context.filter(inner)
+        outer = make_record()
+        context.filter(outer)
+    after = make_record()
+    context.filter(after)
+
+    assert inner.context['route'] == 'search' and inner.context['u'] == chat_hash(7)
+    assert outer.context['route'] == 'item'
+    assert 'ms' in outer.context
+    assert not hasattr(after, 'context')
+
+
+def test_full_queue_drops_records():
+    handler = logs.NonBlockingQueueHandler(queue.Queue(1))
+
+    handler.emit(make_record())
+    handler.emit(make_record())
+
+    assert handler.dropped == 1
+
+
+@pytest.fixture
+def configured(tmp_path):
+    root = logging.getLogger()
+    level = root.level
+    path = tmp_path / 'bot.log'
+    logs.setup(str(path), level=logging.INFO, console=False)
+    yield path
+    logs.shutdown()
+    root.removeHandler(logs._handler)
+    root.setLevel(level)
+
+
+def test_setup_writes_json_lines(configured):
+    log = logging.getLogger('tests')
+    with logs.log_context(7, route='item'):
+        log.info('Показано: %s', 'Чак-чак', extra={'data': {'page': 1}})
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        log.exception('Render error')
+    logs.shutdown()
+
+    first, second = [json.loads(line) for line in configured.read_text(encoding='utf-8').splitlines()]
+    assert (first['msg'], first['route'], first['data']) == ('Показано: Чак-чак', 'item', {'page': 1})
+    assert second['level'] == 'error' and 'ZeroDivisionError' in second['exc']
+    assert logs.stats()['configured']
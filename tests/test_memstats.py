@@ -0,0 +1,73 @@
+import sys
+
+import catalog
+import memstats
+
+
+def test_deep_size_counts_shared_objects_once():
+    shared = ['x' * 1000]
+    seen = set()
+
+    first = memstats.deep_size({'a': shared}, seen)
+    second = memstats.deep_size({'b': shared}, seen)
+
+    assert first > 1000
+    assert second < 1000
+    assert memstats.deep_size(shared, seen) == 0
+
+
+def test_deep_size_follows_cycles():
+    loop = []
+    loop.append(loop)
+
+    assert memstats.deep_size(loop, set()) == sys.getsizeof(loop)
+
+
+def test_format_bytes():
+    assert memstats.format_bytes(None) == '—'
+    assert memstats.format_bytes(512) == '512 Б'
+    assert memstats.format_bytes(2048) == '2 КБ'
+    assert memstats.format_bytes(3 * 1024 ** 2) == '3 МБ'
+    assert memstats.format_bytes(1.5 * 1024 ** 3) == '1.5 ГБ'
+
+
+def test_sessions_by_kind():
+    states = {
+        1: {'current_quiz': {'options': ['a', 'b']}, 'quiz_score': 3, 'last_message_id': 10},
+        2: {'search_mode': True, 'custom': 'x' * 500},
+    }
+
+    report = memstats.session_memory(states, set())
+
+    assert report['entries'] == 2
+    assert report['kinds']['quiz']['sessions'] == 1
+    assert report['kinds']['other']['bytes'] > 500
+    assert list(report['kinds'])[0] == 'other'
+    assert set(report['kinds']) == {'quiz', 'navigation', 'search', 'other'}
+
+
+def test_catalog_items_are_not_charged_to_sessions(corpus):
+    current = catalog.get_catalog()
+    item = current.category_items(current.nationals[0], 'bludo')[0]
+    states = {1: {'current_quiz': {'item': item}}}
+
+    report = memstats.memory_report(states, current)
+
+    alone = memstats.session_memory(states, set())['kinds']['quiz']['bytes']
+    assert report['sessions']['kinds']['quiz']['bytes'] < alone
+    assert report['catalog']['items'] == len(current.all_items)
+    assert report['tracing'] == {'enabled': False}
+
+
+def test_tracer_diff():
+    tracer = memstats.Tracer()
+    assert tracer.diff() is None
+    tracer.start()
+    try:
+        kept = [bytes(1000) for _ in range(200)]
+        diff = tracer.diff(top=5)
+    finally:
+        tracer.stop()
+
+    assert kept and diff['top']
+    assert any('test_memstats.py:' in entry['where'] and entry['size_diff'] >= 200000 for entry in diff['top'])
@@ -0,0 +1,69 @@
+import types
+
+import catalog
+from search_index import SearchIndex, get_search_index, normalize, trigrams
+
+NAMES = ['Чак-чак', 'Чай с молоком', 'Эчпочмак', 'Ёлка', 'Бешбармак', 'Татарский чак-чак с мёдом']
+
+
+def make_index():
+    items = {('tatar', 'bludo'): [{'name': name} for name in NAMES]}
+    return SearchIndex(types.SimpleNamespace(items=items), cache_size=2)
+
+
+def names(index, query):
+    return [index.entries[entry_id]['item']['name'] for entry_id in index.search(query)]
+
+
+def test_normalize():
+    assert normalize('  Чак-Чак, Ёлка!') == 'чак чак елка'
+    assert trigrams('ab') == {'  a', ' ab', 'ab '}
+
+
+def test_exact_then_prefix_then_contains():
+    index = make_index()
+
+    assert names(index, 'чак-чак') == ['Чак-чак', 'Татарский чак-чак с мёдом']
+    # shorter names first among the same kind of match
+    assert names(index, 'ча') == ['Чак-чак', 'Чай с молоком', 'Татарский чак-чак с мёдом']
+    assert names(index, 'елка') == ['Ёлка']
+    assert names(index, 'чак мед')[0] == 'Татарский чак-чак с мёдом'
+    assert names(index, '') == []
+
+
+def test_typos_fall_back_to_trigrams():
+    index = make_index()
+
+    assert names(index, 'эчпочмк') == ['Эчпочмак']
+    assert names(index, 'бешбармк')[0] == 'Бешбармак'
+    assert names(index, 'щщщщ') == []
+
+
+def test_entry_ids_point_back_to_items():
+    index = make_index()
+    entry = index.entries[index.search('эчпочмак')[0]]
+
+    assert entry['id'] == 'tatar_bludo_2'
+    assert (entry['national'], entry['category'], entry['idx']) == ('tatar', 'bludo', 2)
+
+
+def test_results_are_cached():
+    index = make_index()
+    first = index.search('Чак')
+
+    assert index.search('  чак ') is first
+    index.search('чай')
+    index.search('елка')
+    assert index.search('чак') is not first
+    stats = index.stats()
+    assert (stats['hits'], stats['misses'], stats['cached_queries']) == (1, 4, 2)
+
+
+def test_index_follows_catalog(corpus):
+    index = get_search_index()
+    current = catalog.get_catalog()
+
+    assert get_search_index() is index
+    assert index.stats()['entries'] == sum(len(items) for items in current.items.values())
+    item = current.items[(current.nationals[0], 'bludo')][0]
+    assert item in [index.entries[entry_id]['item'] for entry_id in index.search(item['name'])]
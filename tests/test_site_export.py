@@ -0,0 +1,74 @@
+import os
+import shutil
+
+import site_export
+from site_export import export_site
+
+
+def test_export_then_nothing_to_do(corpus):
+    first = export_site('regionals', 'site', processes=1)
+
+    assert not first['incremental']
+    assert first['rendered'] == first['pages']
+    assert os.path.exists(os.path.join('site', 'index.html'))
+    assert os.path.exists(os.path.join('site', 'manifest.json'))
+
+    second = export_site('regionals', 'site', processes=1)
+
+    assert second['incremental']
+    assert (second['rendered'], second['removed'], second['images_written']) == (0, 0, 0)
+    assert second['pages'] == first['pages']
+
+
+def test_edited_description_renders_one_page(corpus):
+    export_site('regionals', 'site', processes=1)
+    national = sorted(os.listdir('regionals'))[0]
+    path = os.path.join('regionals', national, 'bludo', 'list.txt')
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text.replace('\n', '\nНовая строка описания.\n', 1))
+
+    result = export_site('regionals', 'site', processes=1)
+
+    assert result['rendered'] == 1
+    with open(os.path.join('site', national, 'bludo', '0.html'), encoding='utf-8') as f:
+        assert 'Новая строка описания.' in f.read()
+
+
+def test_removed_national_is_cleaned_up(corpus):
+    export_site('regionals', 'site', processes=1)
+    national = sorted(os.listdir('regionals'))[0]
+    shutil.rmtree(os.path.join('regionals', national))
+
+    result = export_site('regionals', 'site', processes=1)
+
+    assert result['removed'] > 0
+    assert not os.path.exists(os.path.join('site', national))
+    assert result['rendered'] == 1  # the index only
+
+
+def test_parallel_export_matches_serial(corpus):
+    serial = export_site('regionals', 'serial', processes=1)
+    parallel = export_site('regionals', 'parallel', processes=2)
+
+    assert parallel['pages'] == serial['pages']
+    for root, _, files in os.walk('serial'):
+        for name in files:
+            if name == 'manifest.json':
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f, open(os.path.join('parallel', os.path.relpath(path, 'serial')), 'rb') as g:
+                assert f.read() == g.read(), path
+
+
+def test_missing_pillow_is_reported(corpus, monkeypatch, caplog):
+    monkeypatch.setattr(site_export, 'resize_available', lambda: False)
+
+    result = export_site('regionals', 'site', processes=1)
+
+    assert not result['resized']
+    assert 'Pillow is not installed' in caplog.text
+    caplog.clear()
+    export_site('regionals', 'plain', processes=1, max_size=0)
+    assert 'Pillow' not in caplog.text
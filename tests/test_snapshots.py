@@ -0,0 +1,109 @@
+import types
+
+import pytest
+
+import sessions
+from snapshots import Snapshotter
+
+
+@pytest.fixture
+def snapshotter(storage):
+    states = {}
+    snapshotter = Snapshotter(states, 'sqlite://sessions.db', interval=3600).start()
+    yield snapshotter
+    snapshotter.close()
+
+
+def test_only_changed_sessions_are_written(snapshotter):
+    states = snapshotter.states
+    states[1] = {'page': 1}
+    states[2] = {'page': 1}
+    snapshotter.touch(1)
+    snapshotter.touch(2)
+    assert snapshotter.snapshot() == 2
+
+    snapshotter.touch(1)
+    assert snapshotter.snapshot() == 0
+    assert snapshotter.stats()['skipped'] == 1
+
+    states[1]['page'] = 2
+    snapshotter.touch(1)
+    assert snapshotter.snapshot() == 1
+    assert sessions.decode_session(snapshotter.store.get(1)) == {'page': 2}
+
+    del states[2]
+    snapshotter.touch(2)
+    snapshotter.snapshot()
+    assert snapshotter.store.get(2) is None
+
+
+def test_untouched_sessions_are_not_written(snapshotter):
+    snapshotter.states[1] = {'page': 1}
+
+    assert snapshotter.snapshot() == 0
+    assert snapshotter.store.get(1) is None
+
+
+def test_tracked_handler_marks_chat(snapshotter):
+    @snapshotter.tracked
+    def handler(message):
+        snapshotter.states[message.chat.id] = {'seen': True}
+
+    handler(types.SimpleNamespace(chat=types.SimpleNamespace(id=9)))
+
+    assert snapshotter.snapshot() == 1
+
+
+def test_close_writes_last_changes_and_restore_reads_them(snapshotter):
+    snapshotter.states[1] = {'national': 'tatar'}
+    snapshotter.touch(1)
+    snapshotter.close()
+
+    restored = {}
+    assert Snapshotter(restored, 'sqlite://sessions.db').restore() == 1
+    assert restored == {1: {'national': 'tatar'}}
+
+
+def expire(store, chat_id, age):
+    with store.conn:
+        store.conn.execute('UPDATE sessions SET updated = updated - ? WHERE chat_id = ?', (age, chat_id))
+
+
+def test_expired_sessions_are_skipped_and_pruned(storage):
+    store = sessions.SQLiteStore('sessions.db', ttl=60)
+    store.set_many({1: b'{}', 2: b'{}'})
+    expire(store, 1, 120)
+
+    assert store.get(1) is None
+    assert [chat_id for chat_id, _ in store.items()] == [2]
+    assert store.prune() == 1
+    assert store.pruned == 1
+
+    store.set(1, b'{"page":1}')
+    assert bytes(store.get(1)) == b'{"page":1}'
+    store.close()
+
+
+def test_restore_prunes_expired_sessions(storage):
+    store = sessions.SQLiteStore('sessions.db')
+    store.set_many({1: b'{"page":1}', 2: b'{"page":2}'})
+    expire(store, 1, sessions.SESSION_TTL + 60)
+    store.close()
+
+    restored = {}
+    snapshotter = Snapshotter(restored, 'sqlite://sessions.db')
+
+    assert snapshotter.restore() == 1
+    assert restored == {2: {'page': 2}}
+    assert snapshotter.store.pruned == 1
+    snapshotter.store.close()
+
+
+def test_no_ttl_keeps_everything(storage):
+    store = sessions.SQLiteStore('sessions.db', ttl=0)
+    store.set(1, b'{}')
+    expire(store, 1, 10 ** 9)
+
+    assert store.get(1) is not None
+    assert store.prune() == 0
+    store.close()
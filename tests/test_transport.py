@@ -0,0 +1,196 @@
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from transport import CircuitBreaker, CircuitOpenError, MultipartStream, RetryBudget, Transport, is_unavailable
+
+URL = 'https://api.telegram.org/bot1:x/'
+
+
+class Reply:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+
+    def json(self):
+        return self.payload
+
+
+class Session:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append(url.rsplit('/', 1)[-1])
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def make_transport(*outcomes, **kwargs):
+    transport = Transport(backoff=0, **kwargs)
+    session = Session(*outcomes)
+    transport.session = lambda: session
+    return transport, session
+
+
+def test_breaker_opens_and_probes():
+    breaker = CircuitBreaker(threshold=2, reset_timeout=0.05)
+    breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+    time.sleep(0.06)
+    # one essential call probes, everything else waits for its answer
+    assert not breaker.allow(essential=False)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.failure()
+    assert breaker.state == 'open' and breaker.opened == 2
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == 'closed' and breaker.allow(essential=False)
+
+
+def test_retry_budget():
+    budget = RetryBudget(ratio=0.5, capacity=2)
+
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def test_is_unavailable():
+    assert is_unavailable(CircuitOpenError())
+    assert is_unavailable(requests.exceptions.ConnectionError())
+    assert not is_unavailable(ValueError())
+
+
+def test_server_errors_are_retried():
+    transport, session = make_transport(Reply(502), Reply(200, {'ok': True}))
+
+    assert transport.send('post', URL + 'editMessageText').status_code == 200
+    assert session.requests == ['editMessageText'] * 2
+    assert (transport.retried, transport.failed) == (1, 0)
+
+
+def test_short_retry_after_is_waited_out():
+    transport, session = make_transport(Reply(429, {'parameters': {'retry_after': 0}}), Reply(200))
+
+    assert transport.send('post', URL + 'sendMessage').status_code == 200
+    assert transport.breaker.failures == 0
+
+
+def test_long_retry_after_is_returned():
+    transport, session = make_transport(Reply(429, {'parameters': {'retry_after': 60}}))
+
+    assert transport.send('post', URL + 'sendMessage').status_code == 429
+    assert len(session.requests) == 1
+
+
+def test_send_is_not_repeated_after_read_timeout():
+    transport, session = make_transport(requests.exceptions.ReadTimeout(), Reply(200))
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        transport.send('post', URL + 'sendMessage')
+    assert len(session.requests) == 1
+
+    transport, session = make_transport(requests.exceptions.ReadTimeout(), Reply(200))
+    assert transport.send('post', URL + 'editMessageText').status_code == 200
+
+
+def test_open_breaker_rejects_and_sheds():
+    transport, session = make_transport(*[Reply(500)] * 10, breaker=CircuitBreaker(threshold=2, reset_timeout=60))
+
+    assert transport.send('post', URL + 'sendMessage').status_code == 500
+    assert transport.breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        transport.send('post', URL + 'sendMessage')
+    with pytest.raises(CircuitOpenError):
+        transport.send('post', URL + 'deleteMessage')
+    assert (transport.rejected, transport.shed) == (1, 1)
+    assert session.requests == ['sendMessage'] * 2
+
+
+
+def test_multipart_stream_reads_files_in_chunks(tmp_path):
+    path = tmp_path / 'photo.png'
+    path.write_bytes(b'p' * 1000)
+    with open(path, 'rb') as photo:
+        stream = MultipartStream({'photo': photo, 'thumb': ('t.png', io.BytesIO(b'thumb'))})
+        body = b''
+        while True:
+            chunk = stream.read(64)
+            if not chunk:
+                break
+            body += chunk
+
+    assert len(body) == len(stream)
+    assert b'name="photo"; filename="photo.png"' in body
+    assert b'name="thumb"; filename="t.png"' in body
+    assert b'p' * 1000 in body and b'\r\nthumb\r\n' in body
+    assert body.endswith(f'--{stream.boundary}--\r\n'.encode())
+
+
+class Echo(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.bodies.append((self.headers.get('Content-Type'), body))
+        reply = json.dumps({'ok': True, 'result': len(body)}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def echo():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Echo)
+    server.bodies = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/bot1:x/', server
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_kept_alive(echo):
+    url, server = echo
+    transport = Transport(pool_size=2)
+
+    for _ in range(5):
+        assert transport.send('post', url + 'sendMessage', params={'text': 'привет'}).json()['ok']
+
+    assert transport.session() is transport.session()
+    assert transport.connections() == {'created': 1, 'reused': 4}
+
+
+def test_upload_is_streamed_as_multipart(echo, tmp_path):
+    url, server = echo
+    path = tmp_path / 'photo.png'
+    path.write_bytes(b'p' * 100000)
+    transport = Transport()
+
+    with open(path, 'rb') as photo:
+        result = transport.send('post', url + 'sendPhoto', files={'photo': photo})
+
+    content_type, body = server.bodies[0]
+    assert result.json()['result'] == len(body)
+    assert content_type.startswith('multipart/form-data; boundary=')
+    assert b'p' * 100000 in body
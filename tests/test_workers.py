@@ -0,0 +1,74 @@
+import pytest
+
+import feedback
+import sessions
+from journal import JournalWriter
+from workers import route_key
+
+
+def test_route_key_by_chat():
+    message = {'chat': {'id': 5}, 'from': {'id': 7}}
+
+    assert route_key({'update_id': 1, 'message': message}) == 5
+    assert route_key({'update_id': 1, 'edited_message': message}) == 5
+    assert route_key({'update_id': 1, 'callback_query': {'from': {'id': 7}, 'message': message}}) == 5
+    assert route_key({'update_id': 1, 'callback_query': {'from': {'id': 7}, 'inline_message_id': 'x'}}) == 7
+    assert route_key({'update_id': 1, 'inline_query': {'from': {'id': 7}, 'query': ''}}) == 7
+    assert route_key({'update_id': 1, 'poll': {'id': 'p'}}) == 0
+
+
+def test_session_codec_round_trip():
+    state = {'national': 'tatar', 'page': 2, 'history': ['Чак-чак'], 'quiz': None}
+    data = sessions.encode_session(state)
+
+    assert sessions.decode_session(data) == state
+    assert 'Чак-чак'.encode('utf-8') in data
+    assert b' ' not in data
+
+
+def check_store(store):
+    assert store.get(1) is None
+    store.set(1, b'one')
+    store.set_many({2: b'two', 3: b'three'})
+    store.set(1, b'uno')
+    store.delete(3)
+    store.delete(4)
+
+    assert store.get(1) == b'uno'
+    assert sorted((chat_id, bytes(data)) for chat_id, data in store.items()) == [(1, b'uno'), (2, b'two')]
+    store.close()
+
+
+def test_memory_store():
+    check_store(sessions.open_store('memory://'))
+
+
+def test_sqlite_store(storage):
+    store = sessions.open_store('sqlite:///sessions.db')
+    assert isinstance(store, sessions.SQLiteStore)
+    check_store(store)
+
+    reopened = sessions.open_store('sqlite://sessions.db')
+    assert bytes(reopened.get(2)) == b'two'
+    reopened.close()
+
+
+def test_unknown_store():
+    with pytest.raises(ValueError):
+        sessions.open_store('mongodb://localhost')
+
+
+def test_feedback_from_every_worker_is_merged(tmp_path, monkeypatch):
+    path = str(tmp_path / 'feedback.jsonl')
+    monkeypatch.setattr(feedback, 'FEEDBACK_FILE', path)
+    for worker, timestamps in ((None, [0, 3]), (1, [1, 4]), (2, [2, 5])):
+        writer = JournalWriter(path if worker is None else f'{path}.w{worker}', flush_interval=0.01)
+        for ts in timestamps:
+            writer.submit({'ts': ts, 'text': f'отзыв {ts}'})
+        writer.close()
+
+    assert sorted(feedback.feedback_paths()) == sorted([path, f'{path}.w1', f'{path}.w2'])
+    records, more = feedback.feedback_page(0, 4)
+    assert [record['ts'] for record in records] == [5, 4, 3, 2]
+    assert more
+    assert [record['ts'] for record in feedback.feedback_page(1, 4)[0]] == [1, 0]
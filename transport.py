@@ -0,0 +1,339 @@
+import os
+import random
+import threading
+import time
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+from telebot import apihelper
+from telebot.apihelper import ApiTelegramException
+
+from config import BREAKER_RESET, BREAKER_THRESHOLD, HTTP_POOL_SIZE, TRANSPORT_RETRIES
+
+# (connect, read) seconds; Telegram answers these in well under a second when healthy
+METHOD_TIMEOUTS = {
+    'answerCallbackQuery': (3.05, 5),
+    'answerInlineQuery': (3.05, 5),
+    'deleteMessage': (3.05, 5),
+    'editMessageCaption': (3.05, 8),
+    'editMessageText': (3.05, 8),
+    'editMessageReplyMarkup': (3.05, 8),
+    'editMessageMedia': (3.05, 20),
+    'sendMessage': (3.05, 10),
+    'sendPhoto': (3.05, 30),
+}
+DEFAULT_TIMEOUT = (3.05, 15)
+
+# cosmetic calls that are dropped rather than sent while the API is unhealthy
+SHED_METHODS = {'deleteMessage', 'sendChatAction'}
+# a read timeout may mean the message was delivered, so these are never resent after one
+UNSAFE_METHODS = ('send', 'forward', 'copy')
+# getUpdates has its own retry loop in telebot and doubles as the health probe
+PASSTHROUGH_METHODS = {'getUpdates'}
+
+MAX_RETRY_AFTER = 5
+
+
+class TransportError(Exception):
+    pass
+
+
+class CircuitOpenError(TransportError):
+    pass
+
+
+def is_unavailable(e):
+    if isinstance(e, (TransportError, requests.exceptions.RequestException)):
+        return True
+    return isinstance(e, ApiTelegramException) and (e.error_code == 429 or e.error_code >= 500)
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened = 0
+        self.opened_at = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self, essential=True):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._probing = False
+            # a single essential call probes whether the API is back
+            if self.state == 'half_open' and essential and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = 'closed'
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.threshold):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.opened += 1
+            self._probing = False
+
+
+class RetryBudget:
+    # retries earn back slowly on success, so a struggling API sees at most ~10% extra traffic
+    def __init__(self, ratio=0.1, capacity=10):
+        self.ratio = ratio
+        self.capacity = capacity
+        self.tokens = capacity
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+def rewind(files):
+    for value in (files or {}).values():
+        stream = value[1] if isinstance(value, tuple) else value
+        if hasattr(stream, 'seek'):
+            stream.seek(0)
+
+
+def split_file(field, value):
+    if isinstance(value, tuple):
+        return value[0] or field, value[1]
+    name = getattr(value, 'name', None)
+    if isinstance(name, str) and not name.startswith('<'):
+        return os.path.basename(name), value
+    return field, value
+
+
+class MultipartStream:
+    # requests builds multipart bodies in memory; this reads each file from disk as the socket drains
+    def __init__(self, files):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+        self.parts = []
+        for field, value in files.items():
+            filename, stream = split_file(field, value)
+            filename = filename.replace('"', '').replace('\r', '').replace('\n', '')
+            self.parts.append((
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                f'Content-Type: application/octet-stream\r\n\r\n'
+            ).encode('utf-8'))
+            if isinstance(stream, str):
+                stream = stream.encode('utf-8')
+            self.parts.append(stream)
+            self.parts.append(b'\r\n')
+        self.parts.append(f'--{self.boundary}--\r\n'.encode('utf-8'))
+        self.length = sum(self.part_length(part) for part in self.parts)
+        self._index = 0
+        self._offset = 0
+
+    @staticmethod
+    def part_length(part):
+        if isinstance(part, (bytes, bytearray)):
+            return len(part)
+        try:
+            return os.fstat(part.fileno()).st_size - part.tell()
+        except (AttributeError, OSError, ValueError):
+            position = part.tell()
+            size = part.seek(0, os.SEEK_END) - position
+            part.seek(position)
+            return size
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length
+        chunks = []
+        while size > 0 and self._index < len(self.parts):
+            part = self.parts[self._index]
+            if isinstance(part, (bytes, bytearray)):
+                chunk = part[self._offset:self._offset + size]
+                self._offset += len(chunk)
+                if self._offset >= len(part):
+                    self._index += 1
+                    self._offset = 0
+            else:
+                chunk = part.read(size)
+                if not chunk:
+                    self._index += 1
+                    continue
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+
+def make_session(pool_size):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class Transport:
+    def __init__(self, retries=TRANSPORT_RETRIES, backoff=0.25, max_backoff=4.0, deadline=20.0,
+                 breaker=None, budget=None, pool_size=HTTP_POOL_SIZE or 16):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker()
+        self.budget = budget or RetryBudget()
+
+        self.calls = 0
+        self.retried = 0
+        self.failed = 0
+        self.shed = 0
+        self.rejected = 0
+
+        self.pool_size = pool_size
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+
+    def session(self):
+        # one keep-alive pool per process; a forked child must not share the parent's sockets
+        session = self._session
+        if session is None or self._session_pid != os.getpid():
+            with self._session_lock:
+                if self._session is None or self._session_pid != os.getpid():
+                    self._session = make_session(self.pool_size)
+                    self._session_pid = os.getpid()
+                session = self._session
+        return session
+
+    def connections(self):
+        created = requests_made = 0
+        if self._session is not None:
+            for adapter in set(self._session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is not None:
+                        created += pool.num_connections
+                        requests_made += pool.num_requests
+        return {'created': created, 'reused': requests_made - created}
+
+    def delay(self, attempt, started, retry_after=None):
+        # full jitter keeps clients that failed together from retrying together
+        delay = retry_after if retry_after is not None else random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if time.monotonic() + delay - started > self.deadline:
+            return None
+        return delay
+
+    def send(self, method, url, params=None, files=None, timeout=None, proxies=None):
+        method_name = url.rsplit('/', 1)[-1]
+        if method_name in PASSTHROUGH_METHODS:
+            try:
+                result = self.session().request(method, url, params=params, files=files, timeout=timeout, proxies=proxies)
+            except requests.exceptions.RequestException:
+                self.breaker.failure()
+                raise
+            if result.status_code < 500:
+                self.breaker.success()
+            else:
+                self.breaker.failure()
+            return result
+
+        essential = method_name not in SHED_METHODS
+        if not self.breaker.allow(essential):
+            if essential:
+                self.rejected += 1
+            else:
+                self.shed += 1
+            raise CircuitOpenError(f'Telegram API unavailable, {method_name} not sent')
+
+        self.calls += 1
+        timeout = METHOD_TIMEOUTS.get(method_name, DEFAULT_TIMEOUT)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            if attempt:
+                rewind(files)
+            body = MultipartStream(files) if files else None
+            headers = {'Content-Type': body.content_type} if body else None
+            retry_after = None
+            try:
+                result = self.session().request(method, url, params=params, data=body, headers=headers,
+                                                timeout=timeout, proxies=proxies)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                read_timeout = isinstance(e, requests.exceptions.ReadTimeout)
+                if read_timeout and method_name.startswith(UNSAFE_METHODS):
+                    self.breaker.failure()
+                    self.failed += 1
+                    raise
+                error, result = e, None
+            else:
+                if result.status_code == 429:
+                    # throttled, but reachable
+                    self.breaker.success()
+                    try:
+                        retry_after = result.json().get('parameters', {}).get('retry_after')
+                    except ValueError:
+                        retry_after = None
+                    if retry_after is None or retry_after > MAX_RETRY_AFTER:
+                        return result
+                elif result.status_code < 500:
+                    self.breaker.success()
+                    self.budget.deposit()
+                    return result
+                error = None
+
+            if retry_after is None:
+                self.breaker.failure()
+            delay = self.delay(attempt, started, retry_after)
+            if attempt >= self.retries or delay is None or not self.budget.withdraw() \
+                    or not self.breaker.allow(essential):
+                self.failed += 1
+                if error is not None:
+                    raise error
+                return result
+            attempt += 1
+            self.retried += 1
+            time.sleep(delay)
+
+    def stats(self):
+        return {
+            'state': self.breaker.state,
+            'opened': self.breaker.opened,
+            'calls': self.calls,
+            'retried': self.retried,
+            'failed': self.failed,
+            'shed': self.shed,
+            'rejected': self.rejected,
+            'pool_size': self.pool_size,
+            'connections': self.connections(),
+        }
+
+
+transport = Transport()
+
+
+def install(pool_size=None):
+    if pool_size:
+        transport.pool_size = pool_size
+    apihelper.CUSTOM_REQUEST_SENDER = transport.send
+    return transport
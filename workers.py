@@ -0,0 +1,196 @@
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+from telebot import apihelper
+
+from config import TOKEN, WORKERS, SESSION_STORE, API_PORT
+
+logger = logging.getLogger(__name__)
+
+POLL_TIMEOUT = 20
+SUPERVISE_INTERVAL = 1.0
+QUEUE_SIZE = 10000
+
+CHAT_UPDATES = ('message', 'edited_message', 'channel_post', 'edited_channel_post',
+                'my_chat_member', 'chat_member', 'chat_join_request')
+
+
+def route_key(update):
+    for key in CHAT_UPDATES:
+        if key in update:
+            return update[key]['chat']['id']
+    callback = update.get('callback_query')
+    if callback:
+        message = callback.get('message')
+        if message:
+            return message['chat']['id']
+        return callback['from']['id']
+    for value in update.values():
+        if isinstance(value, dict) and 'from' in value:
+            return value['from']['id']
+    return 0
+
+
+def worker_main(index, updates, store_url, token, api_url):
+    # the router owns Ctrl+C and SIGTERM and stops workers through their queues
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    apihelper.API_URL = api_url
+
+    from telebot import types
+    import bot as app
+    import events
+    import feedback
+    import logs
+    from dispatch import ChatExecutor
+    from sessions import decode_session, encode_session, open_store
+
+    # one event log and feedback journal per worker so rotation never races between processes
+    events.writer.path = f'{events.EVENTS_FILE}.w{index}'
+    feedback.writer.path = f'{feedback.FEEDBACK_FILE}.w{index}'
+    logs.setup(f'{logs.LOG_FILE}.w{index}')
+    app.bot.token = token
+    app.bot.threaded = False
+    # the session is saved as soon as the update returns, so the render has to finish inside it
+    app.renders = ChatExecutor(0)
+    store = open_store(store_url)
+    app.get_catalog()
+    app.watch_catalog(on_reload=app.on_catalog_ready)
+    app.start_monitor(app.user_states, app.peek_catalog)
+    logger.info('Воркер %s запущен (pid %s)', index, os.getpid())
+
+    while True:
+        raw = updates.get()
+        if raw is None:
+            break
+
+        chat_id = route_key(raw)
+        saved = store.get(chat_id)
+        if saved is not None:
+            app.user_states[chat_id] = decode_session(saved)
+
+        try:
+            update = types.Update.de_json(raw)
+            if update.callback_query is not None:
+                update.callback_query.received_at = raw.get('received_at')
+            app.bot.process_new_updates([update])
+        except Exception:
+            logger.exception('Worker %s update error', index)
+
+        state = app.user_states.pop(chat_id, None)
+        if state is None:
+            if saved is not None:
+                store.delete(chat_id)
+        else:
+            data = encode_session(state)
+            if data != saved:
+                store.set(chat_id, data)
+
+    store.close()
+
+
+class Router:
+    def __init__(self, workers=WORKERS, store_url=SESSION_STORE, token=TOKEN, poll_timeout=POLL_TIMEOUT):
+        if store_url in ('', 'memory', 'memory://'):
+            logger.warning('Хранилище сессий в памяти: при перезапуске воркера его игроки потеряют состояние')
+        self.count = workers
+        self.store_url = store_url
+        self.token = token
+        self.poll_timeout = poll_timeout
+        self.offset = None
+        self.routed = 0
+        self.restarts = 0
+
+        # spawn, not fork: the router runs background threads whose locks must not leak into workers
+        self.context = multiprocessing.get_context('spawn')
+        self.queues = [self.context.Queue(QUEUE_SIZE) for _ in range(workers)]
+        self.processes = [None] * workers
+        self._stopping = threading.Event()
+
+    def spawn(self, index):
+        process = self.context.Process(
+            target=worker_main,
+            args=(index, self.queues[index], self.store_url, self.token, apihelper.API_URL),
+            name=f'BotWorker-{index}',
+            daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+
+    def supervise(self):
+        while not self._stopping.wait(SUPERVISE_INTERVAL):
+            for index, process in enumerate(self.processes):
+                if not process.is_alive() and not self._stopping.is_set():
+                    logger.warning('Worker %s exited with code %s, restarting', index, process.exitcode)
+                    self.restarts += 1
+                    self.spawn(index)
+
+    def dispatch(self, update):
+        update['received_at'] = time.time()
+        self.queues[route_key(update) % self.count].put(update)
+        self.routed += 1
+
+    def poll(self):
+        while not self._stopping.is_set():
+            try:
+                updates = apihelper.get_updates(self.token, offset=self.offset, timeout=self.poll_timeout,
+                                                long_polling_timeout=self.poll_timeout)
+            except Exception as e:
+                logger.error('Polling error: %s', e)
+                self._stopping.wait(3)
+                continue
+            for update in updates:
+                self.offset = update['update_id'] + 1
+                self.dispatch(update)
+
+    def start(self):
+        for index in range(self.count):
+            self.spawn(index)
+        threading.Thread(target=self.supervise, name='WorkerSupervisor', daemon=True).start()
+        return self
+
+    def stop(self, timeout=10):
+        self._stopping.set()
+        for updates in self.queues:
+            updates.put(None)
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+
+        if self.offset:
+            # confirm everything already routed so it isn't redelivered on the next start
+            try:
+                apihelper.get_updates(self.token, offset=self.offset, limit=1, timeout=0)
+            except Exception as e:
+                logger.error('Offset commit error: %s', e)
+
+
+def serve(workers=WORKERS, store_url=SESSION_STORE):
+    import telebot
+    from backlog import OffsetKeeper, load_offset, recover
+    from broadcast import broadcasts
+
+    router = Router(workers, store_url).start()
+    updates, router.offset = recover(router.token, load_offset(router.token))
+    for update in updates:
+        router.dispatch(update)
+    offsets = OffsetKeeper(router.token).watch(lambda: router.offset)
+    broadcasts.start(telebot.TeleBot(TOKEN, parse_mode='HTML', threaded=False))
+    if API_PORT:
+        from api_server import start_api_server
+        from catalog import watch_catalog
+        start_api_server()
+        watch_catalog()
+    signal.signal(signal.SIGTERM, lambda signum, frame: router._stopping.set())
+    logger.info('Запущено воркеров: %s, хранилище сессий: %s', workers, store_url)
+    try:
+        router.poll()
+    except KeyboardInterrupt:
+        pass
+    router.stop()
+    offsets.stop()